@@ -10,22 +10,50 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
+#
+# Рабочий профиль включается переменными окружения:
+#   DEBUG=0           без отладки (обязательно задать SECRET_KEY и ALLOWED_HOSTS)
+#   SECRET_KEY        секретный ключ
+#   ALLOWED_HOSTS     имена хостов через запятую
+#   STARTUP_WARMUP    прогрев процесса при запуске (по умолчанию включён без DEBUG):
+#                     проверки и компиляция шаблонов, загрузка снимка справочников
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = env_bool('DEBUG', True)
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-i@1b8)zf7_b^j-tu5sh0h6&d5sisf#_z!7=xe-@u70#*cvhval'
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY:
+    if not DEBUG:
+        raise ImproperlyConfigured('Без DEBUG необходимо задать SECRET_KEY')
+    SECRET_KEY = 'django-insecure-i@1b8)zf7_b^j-tu5sh0h6&d5sisf#_z!7=xe-@u70#*cvhval'
 
-# SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host.strip()]
 
-ALLOWED_HOSTS = []
+STARTUP_WARMUP = env_bool('STARTUP_WARMUP', not DEBUG)
 
 
 # Application definition
@@ -42,6 +70,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы в замер попадали и остальные промежуточные слои
+    'mainApp.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,10 +85,19 @@ ROOT_URLCONF = 'main.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Стандартный бэкенд Django с замером времени отрисовки для PerformanceMiddleware
+        'BACKEND': 'mainApp.metrics.InstrumentedDjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Скомпилированные шаблоны хранятся в памяти процесса (прогреваются при запуске,
+            # см. STARTUP_WARMUP). В разработке автоперезагрузка сбрасывает этот кэш
+            # при изменении файлов шаблонов.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -71,15 +110,157 @@ TEMPLATES = [
 WSGI_APPLICATION = 'main.wsgi.application'
 
 
+# Метрики производительности запросов (mainApp.middleware.PerformanceMiddleware):
+#   PERF_SAMPLE_RATE      доля замеряемых запросов от 0 до 1
+#   PERF_SLOW_REQUEST_MS  порог, начиная с которого запрос пишется в лог с уровнем WARNING
+#   PERF_LOG_LEVEL        INFO — писать в лог каждый замеренный запрос
+# Гистограммы доступны по адресу /metrics/ только сотрудникам (is_staff).
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', '1.0' if DEBUG else '0.1'))
+PERF_SLOW_REQUEST_MS = env_int('PERF_SLOW_REQUEST_MS', 500)
+
+INTERNAL_IPS = ['127.0.0.1']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'mainApp.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERF_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+        # Холодный старт процессов: импорт, прогрев, первый запрос (mainApp.startup)
+        'mainApp.startup': {
+            'handlers': ['console'],
+            'level': os.environ.get('STARTUP_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# Профиль базы задаётся переменными окружения:
+#   DB_ENGINE         sqlite (по умолчанию) или postgresql
+#   DB_NAME           имя базы PostgreSQL или путь к файлу SQLite
+#   DB_USER, DB_PASSWORD, DB_HOST, DB_PORT — параметры подключения к PostgreSQL
+#   DB_CONN_MAX_AGE   время жизни постоянного соединения в секундах (0 — новое на каждый запрос)
+#   DB_POOL           1 — встроенный пул соединений Django (нужен psycopg[pool]);
+#                     DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE — размеры пула
+#   SQLITE_WAL        0 — отключить WAL и настройки pragma для SQLite
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'cashflow'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+    if env_bool('DB_POOL'):
+        # Пул держит открытые соединения сам; постоянные соединения с ним несовместимы
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': env_int('DB_POOL_MIN_SIZE', 2),
+            'max_size': env_int('DB_POOL_MAX_SIZE', 10),
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = env_int('DB_CONN_MAX_AGE', 60)
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': env_int('DB_CONN_MAX_AGE', 60),
+            'OPTIONS': {},
+        }
+    }
+    if env_bool('SQLITE_WAL', True):
+        DATABASES['default']['OPTIONS'] = {
+            # Читатели не блокируют писателя и наоборот; писатели ждут блокировку
+            # до 5 секунд вместо немедленной ошибки "database is locked"
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA mmap_size=134217728;'
+            ),
+            'timeout': 5,
+            # Транзакция сразу берёт блокировку записи: без этого две транзакции,
+            # начавшие с чтения, взаимно блокируются при переходе к записи
+            'transaction_mode': 'IMMEDIATE',
+        }
+else:
+    raise ImproperlyConfigured(f'Неизвестный DB_ENGINE: {DB_ENGINE}')
+
+
+# Валюты записей ДДС (mainApp.currency):
+#   CURRENCIES          коды ISO 4217 через запятую, доступные в форме записи и при импорте
+#   REPORTING_CURRENCY  валюта отчётности: в ней считаются агрегаты, итоги панели аналитики
+#                       и пересчитанные суммы списка (по умолчанию — первая из CURRENCIES)
+#   RATE_CACHE_SIZE     сколько курсов (валюта, дата) держать в памяти процесса
+# Курсы других валют к валюте отчётности загружает команда load_exchange_rates.
+CURRENCIES = [code.strip().upper() for code in os.environ.get('CURRENCIES', 'RUB,USD,EUR').split(',') if code.strip()]
+REPORTING_CURRENCY = os.environ.get('REPORTING_CURRENCY', CURRENCIES[0]).upper()
+if REPORTING_CURRENCY not in CURRENCIES:
+    raise ImproperlyConfigured(f'REPORTING_CURRENCY {REPORTING_CURRENCY} нет в CURRENCIES')
+RATE_CACHE_SIZE = env_int('RATE_CACHE_SIZE', 10000)
+
+
+# Прогноз движения денег (mainApp.forecast, нужен numpy):
+#   FORECAST_INCOME_TYPES   названия типов, увеличивающих остаток, через запятую
+#   FORECAST_EXPENSE_TYPES  названия типов, уменьшающих остаток; прочие типы (переводы)
+#                           прогнозируются, но в остаток не входят
+FORECAST_INCOME_TYPES = [name.strip() for name in os.environ.get('FORECAST_INCOME_TYPES', 'Пополнение').split(',') if name.strip()]
+FORECAST_EXPENSE_TYPES = [name.strip() for name in os.environ.get('FORECAST_EXPENSE_TYPES', 'Списание').split(',') if name.strip()]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Кэш хранит снимок справочников, версии данных и отрисованные страницы списка:
+#   CACHE_BACKEND     file (по умолчанию без DEBUG, общий для всех процессов на одной машине)
+#                     или locmem (по умолчанию с DEBUG, свой кэш в каждом процессе)
+#   CACHE_LOCATION    каталог для file
+# Версии данных (versions.py) хранятся без срока и должны быть общими для всех процессов:
+# с locmem изменения из другого процесса сервера или из команды manage.py (загрузка курсов,
+# правка справочников, регулярные операции) не видны, пока процесс не перезапущен, а снимок
+# справочников в нём остаётся старым. Поэтому locmem допустим только для разработки с DEBUG.
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem' if DEBUG else 'file')
+if CACHE_BACKEND == 'locmem' and not DEBUG:
+    raise ImproperlyConfigured('CACHE_BACKEND=locmem — кэш отдельного процесса, без DEBUG нужен общий (file)')
+
+if CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', BASE_DIR / '.cache'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    raise ImproperlyConfigured(f'Неизвестный CACHE_BACKEND: {CACHE_BACKEND}')
 
 
 # Password validation
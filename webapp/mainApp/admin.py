@@ -1,10 +1,375 @@
-from django.contrib import admin
-from .models import Status, Type, Category, SubCategory, CashFlow
+from calendar import monthrange
+from datetime import date
+from functools import partial
 
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import (
+    ALL_VAR, ERROR_FLAG, IS_FACETS_VAR, IS_POPUP_VAR, ORDER_VAR, PAGE_VAR, SEARCH_VAR, TO_FIELD_VAR, ChangeList,
+)
+from django.db.models import Max, Min, QuerySet
+from django.template.response import TemplateResponse
+
+from .archive import LedgerRollups
+from .bulk import delete_cashflows, update_cashflows
+from .dictionaries import get_dictionaries
+from .filters import day_start
+from .forms import CashFlowAdminForm, RecurringRuleForm
+from .models import (
+    Status, Type, Category, SubCategory, CashFlow, Budget, CashFlowArchive, ExchangeRate, RecurringRule,
+)
+from .pagination import EstimatedCountPaginator
+from .search import search_cashflows
+
+
+# Параметры списка, которые не сужают выборку (страница, сортировка, служебные флаги)
+CHANGELIST_SERVICE_PARAMS = {ALL_VAR, ERROR_FLAG, IS_FACETS_VAR, IS_POPUP_VAR, ORDER_VAR, PAGE_VAR, TO_FIELD_VAR}
+
+
+class DictionaryListFilter(admin.SimpleListFilter):
+    """
+    Фильтр списка по справочнику. Варианты берутся из снимка справочников без запросов
+    к базе, а не выборкой всей таблицы справочника, как у фильтра по ForeignKey.
+    """
+    dictionary = None
+
+    def options(self, request, snapshot):
+        return getattr(snapshot, self.dictionary)
+
+    def lookups(self, request, model_admin):
+        return [(obj.pk, obj.name) for obj in self.options(request, get_dictionaries())]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        # Не число в адресе (?status=abc) — список открывается заново без фильтров (?e=1), а не 500
+        try:
+            pk = int(self.value())
+        except ValueError as exc:
+            raise IncorrectLookupParameters(exc) from exc
+        return queryset.filter(**{f"{self.parameter_name}_id": pk})
+
+
+class StatusListFilter(DictionaryListFilter):
+    title = "статус"
+    parameter_name = "status"
+    dictionary = "statuses"
+
+
+class TypeListFilter(DictionaryListFilter):
+    title = "тип"
+    parameter_name = "type"
+    dictionary = "types"
+
+    def choices(self, changelist):
+        # Выбранная категория относится к прежнему типу: при смене типа она сбрасывается
+        remove = [self.parameter_name, CategoryListFilter.parameter_name]
+        yield {
+            "selected": self.value() is None,
+            "query_string": changelist.get_query_string(remove=remove),
+            "display": "Все",
+        }
+        for lookup, title in self.lookup_choices:
+            yield {
+                "selected": self.value() == str(lookup),
+                "query_string": changelist.get_query_string({self.parameter_name: lookup}, remove),
+                "display": title,
+            }
+
+
+class CategoryListFilter(DictionaryListFilter):
+    """
+    Категории только выбранного типа: без типа фильтр не показывается, поэтому
+    в боковой панели нет списка из тысяч категорий.
+    """
+    title = "категория"
+    parameter_name = "category"
+    dictionary = "categories"
+
+    def options(self, request, snapshot):
+        try:
+            categories = snapshot.children("categories", int(request.GET.get(TypeListFilter.parameter_name)))
+        except (TypeError, ValueError):
+            categories = []
+        # Выбранная категория остаётся в списке и применяется, даже если тип не выбран
+        # (ссылка извне) или выбран другой
+        selected = snapshot.get("categories", int(self.value())) if (self.value() or "").isdigit() else None
+        if selected is not None and selected not in categories:
+            categories = [*categories, selected]
+        return categories
+
+
+class CurrencyListFilter(admin.SimpleListFilter):
+    """
+    Валюты из настроек, а не SELECT DISTINCT по всей таблице записей.
+    """
+    title = "валюта"
+    parameter_name = "currency"
+
+    def lookups(self, request, model_admin):
+        return [(code, code) for code in settings.CURRENCIES]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(currency=self.value())
+        return queryset
+
+
+class LedgerQuerySet(QuerySet):
+    """
+    QuerySet списка записей в админке. Если фильтры списка выражаются условиями на
+    агрегаты (rollups — archive.LedgerRollups), даты для date_hierarchy берутся из
+    агрегатов, а не SELECT DISTINCT с усечением даты и MIN/MAX по всем записям выборки.
+    rollups задаётся только у выборки самого списка и не переходит в производные QuerySet.
+    """
+    rollups = None
+
+    def aggregate(self, *args, **kwargs):
+        # date_hierarchy выбирает начальный уровень по первой и последней дате выборки:
+        # ему достаточно первого и последнего месяца из агрегатов
+        if self.rollups is None or args or not all(self.is_date_bound(value) for value in kwargs.values()):
+            return super().aggregate(*args, **kwargs)
+        first, last = self.rollups.month_bounds()
+        bounds = {Min: first, Max: last}
+        return {
+            name: day_start(bounds[type(value)]) if first else None for name, value in kwargs.items()
+        }
+
+    @staticmethod
+    def is_date_bound(expression):
+        return type(expression) in (Min, Max) and expression.source_expressions[0].name == "created_at"
+
+    def datetimes(self, field_name, kind, order="ASC", tzinfo=None):
+        if self.rollups is None or field_name != "created_at":
+            return super().datetimes(field_name, kind, order, tzinfo)
+        days = self.rollups.dates(kind)
+        return [day_start(day) for day in (reversed(days) if order == "DESC" else days)]
+
+
+class LedgerChangeList(ChangeList):
+    # Агрегаты привязываются к выборке списка: по ним считает пагинатор и date_hierarchy
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        queryset.rollups = self.model_admin.changelist_rollups(request)
+        return queryset
+
+
+def hierarchy_range(year=None, month=None, day=None):
+    """
+    Диапазон дат [с, по] выбранного в date_hierarchy года, месяца или дня.
+    """
+    if year is None or (day is not None and month is None):
+        raise ValueError("Не выбран год или месяц")
+    if day is not None:
+        return date(year, month, day), date(year, month, day)
+    if month is not None:
+        return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+    return date(year, 1, 1), date(year, 12, 31)
 
 
 @admin.register(CashFlow)
 class CashflowRecordAdmin(admin.ModelAdmin):
-    list_display = ("id", "created_at", "status", "type", "category", "subcategory", "amount")
-    list_filter = ("status", "type", "category")
-    search_fields = ("comment",)
\ No newline at end of file
+    form = CashFlowAdminForm
+    list_display = ("id", "created_at", "status", "type", "category", "subcategory", "amount", "currency")
+    # Справочники строк страницы читаются соединениями в том же запросе: __str__ категории
+    # и подкатегории выводит и родительские справочники
+    list_select_related = ("status", "type", "category__type", "subcategory__category__type")
+    list_filter = (StatusListFilter, TypeListFilter, CategoryListFilter, CurrencyListFilter)
+    search_fields = ("comment",)
+    date_hierarchy = "created_at"
+    # Порядок индекса по дате: страницы и диапазоны date_hierarchy читаются по индексу
+    ordering = ("-created_at", "-id")
+    autocomplete_fields = ("status", "type", "category", "subcategory")
+    paginator = EstimatedCountPaginator
+    # Без второго COUNT(*) по всей таблице ради «N из M» и без подсчёта фасетов фильтров
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    actions = ["delete_selected_cashflows"]
+
+    # Фильтры списка, которые выражаются условиями на агрегаты
+    rollup_filters = {
+        StatusListFilter.parameter_name: "status_id",
+        TypeListFilter.parameter_name: "type_id",
+        CategoryListFilter.parameter_name: "category_id",
+    }
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return LedgerQuerySet(self.model, query=queryset.query, using=queryset.db)
+
+    def get_changelist(self, request, **kwargs):
+        return LedgerChangeList
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        rollups = getattr(queryset, "rollups", None)
+        return self.paginator(
+            queryset, per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page,
+            estimate=rollups.count if rollups else None,
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу комментариев вместо сканирования comment__icontains
+        return search_cashflows(queryset, search_term), False
+
+    def changelist_rollups(self, request):
+        """
+        Агрегаты, равносильные фильтрам и дате date_hierarchy списка, или None, если
+        список отфильтрован тем, чего в агрегатах нет: поиском, валютой, другими условиями.
+        """
+        dimensions = {}
+        dates = {}
+        prefix = f"{self.date_hierarchy}__"
+        for name, values in request.GET.lists():
+            value = values[-1]
+            if name in CHANGELIST_SERVICE_PARAMS or (name == SEARCH_VAR and not value.strip()):
+                continue
+            try:
+                if name in self.rollup_filters:
+                    dimensions[self.rollup_filters[name]] = int(value)
+                elif name in (f"{prefix}year", f"{prefix}month", f"{prefix}day"):
+                    dates[name.removeprefix(prefix)] = int(value)
+                else:
+                    return None
+            except ValueError:
+                return None
+        try:
+            date_from, date_to = hierarchy_range(**dates) if dates else (None, None)
+        except ValueError:
+            return None
+        return LedgerRollups(self.model, dimensions, date_from, date_to)
+
+    def estimated_count(self, queryset):
+        rollups = getattr(queryset, "rollups", None)
+        return rollups.count() if rollups else queryset.count()
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # delete_selected загружает все выбранные записи и удаляет их по одной с сигналами
+        actions.pop("delete_selected", None)
+        if not actions or not self.has_change_permission(request):
+            return actions
+        for status in get_dictionaries().statuses:
+            name = f"set_status_{status.pk}"
+            description = f"Сменить статус на «{status.name}»".replace("%", "%%")
+            actions[name] = (partial(type(self).set_status, status=status), name, description)
+        return actions
+
+    def set_status(self, request, queryset, status):
+        """
+        Смена статуса одним UPDATE с пересборкой агрегатов за даты записей (bulk.update_cashflows).
+        """
+        updated = update_cashflows(queryset, {"status": status})
+        self.message_user(request, f"Изменено записей: {updated}", messages.SUCCESS)
+
+    @admin.action(permissions=["delete"], description="Удалить выбранные записи ДДС")
+    def delete_selected_cashflows(self, request, queryset):
+        """
+        Удаление одним DELETE с пересборкой агрегатов (bulk.delete_cashflows) после подтверждения.
+        При выборе всех записей списка страница подтверждения передаёт дальше флаг select_across,
+        а не id каждой записи.
+        """
+        if request.POST.get("post"):
+            deleted = delete_cashflows(queryset)
+            self.message_user(request, f"Удалено записей: {deleted}", messages.SUCCESS)
+            return None
+        return TemplateResponse(request, "admin/mainApp/delete_cashflows_confirmation.html", {
+            **self.admin_site.each_context(request),
+            "title": "Удаление записей ДДС",
+            "opts": self.opts,
+            "count": self.estimated_count(queryset),
+            "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            "select_across": request.POST.get("select_across") == "1",
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+        })
+
+
+@admin.register(CashFlowArchive)
+class CashflowArchiveAdmin(CashflowRecordAdmin):
+    # Архив закрытых периодов только для чтения: записи попадают в него командой archive_cashflows
+    actions = None
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# Справочники нужны в админке и как источник поиска для полей autocomplete записей ДДС
+@admin.register(Status)
+class StatusAdmin(admin.ModelAdmin):
+    list_display = ("name",)
+    search_fields = ("name",)
+    ordering = ("name",)
+
+
+@admin.register(Type)
+class TypeAdmin(admin.ModelAdmin):
+    list_display = ("name",)
+    search_fields = ("name",)
+    ordering = ("name",)
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ("name", "type")
+    list_filter = ("type",)
+    search_fields = ("name",)
+    ordering = ("name",)
+    autocomplete_fields = ("type",)
+
+    def get_queryset(self, request):
+        # __str__ категории выводит тип: и в списке, и в ответах autocomplete
+        return super().get_queryset(request).select_related("type")
+
+
+@admin.register(SubCategory)
+class SubCategoryAdmin(admin.ModelAdmin):
+    list_display = ("name", "category")
+    search_fields = ("name",)
+    ordering = ("name",)
+    autocomplete_fields = ("category",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("category__type")
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    # Курсы загружаются командой load_exchange_rates, которая пересобирает агрегаты
+    list_display = ("currency", "date", "rate")
+    list_filter = ("currency",)
+    date_hierarchy = "date"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ("month", "category", "subcategory", "amount")
+    list_filter = ("month",)
+    list_select_related = ("category__type", "subcategory__category__type")
+    date_hierarchy = "month"
+
+
+@admin.register(RecurringRule)
+class RecurringRuleAdmin(admin.ModelAdmin):
+    # Записи по правилам создаёт команда generate_recurring (по расписанию)
+    form = RecurringRuleForm
+    list_display = ("name", "frequency", "interval", "start_date", "end_date", "next_date", "amount", "currency", "active")
+    list_filter = ("active", "frequency", "type", "currency")
+    list_select_related = ("type",)
+    search_fields = ("name",)
+    readonly_fields = ("next_date",)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class MainappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mainApp'
+
+    def ready(self):
+        # Подключение обработчиков сигналов (агрегаты ДДС, снимок справочников, учёт SQL)
+        # и проверок при запуске (компиляция шаблонов, кэширующий загрузчик)
+        from . import checks, signals  # noqa: F401
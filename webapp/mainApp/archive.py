@@ -0,0 +1,386 @@
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+
+from .filters import day_start, parse_date_param
+from .models import CashFlow, CashFlowArchive, CashFlowMonthlyRollup, CashFlowRollup
+from .page_cache import invalidate_cashflows
+from .rollups import _next_month
+
+
+# Оперативная таблица записей ДДС и архив закрытых периодов — от новых записей к старым
+LEDGER_MODELS = (CashFlow, CashFlowArchive)
+
+# Сколько записей переносится одним INSERT ... SELECT / DELETE
+ARCHIVE_BATCH_SIZE = 5000
+
+# Граница архива в общем кэше: "" — архив пуст. Меняется только при переносе записей
+ARCHIVE_BOUNDARY_KEY = "mainApp:archive_boundary"
+
+# Сколько секунд граница живёт в кэше. Перенос записей обновляет её в общем кэше сразу;
+# срок ограничивает устаревание, если кэш процесса не видит этого обновления
+ARCHIVE_BOUNDARY_TIMEOUT = 60
+
+
+def load_archive_boundary():
+    """
+    Граница архива по базе: первое число месяца после последней архивной записи
+    (записи переносятся целыми месяцами) или None, если архив пуст.
+    """
+    last = CashFlowArchive.objects.aggregate(last=Max("created_at"))["last"]
+    return _next_month(timezone.localdate(last)) if last else None
+
+
+def archive_boundary():
+    """
+    Граница архива: все записи раньше этой даты лежат в CashFlowArchive, все записи
+    с этой даты — в CashFlow. В установившемся режиме — одно чтение из кэша; для чтения
+    списков, выгрузки и админки. Проверки записи в закрытый период (форма, импорт,
+    регулярные операции) читают границу из базы: load_archive_boundary().
+    """
+    boundary = cache.get(ARCHIVE_BOUNDARY_KEY)
+    if boundary is None:
+        boundary = load_archive_boundary() or ""
+        # add(), а не set(): не перезаписывает границу, которую успел обновить перенос записей
+        cache.add(ARCHIVE_BOUNDARY_KEY, boundary, timeout=ARCHIVE_BOUNDARY_TIMEOUT)
+    return boundary or None
+
+
+async def aarchive_boundary():
+    """
+    Асинхронный вариант archive_boundary(): база читается в синхронном потоке только при промахе кэша.
+    """
+    boundary = await cache.aget(ARCHIVE_BOUNDARY_KEY)
+    if boundary is None:
+        return await sync_to_async(archive_boundary)()
+    return boundary or None
+
+
+def models_for_dates(date_from, boundary):
+    if boundary is None or date_from is None or date_from >= boundary:
+        return (CashFlow,)
+    return LEDGER_MODELS
+
+
+def params_boundary(params):
+    """
+    Граница архива, если от неё зависят таблицы выборки по фильтрам params (задана дата «с»),
+    иначе None: без даты «с» читается только оперативная таблица и граница не нужна.
+    """
+    return archive_boundary() if parse_date_param(params.get("date_from")) else None
+
+
+async def aparams_boundary(params):
+    """
+    Асинхронный вариант params_boundary().
+    """
+    return await aarchive_boundary() if parse_date_param(params.get("date_from")) else None
+
+
+def ledger_models(params):
+    """
+    Таблицы, которые нужно читать для фильтров params (от новых записей к старым).
+    По умолчанию — только оперативная таблица; архив добавляется, когда дата «с»
+    раньше границы архива. Граница читается только при заданной дате «с».
+    """
+    return models_for_dates(parse_date_param(params.get("date_from")), params_boundary(params))
+
+
+async def aledger_models(params):
+    """
+    Асинхронный вариант ledger_models().
+    """
+    return models_for_dates(parse_date_param(params.get("date_from")), await aparams_boundary(params))
+
+
+def ledger_queryset(models, build):
+    """
+    QuerySet записей по таблицам models: build(QuerySet таблицы) добавляет фильтры и порядок.
+    Для одной таблицы возвращается сам QuerySet, для нескольких — LedgerChain.
+    """
+    parts = [build(model.objects.all()) for model in models]
+    return parts[0] if len(parts) == 1 else LedgerChain(parts)
+
+
+class LedgerChain:
+    """
+    Записи оперативной таблицы и архива как одна последовательность для Paginator,
+    KeysetPaginator и шаблонов: count(), срезы, итерация (в том числе асинхронная),
+    filter() и order_by() применяются к каждой таблице.
+
+    Архив содержит только записи раньше границы, оперативная таблица — с границы,
+    поэтому при сортировке по дате таблицы не пересекаются: срез читается из первой
+    таблицы и дочитывается из следующей, каждый запрос идёт по индексам своей таблицы.
+    При другой сортировке (по релевантности) найденные свежие записи идут раньше архивных.
+    """
+
+    ordered = True
+
+    def __init__(self, parts, start=0, stop=None, counts=None):
+        self.parts = parts
+        self.model = parts[0].model
+        self.start = start
+        self.stop = stop
+        # Число записей каждой таблицы: общее для срезов одного запроса (Paginator
+        # сначала считает записи, потом берёт срез)
+        self.counts = {} if counts is None else counts
+        self._result = None
+
+    def filter(self, *args, **kwargs):
+        return LedgerChain([part.filter(*args, **kwargs) for part in self.parts])
+
+    def order_by(self, *fields):
+        parts = [part.order_by(*fields) for part in self.parts]
+        # По возрастанию даты архив идёт первым
+        newest_first = self.parts[0].model is CashFlow
+        if fields and fields[0] == "created_at" and newest_first:
+            parts.reverse()
+        elif fields and fields[0] == "-created_at" and not newest_first:
+            parts.reverse()
+        return LedgerChain(parts)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            return list(self)[key]
+        start = self.start + (key.start or 0)
+        stop = self.start + key.stop if key.stop is not None else self.stop
+        if self.stop is not None and stop is not None:
+            stop = min(stop, self.stop)
+        return LedgerChain(self.parts, start, stop, self.counts)
+
+    def part_count(self, index):
+        if index not in self.counts:
+            self.counts[index] = self.parts[index].count()
+        return self.counts[index]
+
+    async def apart_count(self, index):
+        if index not in self.counts:
+            self.counts[index] = await self.parts[index].acount()
+        return self.counts[index]
+
+    def count(self):
+        if self._result is not None:
+            return len(self._result)
+        if self.stop is None:
+            total = sum(self.part_count(index) for index in range(len(self.parts)))
+        else:
+            # Для ограниченного среза (подсчёт до предела) каждая таблица считается не дальше предела
+            total = 0
+            for part in self.parts:
+                if total >= self.stop:
+                    break
+                total += part[:self.stop - total].count()
+        return max(total - self.start, 0)
+
+    async def acount(self):
+        if self._result is not None:
+            return len(self._result)
+        if self.stop is None:
+            total = 0
+            for index in range(len(self.parts)):
+                total += await self.apart_count(index)
+        else:
+            total = 0
+            for part in self.parts:
+                if total >= self.stop:
+                    break
+                total += await part[:self.stop - total].acount()
+        return max(total - self.start, 0)
+
+    def _fetch(self):
+        rows = []
+        start, stop = self.start, self.stop
+        for index, part in enumerate(self.parts):
+            if stop is not None and stop <= 0:
+                break
+            if start:
+                size = self.part_count(index)
+                if start >= size:
+                    start -= size
+                    stop = stop - size if stop is not None else None
+                    continue
+            chunk = list(part[start:stop])
+            rows.extend(chunk)
+            stop = stop - start - len(chunk) if stop is not None else None
+            start = 0
+        return rows
+
+    async def _afetch(self):
+        rows = []
+        start, stop = self.start, self.stop
+        for index, part in enumerate(self.parts):
+            if stop is not None and stop <= 0:
+                break
+            if start:
+                size = await self.apart_count(index)
+                if start >= size:
+                    start -= size
+                    stop = stop - size if stop is not None else None
+                    continue
+            chunk = [obj async for obj in part[start:stop]]
+            rows.extend(chunk)
+            stop = stop - start - len(chunk) if stop is not None else None
+            start = 0
+        return rows
+
+    def _rows(self):
+        if self._result is None:
+            self._result = self._fetch()
+        return self._result
+
+    def __iter__(self):
+        return iter(self._rows())
+
+    async def __aiter__(self):
+        if self._result is None:
+            self._result = await self._afetch()
+        for obj in self._result:
+            yield obj
+
+    def __len__(self):
+        return len(self._rows())
+
+    def __bool__(self):
+        return bool(len(self))
+
+
+class LedgerRollups:
+    """
+    Число записей и даты записей одной таблицы (оперативной или архива) по агрегатам —
+    без COUNT(*) и DISTINCT по самой таблице записей.
+
+    dimensions — условия на справочники ({"status_id": 1}), date_from и date_to — даты
+    записей включительно. Агрегаты общие для обеих таблиц, но граница архива проходит
+    по первому числу месяца, поэтому и дневные, и месячные строки делятся между
+    таблицами целиком. Месячные строки читаются, когда диапазон состоит из целых месяцев.
+    """
+
+    def __init__(self, model, dimensions=None, date_from=None, date_to=None):
+        self.model = model
+        self.dimensions = dimensions or {}
+        self.date_from = date_from
+        self.date_to = date_to
+
+    @property
+    def daily(self):
+        if self.date_from is None or self.date_to is None:
+            return False
+        return self.date_from.day != 1 or (self.date_to + timedelta(days=1)).day != 1
+
+    def rollups(self, daily):
+        model, field = (CashFlowRollup, "date") if daily else (CashFlowMonthlyRollup, "month")
+        rollups = model.objects.filter(count__gt=0, **self.dimensions)
+        boundary = archive_boundary()
+        if boundary:
+            lookup = "gte" if self.model is CashFlow else "lt"
+            rollups = rollups.filter(**{f"{field}__{lookup}": boundary})
+        elif self.model is not CashFlow:
+            return rollups.none()
+        if self.date_from:
+            rollups = rollups.filter(**{f"{field}__gte": self.date_from if daily else self.date_from.replace(day=1)})
+        if self.date_to:
+            rollups = rollups.filter(**{f"{field}__lte": self.date_to})
+        return rollups
+
+    def count(self):
+        return self.rollups(self.daily).aggregate(count=Sum("count"))["count"] or 0
+
+    def month_bounds(self):
+        """
+        Первый и последний месяц, в которых есть записи (None, None — записей нет).
+        """
+        bounds = self.rollups(daily=False).aggregate(first=Min("month"), last=Max("month"))
+        return bounds["first"], bounds["last"]
+
+    def dates(self, kind):
+        """
+        Даты, на которые есть записи, усечённые до kind ("year", "month" или "day"), по возрастанию.
+        """
+        if kind == "day":
+            days = self.rollups(daily=True).values_list("date", flat=True)
+        else:
+            days = self.rollups(daily=False).values_list("month", flat=True)
+        days = days.order_by().distinct()
+        if kind == "year":
+            return sorted({day.replace(month=1, day=1) for day in days})
+        return sorted(days)
+
+
+def archive_months(before):
+    """
+    Месяцы оперативной таблицы раньше даты before (первое число месяца) — от старых к новым.
+    """
+    first = CashFlow.objects.filter(created_at__lt=day_start(before)).aggregate(first=Min("created_at"))["first"]
+    if first is None:
+        return []
+    months = []
+    month = timezone.localdate(first).replace(day=1)
+    while month < before:
+        months.append(month)
+        month = _next_month(month)
+    return months
+
+
+def _copy_statement():
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in CashFlow._meta.concrete_fields)
+    return (
+        f"INSERT INTO {connection.ops.quote_name(CashFlowArchive._meta.db_table)} ({columns}) "
+        f"SELECT {columns} FROM {connection.ops.quote_name(CashFlow._meta.db_table)} WHERE "
+    )
+
+
+def archive_cashflows(before, batch_size=ARCHIVE_BATCH_SIZE, on_month=None):
+    """
+    Переносит записи ДДС раньше даты before (первое число месяца) в архив.
+
+    Записи переносятся с теми же id пакетами по batch_size (INSERT ... SELECT и DELETE
+    в обход сигналов): агрегаты не меняются, потому что архивные записи по-прежнему
+    в них учтены. Каждый месяц переносится в своей транзакции, поэтому и при
+    прерывании граница архива проходит по целому месяцу.
+    on_month(месяц, перенесено записей, секунды) вызывается после каждого месяца.
+    Возвращает число перенесённых записей.
+    """
+    if before.day != 1:
+        raise ValueError("Граница архива должна быть первым числом месяца")
+    copy = _copy_statement()
+    moved = 0
+    for month in archive_months(before):
+        started = time.perf_counter()
+        month_moved = 0
+        with transaction.atomic():
+            source = CashFlow.objects.filter(created_at__lt=day_start(_next_month(month)))
+            while True:
+                ids = list(source.order_by("created_at", "id").values_list("id", flat=True)[:batch_size])
+                if not ids:
+                    break
+                placeholders = ", ".join(["%s"] * len(ids))
+                with connection.cursor() as cursor:
+                    cursor.execute(f"{copy}id IN ({placeholders})", ids)
+                CashFlow.objects.filter(id__in=ids)._raw_delete(CashFlow.objects.db)
+                month_moved += len(ids)
+        if month_moved:
+            # Новая граница видна всем процессам сразу после переноса месяца
+            cache.set(ARCHIVE_BOUNDARY_KEY, load_archive_boundary() or "", timeout=ARCHIVE_BOUNDARY_TIMEOUT)
+            invalidate_cashflows()
+        moved += month_moved
+        if on_month:
+            on_month(month, month_moved, time.perf_counter() - started)
+    return moved
+
+
+def clear_archive():
+    """
+    Удаляет все архивные записи (в обход сигналов, агрегаты не меняются) и сбрасывает
+    границу архива. Возвращает число удалённых записей.
+    """
+    deleted = CashFlowArchive.objects.all()._raw_delete(CashFlowArchive.objects.db)
+    cache.delete(ARCHIVE_BOUNDARY_KEY)
+    transaction.on_commit(lambda: cache.delete(ARCHIVE_BOUNDARY_KEY))
+    if deleted:
+        invalidate_cashflows()
+    return deleted
@@ -0,0 +1,223 @@
+import csv
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .dictionaries import get_dictionaries
+from .filters import filter_by_dictionaries
+from .imports import DictionaryIndex, ImportResult, ImportRowError, parse_amount
+from .models import Budget, CashFlowMonthlyRollup
+
+
+# Параметры GET-запроса отчёта «план — факт»
+BUDGET_PARAMS = ("month_from", "month_to", "status", "type", "category", "overruns")
+
+# Заголовки колонок файла бюджетов (пустая подкатегория — бюджет всей категории)
+BUDGET_HEADER = ["Месяц", "Категория", "Подкатегория", "Сумма"]
+
+
+def parse_month_param(value):
+    """
+    Разбирает месяц из GET-параметра в формате YYYY-MM (или дату YYYY-MM-DD).
+    Возвращает первое число месяца или None для пустого или некорректного значения.
+    """
+    if not value:
+        return None
+    try:
+        year, month = value.strip().split("-")[:2]
+        return date(int(year), int(month), 1)
+    except ValueError:
+        return None
+
+
+class BudgetLine:
+    """
+    Строка отчёта «план — факт»: бюджет категории или подкатегории на месяц и факт
+    по месячным агрегатам. Отклонение — план минус факт: отрицательное при перерасходе.
+    """
+
+    def __init__(self, pk, month, category, subcategory, plan, actual, count):
+        self.pk = pk
+        self.month = month
+        self.category = category
+        self.subcategory = subcategory
+        self.plan = plan
+        self.actual = actual
+        self.count = count
+
+    @property
+    def label(self):
+        return str(self.subcategory or self.category)
+
+    @property
+    def variance(self):
+        return self.plan - self.actual
+
+    @property
+    def overrun(self):
+        return self.actual > self.plan
+
+    @property
+    def used_percent(self):
+        return round(self.actual * 100 / self.plan, 1) if self.plan else None
+
+
+class BudgetReport:
+    """
+    Строки отчёта за период и итоги по ним.
+    """
+
+    def __init__(self, month_from, month_to, lines):
+        self.month_from = month_from
+        self.month_to = month_to
+        self.lines = lines
+        self.plan = sum((line.plan for line in lines), Decimal(0))
+        self.actual = sum((line.actual for line in lines), Decimal(0))
+        self.variance = self.plan - self.actual
+        self.overruns = sum(1 for line in lines if line.overrun)
+
+
+def budget_actuals(month_from, month_to, params):
+    """
+    Факт за месяцы [month_from, month_to] одним сгруппированным запросом к месячным
+    агрегатам: словари (месяц, id подкатегории) и (месяц, id категории) → [сумма, записей].
+    Таблица записей ДДС (и архив) не читается: месячные агрегаты поддерживаются
+    инкрементально, а строк в них на порядки меньше.
+    """
+    rollups = filter_by_dictionaries(
+        CashFlowMonthlyRollup.objects.filter(month__gte=month_from, month__lte=month_to),
+        {"status": params.get("status")},
+    )
+    by_subcategory = {}
+    by_category = {}
+    rows = (
+        rollups.values_list("month", "category_id", "subcategory_id")
+        .annotate(total=Sum("total"), count=Sum("count"))
+        .order_by()
+    )
+    for month, category_id, subcategory_id, total, count in rows:
+        by_subcategory[(month, subcategory_id)] = [total, count]
+        group = by_category.setdefault((month, category_id), [Decimal(0), 0])
+        group[0] += total
+        group[1] += count
+    return by_subcategory, by_category
+
+
+def budget_report(params):
+    """
+    Отчёт «план — факт» за месяцы month_from..month_to (по умолчанию текущий месяц).
+
+    Два запроса независимо от числа строк бюджета: строки бюджета за период и
+    факт из месячных агрегатов (budget_actuals). Категории и подкатегории берутся из
+    снимка справочников, фильтры по типу и категории применяются в памяти,
+    фильтр по статусу — к факту. С overruns=1 остаются только строки с перерасходом.
+    """
+    month_from = parse_month_param(params.get("month_from")) or timezone.localdate().replace(day=1)
+    month_to = parse_month_param(params.get("month_to")) or month_from
+    month_to = max(month_to, month_from)
+    snapshot = get_dictionaries()
+    by_subcategory, by_category = budget_actuals(month_from, month_to, params)
+
+    type_id = _int_param(params.get("type"))
+    category_id = _int_param(params.get("category"))
+    overruns_only = params.get("overruns") == "1"
+    lines = []
+    budgets = Budget.objects.filter(month__gte=month_from, month__lte=month_to).values_list(
+        "id", "month", "category_id", "subcategory_id", "amount"
+    )
+    for pk, month, budget_category_id, subcategory_id, plan in budgets:
+        if subcategory_id is not None:
+            subcategory = snapshot.get("subcategories", subcategory_id)
+            if subcategory is None:
+                continue
+            category = subcategory.category
+            actual, count = by_subcategory.get((month, subcategory_id), (Decimal(0), 0))
+        else:
+            subcategory = None
+            category = snapshot.get("categories", budget_category_id)
+            if category is None:
+                continue
+            actual, count = by_category.get((month, budget_category_id), (Decimal(0), 0))
+        if type_id and category.type_id != type_id or category_id and category.pk != category_id:
+            continue
+        line = BudgetLine(pk, month, category, subcategory, plan, actual, count)
+        if overruns_only and not line.overrun:
+            continue
+        lines.append(line)
+    lines.sort(key=lambda line: (line.month, line.label))
+    return BudgetReport(month_from, month_to, lines)
+
+
+def _int_param(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def import_budgets(stream, batch_size=5000, max_errors=1000):
+    """
+    Загружает бюджеты из CSV с колонками BUDGET_HEADER: месяц YYYY-MM, категория по
+    названию, подкатегория этой категории (пустая — бюджет всей категории) и сумма.
+    Бюджет на уже заданные месяц и категорию (подкатегорию) заменяется. Строки
+    проверяются по снимку справочников без запросов к базе и вставляются пакетами
+    bulk_create с обновлением при конфликте; ошибочные строки попадают в отчёт.
+    """
+    started = time.perf_counter()
+    result = ImportResult()
+    index = DictionaryIndex()
+    # Пакеты по ключу: повтор строки в файле заменяет сумму, а не даёт конфликт в одном INSERT
+    batches = {"category": {}, "subcategory": {}}
+
+    def flush(field):
+        batch = batches[field]
+        with transaction.atomic():
+            Budget.objects.bulk_create(
+                batch.values(), update_conflicts=True, unique_fields=["month", field], update_fields=["amount"],
+            )
+        result.created += len(batch)
+        batch.clear()
+
+    for line, row in enumerate(csv.reader(stream), start=1):
+        cells = [cell.strip().lstrip("\ufeff") for cell in row]
+        if line == 1 and cells == BUDGET_HEADER:
+            continue
+        if not any(cells):
+            continue
+        result.processed += 1
+        try:
+            if len(cells) < 4:
+                raise ImportRowError(f"Ожидается 4 колонки, получено {len(cells)}")
+            month = parse_month_param(cells[0])
+            if month is None:
+                raise ImportRowError(f"Некорректный месяц «{cells[0]}»")
+            category_id, _ = index.categories.get(cells[1].lower(), (None, None))
+            if category_id is None:
+                raise ImportRowError(f"Неизвестная категория «{cells[1]}»")
+            amount = parse_amount(cells[3])
+            if cells[2]:
+                subcategory_id = index.subcategories.get((category_id, cells[2].lower()))
+                if subcategory_id is None:
+                    raise ImportRowError(f"Подкатегория «{cells[2]}» не принадлежит категории «{cells[1]}»")
+                field, budget = "subcategory", Budget(month=month, subcategory_id=subcategory_id, amount=amount)
+                key = (month, subcategory_id)
+            else:
+                field, budget = "category", Budget(month=month, category_id=category_id, amount=amount)
+                key = (month, category_id)
+        except ImportRowError as exc:
+            result.error_count += 1
+            if len(result.errors) < max_errors:
+                result.errors.append((line, str(exc)))
+            continue
+        batches[field][key] = budget
+        if len(batches[field]) >= batch_size:
+            flush(field)
+    for field in batches:
+        if batches[field]:
+            flush(field)
+    result.elapsed = time.perf_counter() - started
+    return result
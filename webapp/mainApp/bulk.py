@@ -0,0 +1,139 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from .filters import FILTER_PARAMS, filter_cashflows
+from .models import CashFlow
+from .page_cache import invalidate_cashflows
+from .rollups import rebuild_rollups
+
+
+# Параметр с id отмеченных записей (может повторяться: ?ids=1&ids=2)
+ID_PARAM = "ids"
+# Больше id за один запрос не принимается: все они попадают в одно условие IN
+BULK_MAX_IDS = 1000
+
+
+class BulkSelectionError(Exception):
+    pass
+
+
+def selection_filters(params):
+    """
+    Непустые фильтры списка из параметров запроса.
+    """
+    return {name: params.get(name) for name in FILTER_PARAMS if params.get(name)}
+
+
+def select_cashflows(params):
+    """
+    Записи для массовой операции: отмеченные id (параметр ids), а если их нет —
+    все записи, подходящие под фильтры списка. Без id и без фильтров бросает
+    BulkSelectionError, чтобы случайно не изменить всю таблицу.
+    """
+    ids = [value for value in params.getlist(ID_PARAM) if value]
+    if ids:
+        if len(ids) > BULK_MAX_IDS:
+            raise BulkSelectionError(f"За один раз можно выбрать не больше {BULK_MAX_IDS} записей")
+        try:
+            ids = [int(value) for value in ids]
+        except ValueError:
+            raise BulkSelectionError("Неверный id записи")
+        return CashFlow.objects.filter(id__in=ids)
+    filters = selection_filters(params)
+    if not filters:
+        raise BulkSelectionError("Отметьте записи в списке или задайте хотя бы один фильтр")
+    return filter_cashflows(CashFlow.objects.all(), filters)
+
+
+def chain_conflicts(qs, changes):
+    """
+    Нарушения связей тип → категория → подкатегория, которые появятся у записей qs
+    после изменения: новое значение одного поля сверяется с прежним значением соседнего
+    у самих записей. Все условия считаются одним агрегатным запросом.
+    Возвращает {поле формы: сообщение}. Пары, заданные в changes целиком, проверяет форма.
+    """
+    type_obj = changes.get("type")
+    category_obj = changes.get("category")
+    subcategory_obj = changes.get("subcategory")
+    conditions = {}
+    if type_obj and not category_obj:
+        conditions["type"] = (
+            ~Q(category__type_id=type_obj.pk),
+            f"Категории записей не принадлежат типу «{type_obj}»",
+        )
+    if category_obj and not type_obj:
+        conditions["category"] = (
+            ~Q(type_id=category_obj.type_id),
+            f"Категория «{category_obj}» не принадлежит типу записей",
+        )
+    if category_obj and not subcategory_obj:
+        conditions["subcategory"] = (
+            ~Q(subcategory__category_id=category_obj.pk),
+            f"Подкатегории записей не принадлежат категории «{category_obj}»",
+        )
+    if subcategory_obj and not category_obj:
+        conditions["subcategory"] = (
+            ~Q(category_id=subcategory_obj.category_id),
+            f"Подкатегория «{subcategory_obj}» не принадлежит категории записей",
+        )
+    if not conditions:
+        return {}
+    counts = qs.order_by().aggregate(**{
+        field: Count("id", filter=condition) for field, (condition, _) in conditions.items()
+    })
+    return {
+        field: f"{message} (записей: {counts[field]})"
+        for field, (_, message) in conditions.items()
+        if counts[field]
+    }
+
+
+def _date_bounds(qs):
+    bounds = qs.order_by().aggregate(first=Min("created_at"), last=Max("created_at"))
+    if bounds["first"] is None:
+        return None
+    return timezone.localdate(bounds["first"]), timezone.localdate(bounds["last"])
+
+
+def update_cashflows(qs, changes):
+    """
+    Изменяет справочники записей qs одним UPDATE: changes — {поле: объект справочника}.
+    Связи с прежними значениями проверяются в той же транзакции (ValidationError
+    с ошибками по полям, записи не меняются). Агрегаты пересобираются за диапазон
+    дат изменённых записей, как после импорта. Возвращает число изменённых записей.
+    """
+    values = {f"{field}_id": obj.pk for field, obj in changes.items()}
+    if "subcategory" in changes:
+        values["taxonomy_path"] = str(changes["subcategory"])
+    with transaction.atomic():
+        conflicts = chain_conflicts(qs, changes)
+        if conflicts:
+            raise ValidationError(conflicts)
+        # Диапазон считается до UPDATE: после него записи могут не подходить под фильтры
+        bounds = _date_bounds(qs)
+        if bounds is None:
+            return 0
+        updated = qs.update(**values)
+        rebuild_rollups(*bounds)
+    invalidate_cashflows()
+    return updated
+
+
+def delete_cashflows(qs):
+    """
+    Удаляет записи qs одним DELETE и пересобирает агрегаты за диапазон их дат.
+    Возвращает число удалённых записей.
+    """
+    with transaction.atomic():
+        bounds = _date_bounds(qs)
+        if bounds is None:
+            return 0
+        # QuerySet.delete() загрузил бы все записи ради сигналов post_delete (запросы
+        # к агрегатам на каждую запись); на записи ДДС не ссылается ни одна модель,
+        # поэтому каскад не нужен, а агрегаты пересобираются ниже
+        deleted = qs._raw_delete(qs.db)
+        rebuild_rollups(*bounds)
+    invalidate_cashflows()
+    return deleted
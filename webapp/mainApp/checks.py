@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+
+from .startup import compile_templates
+
+
+CACHED_LOADER = "django.template.loaders.cached.Loader"
+
+
+@register(Tags.templates)
+def check_templates_compile(app_configs, **kwargs):
+    """
+    Все шаблоны проекта компилируются: синтаксическая ошибка или неизвестный тег
+    обнаруживаются при запуске, а не на первом запросе к странице.
+    """
+    return [
+        Error(f"Шаблон {name} не компилируется: {exc}", obj=name, id="mainApp.E001")
+        for name, exc in compile_templates()
+    ]
+
+
+@register(Tags.templates)
+def check_cached_loader(app_configs, **kwargs):
+    """
+    Без DEBUG шаблоны должны загружаться через кэширующий загрузчик, иначе каждый
+    запрос заново читает и разбирает файлы шаблонов.
+    """
+    if settings.DEBUG:
+        return []
+    warnings = []
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        loaders = engine.engine.loaders
+        if not any((loader[0] if isinstance(loader, (list, tuple)) else loader) == CACHED_LOADER for loader in loaders):
+            warnings.append(Warning(
+                f"Движок шаблонов {engine.name} работает без кэширующего загрузчика",
+                hint=f"Добавьте {CACHED_LOADER} в OPTIONS['loaders'] (см. TEMPLATES в settings.py).",
+                id="mainApp.W001",
+            ))
+    return warnings
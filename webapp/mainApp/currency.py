@@ -0,0 +1,310 @@
+import csv
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import ExchangeRate, currency_symbol
+from .versions import bump_version, current_version
+
+
+# Имя версии курсов (см. versions.py): меняется при загрузке курсов и сбрасывает
+# кэш курсов во всех процессах
+RATES_VERSION = "exchange_rates"
+
+CENT = Decimal("0.01")
+ONE = Decimal(1)
+
+# Колонки файла курсов; nominal (необязательная) — за сколько единиц валюты указан курс
+RATE_FILE_COLUMNS = ("date", "currency", "rate")
+RATE_DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y")
+
+
+class MissingRateError(Exception):
+    """
+    Нет курса валюты на дату (ни на саму дату, ни раньше неё).
+    """
+
+    def __init__(self, currency, day):
+        self.currency = currency
+        self.day = day
+        super().__init__(f"Нет курса {currency} на {day:%d.%m.%Y}: загрузите курсы командой load_exchange_rates")
+
+
+class RateFileError(Exception):
+    pass
+
+
+class RateCache:
+    """
+    LRU-кэш курсов в памяти процесса: (валюта, дата) → курс. Кэш относится к одной версии
+    курсов (общей для процессов, см. CACHE_BACKEND) и очищается при её смене. Отсутствие
+    курса не кэшируется: курсы могут загрузить в любой момент, а повторный запрос к базе
+    дешевле, чем отказ в валюте до перезапуска процесса.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.version = None
+        self._rates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, version, pairs):
+        """
+        Возвращает (найденные курсы, пары без курса в кэше).
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            if version != self.version:
+                self._rates.clear()
+                self.version = version
+            for pair in pairs:
+                if pair in self._rates:
+                    self._rates.move_to_end(pair)
+                    found[pair] = self._rates[pair]
+                else:
+                    missing.append(pair)
+        return found, missing
+
+    def store(self, version, rates):
+        with self._lock:
+            if version != self.version:
+                return
+            self._rates.update((pair, rate) for pair, rate in rates.items() if rate is not None)
+            while len(self._rates) > self.maxsize:
+                self._rates.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._rates.clear()
+            self.version = None
+
+
+_rate_cache = RateCache(settings.RATE_CACHE_SIZE)
+
+
+def reporting_currency():
+    return settings.REPORTING_CURRENCY
+
+
+def currency_context():
+    """
+    Валюта отчётности для шаблонов списка и панели аналитики.
+    """
+    return {
+        "reporting_currency": reporting_currency(),
+        "reporting_symbol": currency_symbol(reporting_currency()),
+    }
+
+
+def load_rates(pairs):
+    """
+    Курсы для пар (валюта, дата) из базы: один запрос на валюту. Курсы читаются от
+    последней нужной даты назад до курса, действующего на первую нужную дату, и
+    раскладываются по датам двоичным поиском. Для пар без курса возвращается None.
+    """
+    days_by_currency = {}
+    for currency, day in pairs:
+        days_by_currency.setdefault(currency, set()).add(day)
+    rates = {}
+    for currency, days in days_by_currency.items():
+        first = min(days)
+        dates, values = [], []
+        history = (
+            ExchangeRate.objects.filter(currency=currency, date__lte=max(days))
+            .order_by("-date").values_list("date", "rate")
+        )
+        for date, rate in history.iterator(chunk_size=1000):
+            dates.append(date)
+            values.append(rate)
+            if date <= first:
+                break
+        dates.reverse()
+        values.reverse()
+        for day in days:
+            index = bisect_right(dates, day) - 1
+            rates[(currency, day)] = values[index] if index >= 0 else None
+    return rates
+
+
+def get_rates(pairs):
+    """
+    Курсы к валюте отчётности для набора пар (валюта, дата): словарь пара → курс или
+    None, если курса нет. Курс валюты отчётности — 1 без обращения к кэшу; остальные
+    берутся из LRU-кэша процесса, а промахи читаются из базы одним запросом на валюту.
+    """
+    reporting = reporting_currency()
+    rates = {}
+    pairs = set(pairs)
+    for pair in pairs:
+        if pair[0] == reporting:
+            rates[pair] = ONE
+    pairs.difference_update(rates)
+    if not pairs:
+        return rates
+    version = current_version(RATES_VERSION)
+    found, missing = _rate_cache.lookup(version, pairs)
+    rates.update(found)
+    if missing:
+        loaded = load_rates(missing)
+        _rate_cache.store(version, loaded)
+        rates.update(loaded)
+    return rates
+
+
+def first_rate_dates():
+    """
+    Дата первого загруженного курса каждой валюты: курс на любую дату не раньше неё есть.
+    """
+    return dict(ExchangeRate.objects.values_list("currency").annotate(first=Min("date")).order_by())
+
+
+def get_rate(currency, day):
+    rate = get_rates([(currency, day)])[(currency, day)]
+    if rate is None:
+        raise MissingRateError(currency, day)
+    return rate
+
+
+def convert(amount, rate):
+    """
+    Сумма в валюте отчётности по курсу, с округлением до копеек.
+    """
+    return (amount * rate).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def convert_amount(amount, currency, day):
+    return convert(amount, get_rate(currency, day))
+
+
+def convert_rows(rows):
+    """
+    Пересчитывает пакет записей в валюту отчётности за два прохода: сначала собираются
+    все пары (валюта, дата) пакета и курсы к ним читаются разом, затем суммы
+    умножаются на курсы. rows — кортежи (сумма, валюта, дата); возвращает список сумм.
+    Если для какой-то записи нет курса, поднимает MissingRateError.
+    """
+    rates = get_rates((currency, day) for amount, currency, day in rows)
+    converted = []
+    for amount, currency, day in rows:
+        rate = rates[(currency, day)]
+        if rate is None:
+            raise MissingRateError(currency, day)
+        converted.append(convert(amount, rate))
+    return converted
+
+
+def annotate_converted(cashflows):
+    """
+    Проставляет записям страницы списка converted_amount — сумму в валюте отчётности
+    (для записей в валюте отчётности — саму сумму, None, если курса нет). Курсы
+    читаются одним пакетом, а страница только в валюте отчётности не читает ничего.
+    """
+    cashflows = list(cashflows)
+    reporting = reporting_currency()
+    rates = get_rates(
+        (cashflow.currency, timezone.localdate(cashflow.created_at))
+        for cashflow in cashflows if cashflow.currency != reporting
+    )
+    for cashflow in cashflows:
+        if cashflow.currency == reporting:
+            cashflow.converted_amount = cashflow.amount
+            continue
+        rate = rates[(cashflow.currency, timezone.localdate(cashflow.created_at))]
+        cashflow.converted_amount = convert(cashflow.amount, rate) if rate is not None else None
+    return cashflows
+
+
+async def aannotate_converted(cashflows):
+    """
+    Асинхронный вариант annotate_converted(): курсы читаются в синхронном потоке,
+    только если на странице есть записи не в валюте отчётности.
+    """
+    cashflows = list(cashflows)
+    reporting = reporting_currency()
+    if any(cashflow.currency != reporting for cashflow in cashflows):
+        return await sync_to_async(annotate_converted)(cashflows)
+    return annotate_converted(cashflows)
+
+
+def parse_rate_row(row, line):
+    try:
+        value = row["date"].strip()
+        for fmt in RATE_DATE_FORMATS:
+            try:
+                day = datetime.strptime(value, fmt).date()
+                break
+            except ValueError:
+                continue
+        else:
+            raise RateFileError(f"Строка {line}: некорректная дата «{value}»")
+        currency = row["currency"].strip().upper()
+        if len(currency) != 3:
+            raise RateFileError(f"Строка {line}: некорректный код валюты «{row['currency']}»")
+        rate = Decimal(row["rate"].strip().replace(",", "."))
+        nominal = Decimal((row.get("nominal") or "1").strip().replace(",", "."))
+    except InvalidOperation:
+        raise RateFileError(f"Строка {line}: некорректный курс или номинал")
+    if not rate.is_finite() or not nominal.is_finite() or rate <= 0 or nominal <= 0:
+        raise RateFileError(f"Строка {line}: курс и номинал должны быть положительными")
+    return currency, day, (rate / nominal).quantize(Decimal("1e-8"), rounding=ROUND_HALF_UP)
+
+
+def import_rates(stream, delimiter=",", batch_size=5000):
+    """
+    Загружает курсы к валюте отчётности из CSV с заголовком date,currency,rate[,nominal]
+    (курс — сколько единиц валюты отчётности стоят nominal единиц валюты). Курсы на уже
+    загруженные даты заменяются. Файл загружается целиком в одной транзакции или не
+    загружается вовсе (RateFileError с номером строки); строки валюты отчётности пропускаются.
+    Возвращает словарь валюта → (число курсов, первая дата).
+    """
+    reader = csv.DictReader(stream, delimiter=delimiter)
+    header = [name.strip().lstrip("\ufeff").lower() for name in reader.fieldnames or []]
+    missing = [column for column in RATE_FILE_COLUMNS if column not in header]
+    if missing:
+        raise RateFileError(f"В заголовке файла нет колонок: {', '.join(missing)}")
+    reader.fieldnames = header
+    reporting = reporting_currency()
+    loaded = {}
+    # Пакет по ключу (валюта, дата): повтор даты в файле заменяет курс, а не даёт
+    # две строки с одним ключом в одном INSERT ... ON CONFLICT
+    batch = {}
+
+    def flush():
+        ExchangeRate.objects.bulk_create(
+            batch.values(), update_conflicts=True, unique_fields=["currency", "date"], update_fields=["rate"],
+        )
+        batch.clear()
+
+    with transaction.atomic():
+        for line, row in enumerate(reader, start=2):
+            if not any((value or "").strip() for value in row.values() if isinstance(value, str)):
+                continue
+            currency, day, rate = parse_rate_row(row, line)
+            if currency == reporting:
+                continue
+            count, first = loaded.get(currency, (0, day))
+            loaded[currency] = (count + 1, min(first, day))
+            batch[(currency, day)] = ExchangeRate(currency=currency, date=day, rate=rate)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        if loaded:
+            invalidate_rates()
+    return loaded
+
+
+def invalidate_rates():
+    """
+    Сбрасывает кэш курсов во всех процессах сменой версии.
+    """
+    bump_version(RATES_VERSION)
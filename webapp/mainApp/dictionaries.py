@@ -0,0 +1,161 @@
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.http import quote_etag
+
+from .models import Status, Type, Category, SubCategory
+from .versions import acurrent_version, bump_version, current_version
+
+
+# Имя версии справочников (см. versions.py) и ключ кэша снимка конкретной версии
+DICTIONARY_VERSION = "dictionaries"
+DICTIONARY_SNAPSHOT_KEY = "mainApp:dictionaries:snapshot:{version}"
+# Снимки устаревших версий больше не читаются и вытесняются из кэша по истечении срока
+DICTIONARY_SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+# Справочники снимка и их модели
+DICTIONARY_MODELS = {
+    "statuses": Status,
+    "types": Type,
+    "categories": Category,
+    "subcategories": SubCategory,
+}
+
+# Зависимые справочники и поле связи с родительским справочником
+DICTIONARY_PARENTS = {
+    "categories": "type_id",
+    "subcategories": "category_id",
+}
+
+
+class DictionarySnapshot:
+    """
+    Неизменяемый снимок всех справочников: списки объектов в порядке id и словари id → объект.
+    У категорий заранее подставлен тип, у подкатегорий — категория с типом, поэтому
+    __str__ и обращения вида category.type.name в шаблонах не делают запросов.
+    """
+
+    def __init__(self, version, statuses, types, categories, subcategories, loaded_at=None):
+        self.version = version
+        self.loaded_at = loaded_at or timezone.now()
+        self.statuses = statuses
+        self.types = types
+        self.categories = categories
+        self.subcategories = subcategories
+        self.by_id = {
+            dictionary: {obj.pk: obj for obj in getattr(self, dictionary)}
+            for dictionary in DICTIONARY_MODELS
+        }
+        self.by_parent = {}
+        for dictionary, parent_field in DICTIONARY_PARENTS.items():
+            groups = self.by_parent[dictionary] = {}
+            for obj in getattr(self, dictionary):
+                groups.setdefault(getattr(obj, parent_field), []).append(obj)
+        # Готовые JSON-ответы со списками зависимых справочников (заполняются по мере запросов)
+        self._options = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_options"] = {}
+        return state
+
+    @classmethod
+    def load(cls, version):
+        """
+        Читает справочники из базы: четыре запроса на весь снимок.
+        """
+        statuses = list(Status.objects.order_by("id"))
+        types = list(Type.objects.order_by("id"))
+        types_by_id = {obj.pk: obj for obj in types}
+        categories = list(Category.objects.order_by("id"))
+        for category in categories:
+            category.type = types_by_id[category.type_id]
+        categories_by_id = {obj.pk: obj for obj in categories}
+        subcategories = list(SubCategory.objects.order_by("id"))
+        for subcategory in subcategories:
+            subcategory.category = categories_by_id[subcategory.category_id]
+        return cls(version, statuses, types, categories, subcategories)
+
+    def get(self, dictionary, pk):
+        return self.by_id[dictionary].get(pk)
+
+    def children(self, dictionary, parent_id):
+        """
+        Категории типа или подкатегории категории (dictionary — ключ DICTIONARY_PARENTS).
+        """
+        return self.by_parent[dictionary].get(parent_id, [])
+
+    def options(self, dictionary, parent_id):
+        """
+        Тело JSON-ответа со списком children(dictionary, parent_id) и его ETag.
+        Ответ сериализуется один раз на версию снимка, ETag зависит только от содержимого,
+        поэтому правка другого справочника не сбрасывает кэш браузера для этого списка.
+        """
+        key = (dictionary, parent_id)
+        if key not in self._options:
+            body = json.dumps(
+                {"results": [{"id": obj.pk, "name": obj.name} for obj in self.children(dictionary, parent_id)]},
+                ensure_ascii=False,
+            ).encode()
+            self._options[key] = (body, quote_etag(hashlib.md5(body).hexdigest()))
+        return self._options[key]
+
+    def names(self):
+        """
+        Словари id → имя по каждому справочнику (ключи совпадают с полями CashFlow).
+        """
+        return {
+            "status": {obj.pk: obj.name for obj in self.statuses},
+            "type": {obj.pk: obj.name for obj in self.types},
+            "category": {obj.pk: obj.name for obj in self.categories},
+            "subcategory": {obj.pk: obj.name for obj in self.subcategories},
+        }
+
+
+# Снимок, уже загруженный в этом процессе
+_local_snapshot = None
+
+
+def get_dictionaries():
+    """
+    Возвращает снимок справочников актуальной версии.
+
+    В установившемся режиме это одно чтение версии из кэша и ноль запросов к базе:
+    снимок берётся из памяти процесса, а если процесс ещё не видел эту версию —
+    из общего кэша. База читается только после изменения справочников.
+    """
+    global _local_snapshot
+    version = current_version(DICTIONARY_VERSION)
+    snapshot = _local_snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    key = DICTIONARY_SNAPSHOT_KEY.format(version=version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = DictionarySnapshot.load(version)
+        cache.set(key, snapshot, timeout=DICTIONARY_SNAPSHOT_TIMEOUT)
+    _local_snapshot = snapshot
+    return snapshot
+
+
+async def aget_dictionaries():
+    """
+    Асинхронный вариант get_dictionaries(): версия читается асинхронным API кэша,
+    и только при смене версии загрузка снимка уходит в синхронный поток.
+    """
+    version = await acurrent_version(DICTIONARY_VERSION)
+    snapshot = _local_snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    return await sync_to_async(get_dictionaries)()
+
+
+def invalidate_dictionaries():
+    """
+    Сбрасывает снимок справочников во всех процессах сменой версии.
+    """
+    bump_version(DICTIONARY_VERSION)
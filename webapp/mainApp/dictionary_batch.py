@@ -0,0 +1,514 @@
+import re
+import time
+import uuid
+
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+from .dictionaries import DICTIONARY_MODELS, DICTIONARY_PARENTS, DictionarySnapshot, invalidate_dictionaries
+from .models import (
+    CashFlow, CashFlowArchive, CashFlowMonthlyRollup, CashFlowRollup, RecurringRule, SubCategory,
+)
+from .page_cache import invalidate_cashflows
+from .taxonomy import sync_taxonomy_paths
+
+
+# Операции пакета изменений справочников
+OP_ADD = "add"
+OP_UPDATE = "update"
+OP_DELETE = "delete"
+OPERATIONS = (OP_ADD, OP_UPDATE, OP_DELETE)
+
+# Больше операций в одном пакете не принимается
+BATCH_MAX_OPERATIONS = 1000
+# Как max_length полей name справочников
+MAX_NAME_LENGTH = 100
+
+# Справочник родителя для зависимых справочников; порядок создания — от родителей к детям
+PARENT_DICTIONARIES = {"categories": "types", "subcategories": "categories"}
+CREATE_ORDER = ("statuses", "types", "categories", "subcategories")
+
+# Кнопки формы страницы справочников: add_type, edit_category_5, delete_subcategory_7...
+FORM_ACTION_RE = re.compile(r"^(add|edit|delete)_(status|type|category|subcategory)(?:_(\d+))?$")
+FORM_ACTIONS = {"add": OP_ADD, "edit": OP_UPDATE, "delete": OP_DELETE}
+FORM_DICTIONARIES = {
+    "status": "statuses",
+    "type": "types",
+    "category": "categories",
+    "subcategory": "subcategories",
+}
+
+
+class DictionaryBatchError(Exception):
+    """
+    Пакет не применён: errors — список (номер операции, сообщение), conflicts — справочники,
+    которые нельзя удалить из-за записей ДДС и регулярных правил (см. protect_conflicts).
+    """
+
+    def __init__(self, errors=(), conflicts=()):
+        self.errors = list(errors)
+        self.conflicts = list(conflicts)
+        super().__init__("; ".join(message for _, message in self.errors) or "Справочники используются в записях")
+
+    def messages(self):
+        messages = [message for _, message in self.errors]
+        for conflict in self.conflicts:
+            uses = []
+            if conflict["records"]:
+                uses.append(f"записях ДДС ({conflict['records']})")
+            if conflict["rules"]:
+                uses.append(f"регулярных операциях ({conflict['rules']})")
+            messages.append(f"Нельзя удалить «{conflict['name']}»: используется в {', '.join(uses)}")
+        return messages
+
+
+class Operation:
+    """
+    Одна операция пакета. id — изменяемый или удаляемый объект; ref — метка нового объекта,
+    на которую могут ссылаться другие операции пакета; parent — id или ref родителя
+    (тип для категории, категория для подкатегории); None у name и parent при изменении —
+    оставить прежнее значение.
+    """
+
+    def __init__(self, index, op, dictionary, id=None, ref=None, name=None, parent=None):
+        self.index = index
+        self.op = op
+        self.dictionary = dictionary
+        self.id = id
+        self.ref = ref
+        self.name = name
+        self.parent = parent
+
+
+class BatchResult:
+    """
+    Итог пакета: метки новых объектов → id, число созданных, изменённых и удалённых
+    справочников, число записей ДДС, перенесённых вслед за категориями и подкатегориями.
+    """
+
+    def __init__(self):
+        self.created = {}
+        self.created_count = 0
+        self.updated = 0
+        self.deleted = 0
+        self.moved_records = 0
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "created_count": self.created_count,
+            "updated": self.updated,
+            "deleted": self.deleted,
+            "moved_records": self.moved_records,
+            "elapsed_ms": round(self.elapsed * 1000, 3),
+        }
+
+
+def _optional_int(value):
+    if value in (None, ""):
+        return None
+    return int(value)
+
+
+def parse_operations(data):
+    """
+    Разбирает тело запроса {"operations": [{"op": ..., "dictionary": ..., ...}, ...]}
+    в список Operation. Ошибки структуры собираются все сразу (DictionaryBatchError).
+    """
+    items = data.get("operations") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise DictionaryBatchError([(None, "Ожидается непустой список operations")])
+    if len(items) > BATCH_MAX_OPERATIONS:
+        raise DictionaryBatchError([(None, f"Не больше {BATCH_MAX_OPERATIONS} операций в пакете")])
+    operations, errors = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append((index, f"Операция {index}: ожидается объект"))
+            continue
+        op, dictionary = item.get("op"), item.get("dictionary")
+        if op not in OPERATIONS:
+            errors.append((index, f"Операция {index}: неизвестное действие «{op}»"))
+            continue
+        if dictionary not in DICTIONARY_MODELS:
+            errors.append((index, f"Операция {index}: неизвестный справочник «{dictionary}»"))
+            continue
+        parent = item.get("parent")
+        try:
+            pk = _optional_int(item.get("id"))
+            # Родитель — id существующего объекта или метка (ref) нового
+            if not isinstance(parent, str) or parent.isdigit():
+                parent = _optional_int(parent)
+        except (TypeError, ValueError):
+            errors.append((index, f"Операция {index}: id должен быть числом"))
+            continue
+        name = item.get("name")
+        operations.append(Operation(
+            index, op, dictionary, id=pk, ref=item.get("ref"),
+            name=name.strip() if isinstance(name, str) else name, parent=parent,
+        ))
+    if errors:
+        raise DictionaryBatchError(errors)
+    return operations
+
+
+def parse_form_operation(post):
+    """
+    Операция из формы страницы справочников: имя нажатой кнопки (add_type, edit_category_5,
+    delete_subcategory_7...) задаёт действие, справочник и id; имя и родитель — поля
+    name и type_id/category_id. Возвращает список из одной операции или пустой список.
+    """
+    for key in post:
+        match = FORM_ACTION_RE.match(key)
+        if match is None:
+            continue
+        action, form_dictionary, pk = match.groups()
+        dictionary = FORM_DICTIONARIES[form_dictionary]
+        op = FORM_ACTIONS[action]
+        if (op == OP_ADD) != (pk is None):
+            continue
+        parent = None
+        if op != OP_DELETE and dictionary in DICTIONARY_PARENTS:
+            parent = post.get(DICTIONARY_PARENTS[dictionary]) or None
+        name = post.get("name") if op != OP_DELETE else None
+        try:
+            return [Operation(
+                0, op, dictionary, id=_optional_int(pk),
+                name=name.strip() if name is not None else None,
+                parent=_optional_int(parent),
+            )]
+        except ValueError:
+            raise DictionaryBatchError([(0, "Родитель должен быть выбран из списка")])
+    return []
+
+
+class BatchPlan:
+    """
+    Итоговое состояние справочников после пакета, собранное в памяти по свежему снимку:
+    имена и родители существующих объектов с учётом изменений, новые объекты и удаления.
+    """
+
+    def __init__(self, snapshot, operations):
+        self.snapshot = snapshot
+        self.operations = operations
+        self.errors = []
+        # Новые объекты по меткам: ref → (dictionary, operation)
+        self.refs = {}
+        # Явно изменённые и удалённые объекты: (dictionary, id) → operation
+        self.updates = {}
+        self.deletes = {}
+        # Родители объектов, созданных пакетом: (dictionary, id) → id родителя
+        self.new_parents = {}
+        self.check_operations()
+        if not self.errors:
+            self.check_names()
+        self.errors.sort(key=lambda error: error[0])
+
+    def error(self, operation, message):
+        self.errors.append((operation.index, f"Операция {operation.index}: {message}"))
+
+    def exists(self, dictionary, pk):
+        return self.snapshot.get(dictionary, pk) is not None
+
+    def label(self, dictionary, pk):
+        return self.snapshot.get(dictionary, pk).name
+
+    def check_operations(self):
+        for operation in self.operations:
+            if operation.op == OP_ADD:
+                if operation.ref is not None:
+                    if operation.ref in self.refs:
+                        self.error(operation, f"метка «{operation.ref}» уже использована")
+                    self.refs[operation.ref] = (operation.dictionary, operation)
+                continue
+            key = (operation.dictionary, operation.id)
+            if operation.id is None or not self.exists(*key):
+                self.error(operation, f"объект {operation.id} не найден")
+            elif key in self.updates or key in self.deletes:
+                self.error(operation, f"объект «{self.label(*key)}» встречается в пакете дважды")
+            elif operation.op == OP_UPDATE:
+                self.updates[key] = operation
+            else:
+                self.deletes[key] = operation
+
+        for operation in self.operations:
+            if operation.op == OP_DELETE:
+                continue
+            if operation.name is not None or operation.op == OP_ADD:
+                if not operation.name:
+                    self.error(operation, "название не может быть пустым")
+                elif len(operation.name) > MAX_NAME_LENGTH:
+                    self.error(operation, f"название длиннее {MAX_NAME_LENGTH} символов")
+            parent_dictionary = PARENT_DICTIONARIES.get(operation.dictionary)
+            if parent_dictionary is None:
+                if operation.parent is not None:
+                    self.error(operation, "у этого справочника нет родителя")
+                continue
+            if operation.parent is None:
+                if operation.op == OP_ADD:
+                    self.error(operation, "не указан родитель")
+                continue
+            if isinstance(operation.parent, str):
+                target = self.refs.get(operation.parent)
+                if target is None or target[0] != parent_dictionary:
+                    self.error(operation, f"метка родителя «{operation.parent}» не найдена")
+            elif not self.exists(parent_dictionary, operation.parent):
+                self.error(operation, f"родитель {operation.parent} не найден")
+            elif (parent_dictionary, operation.parent) in self.deletes:
+                self.error(operation, "родитель удаляется в этом же пакете")
+
+    def final_parent(self, dictionary, pk):
+        """
+        Родитель существующего объекта после пакета (id или метка нового родителя).
+        """
+        operation = self.updates.get((dictionary, pk))
+        if operation is not None and operation.parent is not None:
+            return operation.parent
+        return getattr(self.snapshot.get(dictionary, pk), DICTIONARY_PARENTS[dictionary])
+
+    def final_name(self, dictionary, pk):
+        operation = self.updates.get((dictionary, pk))
+        if operation is not None and operation.name is not None:
+            return operation.name
+        return self.snapshot.get(dictionary, pk).name
+
+    def check_names(self):
+        """
+        Уникальность названий без учёта регистра, как в формах справочников: статусы, типы
+        и категории — во всём справочнике, подкатегории — внутри категории. Сообщается только
+        о повторах, в которых участвует операция пакета.
+        """
+        for dictionary in CREATE_ORDER:
+            groups = {}
+            for obj in getattr(self.snapshot, dictionary):
+                key = (dictionary, obj.pk)
+                if key in self.deletes:
+                    continue
+                scope = self.final_parent(dictionary, obj.pk) if dictionary == "subcategories" else None
+                groups.setdefault((scope, self.final_name(dictionary, obj.pk).lower()), []).append(
+                    self.updates.get(key)
+                )
+            for operation in self.operations:
+                if operation.op == OP_ADD and operation.dictionary == dictionary:
+                    scope = operation.parent if dictionary == "subcategories" else None
+                    groups.setdefault((scope, operation.name.lower()), []).append(operation)
+            for (_, name), members in groups.items():
+                if len(members) < 2:
+                    continue
+                for operation in members:
+                    if operation is not None:
+                        self.error(operation, f"название «{name}» уже занято")
+
+    def doomed_subcategories(self):
+        """
+        Подкатегории, которые будут удалены — явно или каскадом вместе с категорией или типом
+        (по родителям после пакета: перенесённые из удаляемого родителя остаются).
+        Возвращает {id подкатегории: (справочник, id) явно удаляемого объекта}.
+        """
+        doomed = {}
+        for subcategory in self.snapshot.subcategories:
+            key = ("subcategories", subcategory.pk)
+            category_id = self.final_parent("subcategories", subcategory.pk)
+            type_id = (
+                self.final_parent("categories", category_id) if isinstance(category_id, int) else None
+            )
+            for owner in (key, ("categories", category_id), ("types", type_id)):
+                if owner in self.deletes:
+                    doomed[subcategory.pk] = owner
+                    break
+        return doomed
+
+
+def protect_conflicts(plan):
+    """
+    Удаляемые справочники, на которые ссылаются записи ДДС и регулярные правила
+    (on_delete=PROTECT), с числом записей (records) и правил (rules) — по одному агрегатному
+    запросу на оперативную таблицу, архив и правила. Итоговые тип и категория записи
+    и правила определяются подкатегорией, поэтому достаточно сгруппировать по статусу
+    и подкатегории.
+    """
+    statuses = {pk for dictionary, pk in plan.deletes if dictionary == "statuses"}
+    doomed = plan.doomed_subcategories()
+    if not statuses and not doomed:
+        return []
+    counts = {}
+    rows = (
+        (field, row)
+        for model, field in ((CashFlow, "records"), (CashFlowArchive, "records"), (RecurringRule, "rules"))
+        for row in (
+            model.objects
+            .filter(Q(status_id__in=statuses) | Q(subcategory_id__in=doomed))
+            .values("status_id", "subcategory_id")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+    )
+    for field, row in rows:
+        owners = []
+        if row["status_id"] in statuses:
+            owners.append(("statuses", row["status_id"]))
+        if row["subcategory_id"] in doomed:
+            owners.append(doomed[row["subcategory_id"]])
+        for owner in owners:
+            usage = counts.setdefault(owner, {"records": 0, "rules": 0})
+            usage[field] += row["count"]
+    return [
+        {"dictionary": dictionary, "id": pk, "name": plan.label(dictionary, pk), **usage}
+        for (dictionary, pk), usage in sorted(counts.items())
+    ]
+
+
+def apply_operations(operations):
+    """
+    Применяет пакет изменений справочников в одной транзакции: все операции проверяются
+    заранее по свежему снимку (DictionaryBatchError — ничего не изменено), затем
+    освобождение переходящих названий, создание через bulk_create (от родителей к детям),
+    изменение через bulk_update, перенос записей ДДС и агрегатов за перемещёнными категориями и подкатегориями,
+    обновление taxonomy_path и удаление. Возвращает BatchResult.
+    """
+    started = time.perf_counter()
+    result = BatchResult()
+    with transaction.atomic():
+        plan = BatchPlan(DictionarySnapshot.load(None), operations)
+        if plan.errors:
+            raise DictionaryBatchError(plan.errors)
+        conflicts = protect_conflicts(plan)
+        if conflicts:
+            raise DictionaryBatchError(conflicts=conflicts)
+
+        _release_names(plan)
+        ids = _create(plan, result)
+        renamed = _update(plan, ids, result)
+        result.moved_records = _move_records(plan, ids)
+        if renamed:
+            sync_taxonomy_paths(SubCategory.objects.filter(
+                Q(pk__in=renamed["subcategories"])
+                | Q(category_id__in=renamed["categories"])
+                | Q(category__type_id__in=renamed["types"])
+            ))
+        for dictionary in reversed(CREATE_ORDER):
+            pks = [pk for key, pk in plan.deletes if key == dictionary]
+            if pks:
+                DICTIONARY_MODELS[dictionary].objects.filter(pk__in=pks).delete()
+                result.deleted += len(pks)
+        invalidate_dictionaries()
+    if result.moved_records:
+        invalidate_cashflows()
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _release_names(plan):
+    """
+    Освобождает названия, которые в пакете переходят к другому объекту: обмен (A→B, B→A),
+    цепочка переименований или новый объект с названием переименованного/удаляемого.
+    Уникальность name проверяется на каждой строке UPDATE/INSERT, поэтому прежние
+    владельцы сначала получают временные имена; итоговые записывает _update.
+    """
+    token = uuid.uuid4().hex
+    for dictionary in CREATE_ORDER:
+        model = DICTIONARY_MODELS[dictionary]
+        if not model._meta.get_field("name").unique:
+            continue
+        claimed = {op.name for op in plan.operations if op.op == OP_ADD and op.dictionary == dictionary}
+        claimed.update(plan.final_name(*key) for key in plan.updates if key[0] == dictionary)
+        leaving = [pk for key, pk in plan.deletes if key == dictionary]
+        leaving += [
+            pk for key, pk in plan.updates
+            if key == dictionary and plan.final_name(key, pk) != plan.label(key, pk)
+        ]
+        holders = [
+            model(pk=pk, name=f"~{token}~{pk}") for pk in leaving if plan.label(dictionary, pk) in claimed
+        ]
+        if holders:
+            model.objects.bulk_update(holders, ["name"])
+
+
+def _create(plan, result):
+    """
+    Создаёт новые объекты по справочникам от родителей к детям. Возвращает id новых
+    объектов по меткам; родители новых категорий запоминаются в plan.new_parents.
+    """
+    ids = {}
+    for dictionary in CREATE_ORDER:
+        model = DICTIONARY_MODELS[dictionary]
+        parent_field = DICTIONARY_PARENTS.get(dictionary)
+        added = [op for op in plan.operations if op.op == OP_ADD and op.dictionary == dictionary]
+        if not added:
+            continue
+        objs = []
+        for operation in added:
+            fields = {"name": operation.name}
+            if parent_field:
+                fields[parent_field] = ids.get(operation.parent, operation.parent)
+            objs.append(model(**fields))
+        model.objects.bulk_create(objs)
+        for operation, obj in zip(added, objs):
+            if operation.ref is not None:
+                ids[operation.ref] = obj.pk
+                result.created[operation.ref] = obj.pk
+            if parent_field:
+                plan.new_parents[(dictionary, obj.pk)] = getattr(obj, parent_field)
+        result.created_count += len(objs)
+    return ids
+
+
+def _update(plan, ids, result):
+    """
+    Изменяет названия и родителей через bulk_update (один запрос на справочник).
+    Возвращает id изменённых объектов по справочникам для пересчёта taxonomy_path.
+    """
+    renamed = {dictionary: [] for dictionary in CREATE_ORDER}
+    for dictionary in CREATE_ORDER:
+        model = DICTIONARY_MODELS[dictionary]
+        parent_field = DICTIONARY_PARENTS.get(dictionary)
+        objs = []
+        for (key, pk), operation in plan.updates.items():
+            if key != dictionary:
+                continue
+            fields = {"pk": pk, "name": plan.final_name(dictionary, pk)}
+            if parent_field:
+                parent = plan.final_parent(dictionary, pk)
+                fields[parent_field] = ids.get(parent, parent)
+            objs.append(model(**fields))
+            renamed[dictionary].append(pk)
+        if objs:
+            model.objects.bulk_update(objs, ["name", parent_field] if parent_field else ["name"])
+            result.updated += len(objs)
+    return renamed if any(renamed.values()) else None
+
+
+def _move_records(plan, ids):
+    """
+    Записи ДДС (и архивные), строки агрегатов и регулярные правила подкатегорий, которые
+    переехали (сами или вместе с категорией), получают новые категорию и тип одним UPDATE
+    на таблицу. Возвращает число перенесённых записей ДДС.
+    """
+    def resolve(dictionary, pk):
+        parent = plan.new_parents.get((dictionary, pk))
+        if parent is None:
+            parent = plan.final_parent(dictionary, pk)
+        return ids.get(parent, parent)
+
+    moved = {}
+    for subcategory in plan.snapshot.subcategories:
+        category_id = plan.final_parent("subcategories", subcategory.pk)
+        category_id = ids.get(category_id, category_id)
+        type_id = resolve("categories", category_id)
+        if (category_id, type_id) != (subcategory.category_id, subcategory.category.type_id):
+            moved[subcategory.pk] = (category_id, type_id)
+    if not moved:
+        return 0
+    values = {
+        field: Case(
+            *(When(subcategory_id=pk, then=Value(target[position])) for pk, target in moved.items()),
+            output_field=IntegerField(),
+        )
+        for position, field in enumerate(("category_id", "type_id"))
+    }
+    for model in (CashFlowRollup, CashFlowMonthlyRollup, RecurringRule):
+        model.objects.filter(subcategory_id__in=moved).update(**values)
+    return sum(
+        model.objects.filter(subcategory_id__in=moved).update(**values)
+        for model in (CashFlow, CashFlowArchive)
+    )
@@ -0,0 +1,199 @@
+import csv
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .archive import ledger_models
+from .dictionaries import get_dictionaries
+from .filters import filter_cashflows
+
+
+# Заголовки колонок выгрузки (тот же порядок ожидает импорт)
+EXPORT_HEADER = ["Дата", "Статус", "Тип", "Категория", "Подкатегория", "Сумма", "Комментарий", "Валюта"]
+
+# Сколько строк читается из базы за один проход серверного курсора
+EXPORT_CHUNK_SIZE = 2000
+
+
+def export_rows(params):
+    """
+    Генератор строк выгрузки (списков значений) по тем же фильтрам, что и список записей.
+    Записи читаются итератором без кэша QuerySet, поэтому память не растёт с объёмом выгрузки.
+    Архив закрытых периодов читается после оперативной таблицы, если его захватывает дата «с».
+    """
+    # Имена справочников берутся из снимка, а не через внешние ключи каждой строки
+    names = get_dictionaries().names()
+    rows = (
+        row
+        for model in ledger_models(params)
+        for row in (
+            filter_cashflows(model.objects.all(), params)
+            .order_by("-created_at", "-id")
+            .values_list(
+                "created_at", "status_id", "type_id", "category_id", "subcategory_id", "amount", "comment",
+                "currency",
+            )
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+    )
+    for created_at, status_id, type_id, category_id, subcategory_id, amount, comment, currency in rows:
+        yield [
+            timezone.localtime(created_at).strftime("%Y-%m-%d %H:%M:%S"),
+            names["status"].get(status_id, ""),
+            names["type"].get(type_id, ""),
+            names["category"].get(category_id, ""),
+            names["subcategory"].get(subcategory_id, ""),
+            amount,
+            comment or "",
+            currency,
+        ]
+
+
+# Первые символы, с которых Excel и LibreOffice читают ячейку CSV как формулу
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def csv_cell(value):
+    """
+    Значение ячейки CSV: текст, который табличный редактор выполнил бы как формулу
+    (комментарий «=HYPERLINK(...)»), экранируется апострофом и открывается как текст.
+    """
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_value(cell):
+    """
+    Обратное к csv_cell(): снимает апостроф, которым выгрузка экранировала формулу.
+    """
+    if cell.startswith("'") and cell[1:].startswith(CSV_FORMULA_PREFIXES):
+        return cell[1:]
+    return cell
+
+
+class Echo:
+    """
+    Псевдо-файл для csv.writer: write() возвращает строку вместо записи в буфер.
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """
+    Отдаёт CSV построчно. BOM в начале нужен Excel для корректной кириллицы.
+    Текст, похожий на формулу, экранируется (csv_cell).
+    """
+    writer = csv.writer(Echo())
+    yield "\ufeff" + writer.writerow(EXPORT_HEADER)
+    for row in rows:
+        yield writer.writerow([csv_cell(value) for value in row])
+
+
+class StreamBuffer:
+    """
+    Несчётный (non-seekable) буфер для zipfile: накопленные байты забираются методом pop().
+    zipfile в этом случае пишет дескрипторы данных после каждого файла архива.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="ДДС" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+# Управляющие символы, недопустимые в XML 1.0
+XML_ILLEGAL_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def xlsx_row(values):
+    """
+    Строка листа SpreadsheetML: числа — числовыми ячейками, остальное — inline-строками.
+    """
+    cells = []
+    for value in values:
+        if isinstance(value, (int, float, Decimal)):
+            cells.append(f"<c><v>{value}</v></c>")
+        else:
+            text = escape(XML_ILLEGAL_CHARS.sub("", str(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return "<row>" + "".join(cells) + "</row>"
+
+
+def stream_xlsx(rows, flush_every=EXPORT_CHUNK_SIZE):
+    """
+    Отдаёт XLSX-файл по частям: лист пишется потоково в zip-архив без промежуточного файла,
+    и накопленные сжатые байты отдаются клиенту каждые flush_every строк.
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", XLSX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", XLSX_ROOT_RELS)
+        archive.writestr("xl/workbook.xml", XLSX_WORKBOOK)
+        archive.writestr("xl/_rels/workbook.xml.rels", XLSX_WORKBOOK_RELS)
+        yield buffer.pop()
+
+        with archive.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(xlsx_row(EXPORT_HEADER).encode())
+            for i, row in enumerate(rows, start=1):
+                sheet.write(xlsx_row(row).encode())
+                if i % flush_every == 0:
+                    yield buffer.pop()
+            sheet.write(b"</sheetData></worksheet>")
+        yield buffer.pop()
+    yield buffer.pop()
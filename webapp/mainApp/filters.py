@@ -0,0 +1,91 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .search import SEARCH_PARAM, search_cashflows
+
+
+# Параметры GET-запроса, по которым фильтруется список записей ДДС
+FILTER_PARAMS = ("date_from", "date_to", "status", "type", "category", "subcategory", "taxonomy", SEARCH_PARAM)
+
+
+def parse_date_param(value):
+    """
+    Разбирает дату из GET-параметра в формате YYYY-MM-DD.
+    Возвращает None для пустого или некорректного значения.
+    """
+    if not value:
+        return None
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def day_start(day):
+    """
+    Возвращает начало дня day как aware datetime в текущем часовом поясе.
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def date_range_bounds(date_from, date_to):
+    """
+    Переводит включительный диапазон дат [date_from, date_to] в полуоткрытый
+    диапазон datetime [start, end). Любая из границ может быть None.
+    """
+    start = day_start(date_from) if date_from else None
+    end = day_start(date_to + timedelta(days=1)) if date_to else None
+    return start, end
+
+
+def filter_by_dictionaries(qs, params):
+    """
+    Применяет фильтры по статусу, типу, категории и подкатегории.
+    Подходит для любой модели с внешними ключами status/type/category/subcategory.
+    """
+    status = params.get("status")
+    type_id = params.get("type")
+    category_id = params.get("category")
+    subcategory_id = params.get("subcategory")
+
+    if status:
+        qs = qs.filter(status_id=status)
+    if type_id:
+        qs = qs.filter(type_id=type_id)
+    if category_id:
+        qs = qs.filter(category_id=category_id)
+    if subcategory_id:
+        qs = qs.filter(subcategory_id=subcategory_id)
+
+    return qs
+
+
+def filter_cashflows(qs, params, rank=False):
+    """
+    Применяет к QuerySet записей ДДС фильтры по дате, статусу, типу, категории, подкатегории,
+    полному названию подкатегории и полнотекстовый поиск по комментарию (параметр q).
+    При rank=True и непустом поиске записи получают поле search_rank (см. search_cashflows).
+
+    Дата фильтруется полуоткрытым диапазоном по самому столбцу created_at, а не через
+    created_at__date: так условие остаётся sargable и обслуживается составными индексами.
+    """
+    start, end = date_range_bounds(
+        parse_date_param(params.get("date_from")),
+        parse_date_param(params.get("date_to")),
+    )
+    if start:
+        qs = qs.filter(created_at__gte=start)
+    if end:
+        qs = qs.filter(created_at__lt=end)
+
+    # Полное название подкатегории ("Тип -> Категория -> Подкатегория") — по
+    # денормализованному столбцу записи, без соединения со справочниками
+    taxonomy = params.get("taxonomy")
+    if taxonomy:
+        qs = qs.filter(taxonomy_path=taxonomy)
+
+    qs = search_cashflows(qs, params.get(SEARCH_PARAM), rank=rank)
+    return filter_by_dictionaries(qs, params)
+
@@ -0,0 +1,284 @@
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import CharField, FloatField, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .dictionaries import get_dictionaries
+from .models import CashFlowMonthlyRollup
+from .page_cache import CASHFLOW_VERSION
+from .versions import current_version
+
+try:
+    import numpy as np
+except ImportError:  # прогноз необязателен: без numpy страница прогноза просит установить его
+    np = None
+
+
+# Параметры GET-запроса страницы прогноза
+FORECAST_PARAMS = ("horizon", "window", "type")
+
+# Горизонт прогноза в месяцах и окно скользящего среднего по умолчанию
+DEFAULT_HORIZON = 6
+MIN_HORIZON, MAX_HORIZON = 3, 12
+DEFAULT_WINDOW = 3
+MAX_WINDOW = 12
+
+# Сезонность считается по последним SEASONAL_YEARS годам истории; индекс месяца года
+# используется, только если этот месяц наблюдался не меньше SEASONAL_MIN_YEARS раз
+SEASONAL_YEARS = 3
+SEASONAL_MIN_YEARS = 2
+
+# Ключ содержит версию записей ДДС, поэтому прогноз пересчитывается после любого их
+# изменения, а срок хранения лишь ограничивает время жизни устаревших ключей
+FORECAST_CACHE_KEY = "mainApp:forecast:{cashflows}:{dictionaries}:{month:%Y%m}:{horizon}:{window}"
+FORECAST_CACHE_TIMEOUT = 3600
+
+
+def numpy_available():
+    return np is not None
+
+
+def month_ordinal(day):
+    return day.year * 12 + day.month - 1
+
+
+def ordinal_month(ordinal):
+    return date(ordinal // 12, ordinal % 12 + 1, 1)
+
+
+def monthly_series(month_to):
+    """
+    Помесячные суммы каждой пары (тип, категория) за все месяцы до month_to (не включая
+    его) одним сгруппированным запросом к месячным агрегатам. Возвращает (ключи — массив
+    n×2 из (type_id, category_id), матрица n×T сумм по месяцам, первый месяц истории).
+
+    Запрос собирается ORM, а выполняется курсором напрямую: сотни тысяч строк не проходят
+    через построчные конвертеры, месяц читается строкой и разбирается один раз на месяц,
+    а сумма сразу приводится к float в самом запросе.
+    """
+    query = (
+        CashFlowMonthlyRollup.objects.filter(month__lt=month_to)
+        .values_list("type_id", "category_id")
+        .annotate(month_key=Cast("month", CharField()), total=Cast(Sum("total"), FloatField()))
+        .order_by()
+        .query
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(*query.sql_with_params())
+        rows = cursor.fetchall()
+    if not rows:
+        return np.empty((0, 2), dtype=np.int64), np.zeros((0, 0)), month_to
+    type_ids, category_ids, months, totals = zip(*rows)
+    ordinals = {value: month_ordinal(date.fromisoformat(str(value)[:10])) for value in set(months)}
+    months = np.array([ordinals[value] for value in months], dtype=np.int64)
+    # Пара (тип, категория) упаковывается в одно число: уникальные значения одномерного
+    # массива находятся заметно быстрее, чем уникальные строки двумерного
+    codes = (np.array(type_ids, dtype=np.int64) << 32) | np.array(category_ids, dtype=np.int64)
+    codes, series = np.unique(codes, return_inverse=True)
+    keys = np.column_stack([codes >> 32, codes & 0xFFFFFFFF])
+    first = int(months.min())
+    matrix = np.zeros((len(keys), month_ordinal(month_to) - first))
+    np.add.at(matrix, (series, months - first), np.array(totals, dtype=np.float64))
+    return keys, matrix, ordinal_month(first)
+
+
+def project(matrix, first_month, horizon, window):
+    """
+    Прогноз на horizon месяцев после последнего столбца matrix сразу для всех рядов.
+
+    Ряд начинается с первого ненулевого месяца: месяцы до появления категории не тянут
+    средние к нулю. Сезонный индекс месяца года — отношение среднего за этот месяц к
+    среднему за весь ряд (по последним SEASONAL_YEARS годам); для месяцев, наблюдавшихся
+    реже SEASONAL_MIN_YEARS раз, индекс равен 1, и прогноз сводится к скользящему среднему.
+    Уровень — сумма за последние window месяцев, делённая на сумму их индексов (среднее
+    без сезонности); прогноз месяца — уровень, умноженный на индекс этого месяца года.
+    """
+    count, months = matrix.shape
+    if not count or not months:
+        return np.zeros((count, horizon))
+    first = month_ordinal(first_month)
+    span = min(months, 12 * SEASONAL_YEARS)
+    columns = np.arange(months - span, months)
+    started = np.argmax(matrix != 0, axis=1)
+    active = (columns[None, :] >= started[:, None]).astype(np.float64)
+    history = matrix[:, columns] * active
+    month_of_year = (first + columns) % 12
+    one_hot = (month_of_year[:, None] == np.arange(12)[None, :]).astype(np.float64)
+
+    observed = active @ one_hot
+    season_sums = history @ one_hot
+    with np.errstate(divide="ignore", invalid="ignore"):
+        overall = history.sum(axis=1) / active.sum(axis=1)
+        index = season_sums / observed / overall[:, None]
+    seasonal = (observed >= SEASONAL_MIN_YEARS) & (overall[:, None] > 0) & np.isfinite(index)
+    index = np.where(seasonal, index, 1.0)
+    overall = np.nan_to_num(overall)
+
+    window = min(window, span)
+    recent_sum = history[:, -window:].sum(axis=1)
+    recent_index = (index[:, month_of_year[-window:]] * active[:, -window:]).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        level = np.where(recent_index > 0, recent_sum / recent_index, overall)
+    targets = (first + months + np.arange(horizon)) % 12
+    return level[:, None] * index[:, targets]
+
+
+class ForecastLine:
+    """
+    Строка прогноза: тип или категория и прогнозные суммы по месяцам горизонта.
+    """
+
+    def __init__(self, type, category, values):
+        self.type = type
+        self.category = category
+        self.values = values
+        self.total = round(sum(values), 2)
+
+    @property
+    def label(self):
+        return str(self.category or self.type)
+
+
+class Forecast:
+    """
+    Прогноз на месяцы months: суммы категорий (ключи (type_id, category_id) и значения по
+    месяцам), итоги по типам, приток, отток, чистый поток и остаток на конец каждого
+    месяца. Начальный остаток — чистый поток за всю историю до первого месяца прогноза.
+    Значения — числа с плавающей точкой, округлённые до копеек; объект кэшируется целиком.
+    """
+
+    def __init__(self, months, history_from, keys, values, by_type, income, expense, opening, seasonal, elapsed):
+        self.months = months
+        self.history_from = history_from
+        self.keys = keys
+        self.values = values
+        self.by_type = by_type
+        self.income = income
+        self.expense = expense
+        self.net = [round(inflow - outflow, 2) for inflow, outflow in zip(income, expense)]
+        self.opening = opening
+        self.balances = []
+        balance = opening
+        for net in self.net:
+            balance = round(balance + net, 2)
+            self.balances.append(balance)
+        self.seasonal = seasonal
+        self.elapsed = elapsed
+
+    @property
+    def history_months(self):
+        return month_ordinal(self.months[0]) - month_ordinal(self.history_from) if self.months else 0
+
+    def type_lines(self, snapshot):
+        lines = []
+        for type_id, values in self.by_type.items():
+            type_obj = snapshot.get("types", type_id)
+            if type_obj is not None:
+                lines.append(ForecastLine(type_obj, None, values))
+        return lines
+
+    def category_lines(self, snapshot, type_id=None):
+        """
+        Строки категорий по убыванию суммы за горизонт (type_id — только категории типа).
+        Названия берутся из снимка справочников, без запросов к базе.
+        """
+        lines = []
+        for (key_type_id, category_id), values in zip(self.keys, self.values):
+            if type_id and key_type_id != type_id:
+                continue
+            category = snapshot.get("categories", category_id)
+            type_obj = snapshot.get("types", key_type_id)
+            if category is None or type_obj is None:
+                continue
+            lines.append(ForecastLine(type_obj, category, values))
+        lines.sort(key=lambda line: -line.total)
+        return lines
+
+
+def _type_ids(snapshot, names):
+    names = {name.lower() for name in names}
+    return {obj.pk for obj in snapshot.types if obj.name.lower() in names}
+
+
+def build_forecast(month_from, horizon=DEFAULT_HORIZON, window=DEFAULT_WINDOW, snapshot=None):
+    """
+    Считает прогноз на horizon месяцев начиная с month_from по истории до него.
+
+    Один запрос к базе (monthly_series); дальше все категории обрабатываются вместе
+    операциями над массивами numpy — без цикла по категориям и по записям.
+    """
+    started = time.perf_counter()
+    snapshot = snapshot or get_dictionaries()
+    keys, matrix, history_from = monthly_series(month_from)
+    projected = np.round(project(matrix, history_from, horizon, window), 2)
+
+    type_ids, type_index = np.unique(keys[:, 0], return_inverse=True)
+    by_type = np.zeros((len(type_ids), horizon))
+    np.add.at(by_type, type_index.ravel(), projected)
+    history_by_type = np.zeros(len(type_ids))
+    np.add.at(history_by_type, type_index.ravel(), matrix.sum(axis=1))
+
+    income_types = _type_ids(snapshot, settings.FORECAST_INCOME_TYPES)
+    expense_types = _type_ids(snapshot, settings.FORECAST_EXPENSE_TYPES)
+    is_income = np.isin(type_ids, list(income_types))
+    is_expense = np.isin(type_ids, list(expense_types))
+    income = by_type[is_income].sum(axis=0)
+    expense = by_type[is_expense].sum(axis=0)
+    opening = history_by_type[is_income].sum() - history_by_type[is_expense].sum()
+
+    return Forecast(
+        months=[ordinal_month(month_ordinal(month_from) + offset) for offset in range(horizon)],
+        history_from=history_from,
+        keys=keys.tolist(),
+        values=projected.tolist(),
+        by_type={int(type_id): values for type_id, values in zip(type_ids, np.round(by_type, 2).tolist())},
+        income=np.round(income, 2).tolist(),
+        expense=np.round(expense, 2).tolist(),
+        opening=round(float(opening), 2),
+        seasonal=matrix.shape[1] >= 12 * SEASONAL_MIN_YEARS,
+        elapsed=time.perf_counter() - started,
+    )
+
+
+def _bounded_param(value, default, low, high):
+    try:
+        return min(max(int(value), low), high)
+    except (TypeError, ValueError):
+        return default
+
+
+def forecast_params(params):
+    """
+    Горизонт и окно из GET-параметров, приведённые к допустимым границам.
+    """
+    horizon = _bounded_param(params.get("horizon"), DEFAULT_HORIZON, MIN_HORIZON, MAX_HORIZON)
+    window = _bounded_param(params.get("window"), DEFAULT_WINDOW, 1, MAX_WINDOW)
+    return horizon, window
+
+
+def get_forecast(params):
+    """
+    Прогноз с текущего месяца по параметрам запроса. Результат кэшируется под версиями
+    записей ДДС и справочников: повторные открытия страницы не читают базу и не считают
+    заново, а любое изменение записей (включая пересборку агрегатов) даёт новый ключ.
+    """
+    horizon, window = forecast_params(params)
+    month_from = timezone.localdate().replace(day=1)
+    snapshot = get_dictionaries()
+    key = FORECAST_CACHE_KEY.format(
+        cashflows=current_version(CASHFLOW_VERSION),
+        dictionaries=snapshot.version,
+        month=month_from,
+        horizon=horizon,
+        window=window,
+    )
+    forecast = cache.get(key)
+    if forecast is None:
+        forecast = build_forecast(month_from, horizon, window, snapshot)
+        cache.set(key, forecast, timeout=FORECAST_CACHE_TIMEOUT)
+    return forecast
@@ -1,5 +1,73 @@
 from django import forms
-from .models import CashFlow, Status, Type, Category, SubCategory
+from django.conf import settings
+from django.utils import timezone
+from django.utils.choices import CallableChoiceIterator
+
+from .archive import load_archive_boundary
+from .currency import MissingRateError, get_rate
+from .dictionaries import get_dictionaries
+from .imports import encoding_error_line
+from .models import CashFlow, RecurringRule, Status, Type, Category, SubCategory
+
+
+# Поле выбора справочника, которое берёт варианты и объекты из снимка справочников
+# (см. dictionaries.py) вместо запросов к базе при каждой отрисовке и проверке формы.
+# Для зависимых справочников (категории, подкатегории) варианты можно ограничить одним
+# родителем: parent_id задаёт тип или категорию, limit_to_parent включает ограничение.
+class DictionaryChoiceField(forms.ModelChoiceField):
+    def __init__(self, dictionary, queryset, **kwargs):
+        self.dictionary = dictionary
+        self.limit_to_parent = False
+        self.parent_id = None
+        super().__init__(queryset, **kwargs)
+
+    def _get_choices(self):
+        return CallableChoiceIterator(self.snapshot_choices)
+
+    choices = property(_get_choices, forms.ChoiceField.choices.fset)
+
+    def snapshot_choices(self):
+        if self.empty_label is not None:
+            yield ("", self.empty_label)
+        snapshot = get_dictionaries()
+        if self.limit_to_parent:
+            objects = snapshot.children(self.dictionary, self.parent_id)
+        else:
+            objects = getattr(snapshot, self.dictionary)
+        for obj in objects:
+            yield (self.prepare_value(obj), self.label_from_instance(obj))
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            obj = get_dictionaries().get(self.dictionary, int(value))
+        except (TypeError, ValueError):
+            obj = None
+        if obj is None:
+            raise forms.ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return obj
+
+
+def dictionary_chain_errors(type_obj, category_obj, subcategory_obj):
+    """
+    Нарушения связей тип → категория → подкатегория среди заданных значений
+    (любое может быть None): список пар (поле формы, сообщение).
+    """
+    errors = []
+    # Проверка: категория соответствует типу
+    if category_obj and type_obj and category_obj.type_id != type_obj.pk:
+        errors.append(("category", f"Категория «{category_obj}» не принадлежит типу «{type_obj}»."))
+    # Проверка: подкатегория соответствует категории
+    if subcategory_obj and category_obj and subcategory_obj.category_id != category_obj.pk:
+        errors.append((
+            "subcategory", f"Подкатегория «{subcategory_obj}» не принадлежит категории «{category_obj}»."
+        ))
+    return errors
 
 
 # Форма для создания и редактирования записей ДДС
@@ -7,7 +75,7 @@ class CashFlowForm(forms.ModelForm):
     class Meta:
         model = CashFlow
         # Список полей, отображаемых в форме
-        fields = ["created_at", "status", "type", "category", "subcategory", "amount", "comment"]
+        fields = ["created_at", "status", "type", "category", "subcategory", "amount", "currency", "comment"]
 
         # Настройка виджетов для каждого поля формы
         widgets = {
@@ -26,33 +94,162 @@ class CashFlowForm(forms.ModelForm):
             ),
         }
 
+    def currency_choices(self):
+        currencies = list(settings.CURRENCIES)
+        # Валюта существующей записи остаётся в списке, даже если её убрали из настроек
+        if self.instance.pk and self.instance.currency not in currencies:
+            currencies.append(self.instance.currency)
+        return [(code, code) for code in currencies]
+
+    # Поля справочников и соответствующие списки снимка справочников
+    dictionary_fields = {
+        "status": "statuses",
+        "type": "types",
+        "category": "categories",
+        "subcategory": "subcategories",
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, dictionary in self.dictionary_fields.items():
+            field = self.fields[name]
+            self.fields[name] = DictionaryChoiceField(
+                dictionary,
+                field.queryset,
+                required=field.required,
+                widget=field.widget,
+                label=field.label,
+                empty_label=field.empty_label,
+            )
+        # Без валюты в данных формы (старые клиенты, API) запись остаётся в прежней валюте
+        self.fields["currency"] = forms.ChoiceField(
+            choices=self.currency_choices(),
+            initial=self.fields["currency"].initial,
+            required=False,
+            widget=forms.Select(attrs={"class": "form-select"}),
+        )
+
+        # В форму выводятся только категории выбранного типа и подкатегории выбранной
+        # категории; при смене типа/категории страница загружает списки из JSON API.
+        # Проверка значений по-прежнему идёт по всему снимку и в clean().
+        for name, parent in (("category", "type"), ("subcategory", "category")):
+            if name not in self.dictionary_fields:
+                continue
+            field = self.fields[name]
+            field.limit_to_parent = True
+            field.parent_id = self.dictionary_id(parent)
+
+    def clean_currency(self):
+        return self.cleaned_data["currency"] or self.instance.currency
+
+    def dictionary_id(self, name):
+        """
+        id выбранного значения поля справочника (из данных формы или начальных значений).
+        """
+        value = self[name].value()
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
     def clean(self):
         """
         Кастомная валидация формы:
         - Проверяет, что категория принадлежит выбранному типу.
         - Проверяет, что подкатегория принадлежит выбранной категории.
+        - Проверяет, что дата не попадает в закрытый период (архив, см. archive.py).
+        - Проверяет, что для валюты есть курс на дату записи (см. currency.py).
         """
         cleaned_data = super().clean()
-        type_obj = cleaned_data.get("type")
-        category_obj = cleaned_data.get("category")
-        subcategory_obj = cleaned_data.get("subcategory")
-
-        # Проверка: категория соответствует типу
-        if category_obj and type_obj and category_obj.type != type_obj:
-            self.add_error(
-                "category",
-                f"Категория «{category_obj}» не принадлежит типу «{type_obj}»."
-            )
+        for field, message in dictionary_chain_errors(
+            cleaned_data.get("type"), cleaned_data.get("category"), cleaned_data.get("subcategory")
+        ):
+            self.add_error(field, message)
+        created_at = cleaned_data.get("created_at")
+        # Граница из базы, а не из кэша: запись не должна попасть в только что закрытый период
+        boundary = load_archive_boundary() if created_at else None
+        if boundary and timezone.localdate(created_at) < boundary:
+            self.add_error("created_at", f"Период до {boundary:%d.%m.%Y} закрыт и перенесён в архив.")
+        currency = cleaned_data.get("currency")
+        if created_at and currency:
+            try:
+                get_rate(currency, timezone.localdate(created_at))
+            except MissingRateError as exc:
+                self.add_error("currency", str(exc))
+        return cleaned_data
+
+
+# Форма записи ДДС в админке: те же проверки clean() (связи справочников, закрытый период,
+# курс валюты) и список валют из настроек, но виджеты админки — выбор справочников через
+# автодополнение (поля с queryset, а не снимок) и раздельные дата и время.
+class CashFlowAdminForm(CashFlowForm):
+    class Meta(CashFlowForm.Meta):
+        widgets = {}
+
+    dictionary_fields = {}
 
-        # Проверка: подкатегория соответствует категории
-        if subcategory_obj and category_obj and subcategory_obj.category != category_obj:
-            self.add_error(
-                "subcategory",
-                f"Подкатегория «{subcategory_obj}» не принадлежит категории «{category_obj}»."
-            )
 
+# Форма массового изменения или удаления записей ДДС (см. bulk.py). Записи выбираются
+# не формой, а параметрами запроса: отмеченными id или фильтрами списка.
+class CashFlowBulkForm(forms.Form):
+    ACTION_UPDATE = "update"
+    ACTION_DELETE = "delete"
+
+    # Новые значения не должны совпадать по имени с фильтрами выбора записей (status, type...)
+    prefix = "set"
+
+    action = forms.ChoiceField(
+        label="Действие",
+        choices=[(ACTION_UPDATE, "Изменить справочники"), (ACTION_DELETE, "Удалить записи")],
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    status = DictionaryChoiceField(
+        "statuses", Status.objects.all(), label="Статус", required=False,
+        empty_label="— не менять —", widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    type = DictionaryChoiceField(
+        "types", Type.objects.all(), label="Тип", required=False,
+        empty_label="— не менять —", widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    category = DictionaryChoiceField(
+        "categories", Category.objects.all(), label="Категория", required=False,
+        empty_label="— не менять —", widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    subcategory = DictionaryChoiceField(
+        "subcategories", SubCategory.objects.all(), label="Подкатегория", required=False,
+        empty_label="— не менять —", widget=forms.Select(attrs={"class": "form-select"}),
+    )
+
+    # Поля справочников, которые можно изменить у выбранных записей
+    change_fields = ("status", "type", "category", "subcategory")
+
+    def clean(self):
+        """
+        Для изменения нужно выбрать хотя бы одно новое значение; выбранные вместе тип,
+        категория и подкатегория проверяются так же, как в CashFlowForm. Связи с полями,
+        которые остаются прежними, проверяются по самим записям (bulk.chain_conflicts).
+        """
+        cleaned_data = super().clean()
+        if cleaned_data.get("action") != self.ACTION_UPDATE:
+            return cleaned_data
+        if not self.changes():
+            raise forms.ValidationError("Выберите хотя бы одно новое значение")
+        for field, message in dictionary_chain_errors(
+            cleaned_data.get("type"), cleaned_data.get("category"), cleaned_data.get("subcategory")
+        ):
+            self.add_error(field, message)
         return cleaned_data
 
+    def changes(self):
+        """
+        Новые значения справочников: {поле: объект} только для выбранных полей.
+        """
+        return {
+            field: self.cleaned_data[field]
+            for field in self.change_fields
+            if self.cleaned_data.get(field) is not None
+        }
+
 
 # Форма для создания и редактирования статусов
 class StatusForm(forms.ModelForm):
@@ -129,4 +326,58 @@ class SubcategoryForm(forms.ModelForm):
         name = self.cleaned_data["name"].strip()
         if SubCategory.objects.filter(name__iexact=name, category=self.cleaned_data.get("category")).exists():
             raise forms.ValidationError("Подкатегория с таким именем уже существует в этой категории")
-        return name
\ No newline at end of file
+        return name
+
+# Форма загрузки CSV-файла для массового импорта записей ДДС
+class CashFlowImportForm(forms.Form):
+    file = forms.FileField(
+        label="CSV-файл",
+        widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".csv,text/csv"}),
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data["file"]
+        line = encoding_error_line(file)
+        if line is not None:
+            raise forms.ValidationError(
+                f"Файл должен быть в кодировке UTF-8: строка {line} не читается. Ничего не импортировано."
+            )
+        return file
+
+
+# Форма регулярного правила для админки: те же проверки связей справочников и
+# список валют, что и у записи ДДС
+class RecurringRuleForm(forms.ModelForm):
+    class Meta:
+        model = RecurringRule
+        fields = [
+            "name", "frequency", "interval", "start_date", "end_date", "active",
+            "status", "type", "category", "subcategory", "amount", "currency", "comment",
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        currencies = list(settings.CURRENCIES)
+        if self.instance.pk and self.instance.currency not in currencies:
+            currencies.append(self.instance.currency)
+        self.fields["currency"] = forms.ChoiceField(
+            choices=[(code, code) for code in currencies], initial=self.fields["currency"].initial,
+        )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field, message in dictionary_chain_errors(
+            cleaned_data.get("type"), cleaned_data.get("category"), cleaned_data.get("subcategory")
+        ):
+            self.add_error(field, message)
+        start_date, end_date = cleaned_data.get("start_date"), cleaned_data.get("end_date")
+        if start_date and end_date and end_date < start_date:
+            self.add_error("end_date", "Дата окончания раньше даты начала.")
+        # Созданные повторения отсчитаны от прежней даты начала, поэтому её можно менять,
+        # только пока по правилу ничего не создано (тогда расписание начинается заново)
+        if self.instance.pk and "start_date" in self.changed_data:
+            if self.instance.next_date != self.initial.get("start_date"):
+                self.add_error("start_date", "По правилу уже созданы записи: создайте новое правило.")
+            else:
+                self.instance.next_date = None
+        return cleaned_data
@@ -0,0 +1,253 @@
+import codecs
+import csv
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .archive import load_archive_boundary
+from .currency import first_rate_dates, reporting_currency
+from .dictionaries import get_dictionaries
+from .exports import EXPORT_HEADER, csv_value
+from .models import CashFlow
+from .page_cache import invalidate_cashflows
+from .rollups import rebuild_rollups
+
+
+# Форматы даты, которые принимает импорт (первый совпадает с форматом выгрузки)
+IMPORT_DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%d.%m.%Y")
+
+# Заголовок выгрузок до появления колонки «Валюта» (такие файлы импортируются в валюте отчётности)
+LEGACY_HEADER = EXPORT_HEADER[:7]
+
+# Ограничения, совпадающие с CashFlowForm
+MAX_COMMENT_LENGTH = 500
+MAX_AMOUNT = Decimal("9999999999.99")
+
+
+class ImportRowError(Exception):
+    pass
+
+
+def encoding_error_line(file, chunk_size=1 << 20):
+    """
+    Номер первой строки двоичного файла, которая не декодируется как UTF-8, или None.
+    Импорт фиксирует записи пакетами, поэтому кодировка проверяется целиком до первой
+    вставки: ошибка в конце файла иначе обнаружилась бы, когда начало уже сохранено.
+    Файл читается кусками по chunk_size и после проверки перематывается в начало.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    line = 1
+    try:
+        while chunk := file.read(chunk_size):
+            try:
+                decoder.decode(chunk)
+            except UnicodeDecodeError as exc:
+                return line + chunk.count(b"\n", 0, exc.start)
+            line += chunk.count(b"\n")
+        try:
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return line
+    finally:
+        file.seek(0)
+    return None
+
+
+class DictionaryIndex:
+    """
+    Индекс справочников по именам для проверки строк импорта без запросов к базе:
+    имена ищутся без учёта регистра, связи тип → категория → подкатегория проверяются по id.
+    """
+
+    def __init__(self, snapshot=None):
+        snapshot = snapshot or get_dictionaries()
+        self.statuses = {obj.name.lower(): obj.pk for obj in snapshot.statuses}
+        self.types = {obj.name.lower(): obj.pk for obj in snapshot.types}
+        self.categories = {obj.name.lower(): (obj.pk, obj.type_id) for obj in snapshot.categories}
+        self.subcategories = {
+            (obj.category_id, obj.name.lower()): obj.pk for obj in snapshot.subcategories
+        }
+        self.taxonomy_paths = {obj.pk: str(obj) for obj in snapshot.subcategories}
+
+    def resolve(self, status, type_name, category, subcategory):
+        """
+        Возвращает id (status, type, category, subcategory) или бросает ImportRowError.
+        """
+        status_id = self.statuses.get(status.strip().lower())
+        if status_id is None:
+            raise ImportRowError(f"Неизвестный статус «{status}»")
+        type_id = self.types.get(type_name.strip().lower())
+        if type_id is None:
+            raise ImportRowError(f"Неизвестный тип «{type_name}»")
+        category_id, category_type_id = self.categories.get(category.strip().lower(), (None, None))
+        if category_id is None:
+            raise ImportRowError(f"Неизвестная категория «{category}»")
+        if category_type_id != type_id:
+            raise ImportRowError(f"Категория «{category}» не принадлежит типу «{type_name}»")
+        subcategory_id = self.subcategories.get((category_id, subcategory.strip().lower()))
+        if subcategory_id is None:
+            raise ImportRowError(f"Подкатегория «{subcategory}» не принадлежит категории «{category}»")
+        return status_id, type_id, category_id, subcategory_id
+
+
+def parse_datetime_value(value):
+    value = value.strip()
+    for fmt in IMPORT_DATE_FORMATS:
+        try:
+            return timezone.make_aware(datetime.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ImportRowError(f"Некорректная дата «{value}»")
+
+
+def parse_amount(value):
+    try:
+        amount = Decimal(value.strip().replace(" ", "").replace(",", "."))
+    except InvalidOperation:
+        raise ImportRowError(f"Некорректная сумма «{value}»")
+    if not amount.is_finite() or amount <= 0 or amount > MAX_AMOUNT:
+        raise ImportRowError(f"Сумма «{value}» вне допустимого диапазона")
+    if amount.as_tuple().exponent < -2:
+        raise ImportRowError(f"Сумма «{value}» содержит больше двух знаков после запятой")
+    return amount
+
+
+class CurrencyIndex:
+    """
+    Проверка валют строк импорта: валюта должна быть в settings.CURRENCIES, и для неё
+    должен быть курс на дату записи. Даты первых курсов читаются одним запросом
+    при первой строке не в валюте отчётности.
+    """
+
+    def __init__(self):
+        self.reporting = reporting_currency()
+        self.currencies = set(settings.CURRENCIES)
+        self.first_rates = None
+
+    def resolve(self, value, day):
+        currency = value.strip().upper() or self.reporting
+        if currency == self.reporting:
+            return currency
+        if currency not in self.currencies:
+            raise ImportRowError(f"Неизвестная валюта «{value}»")
+        if self.first_rates is None:
+            self.first_rates = first_rate_dates()
+        first = self.first_rates.get(currency)
+        if first is None or day < first:
+            raise ImportRowError(f"Нет курса {currency} на {day:%d.%m.%Y}")
+        return currency
+
+
+class ImportResult:
+    """
+    Итог импорта: число созданных записей, ошибки по строкам и время выполнения.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.processed = 0
+        self.errors = []
+        self.error_count = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+def import_cashflows(stream, batch_size=5000, max_errors=1000, on_error=None):
+    """
+    Импортирует записи ДДС из CSV-потока в формате выгрузки (см. EXPORT_HEADER).
+
+    Файл читается построчно, каждая строка проверяется по снимку справочников в памяти,
+    а корректные записи вставляются через bulk_create пакетами по batch_size, каждый пакет
+    в своей транзакции. Некорректные строки пропускаются и попадают в отчёт: в result.errors
+    сохраняются первые max_errors ошибок, on_error(line, message) получает все.
+    После вставки агрегаты пересобираются за затронутый диапазон дат.
+    Строки закрытых периодов (раньше границы архива) не импортируются. Колонка «Валюта»
+    необязательна (по умолчанию — валюта отчётности); для других валют нужен курс на дату.
+    """
+    started = time.perf_counter()
+    result = ImportResult()
+    index = DictionaryIndex()
+    currencies = CurrencyIndex()
+    boundary = load_archive_boundary()
+    batch = []
+    # Диапазон дат пакета, который ещё не вставлен, и диапазон уже вставленных записей
+    pending = [None, None]
+    committed = [None, None]
+
+    def extend(bounds, first, last):
+        bounds[0] = first if bounds[0] is None else min(bounds[0], first)
+        bounds[1] = last if bounds[1] is None else max(bounds[1], last)
+
+    def report(line, message):
+        result.error_count += 1
+        if len(result.errors) < max_errors:
+            result.errors.append((line, message))
+        if on_error:
+            on_error(line, message)
+
+    def flush():
+        with transaction.atomic():
+            CashFlow.objects.bulk_create(batch)
+        result.created += len(batch)
+        extend(committed, *pending)
+        pending[:] = [None, None]
+        batch.clear()
+
+    try:
+        for line, row in enumerate(csv.reader(stream), start=1):
+            if line == 1 and [cell.strip().lstrip("\ufeff") for cell in row] in (EXPORT_HEADER, LEGACY_HEADER):
+                continue
+            if not any(cell.strip() for cell in row):
+                continue
+            result.processed += 1
+            row = [csv_value(cell) for cell in row]
+            try:
+                if len(row) < 6:
+                    raise ImportRowError(f"Ожидается не меньше 6 колонок, получено {len(row)}")
+                created_at = parse_datetime_value(row[0])
+                if boundary and timezone.localdate(created_at) < boundary:
+                    raise ImportRowError(f"Период до {boundary:%d.%m.%Y} закрыт и перенесён в архив")
+                status_id, type_id, category_id, subcategory_id = index.resolve(*row[1:5])
+                amount = parse_amount(row[5])
+                comment = row[6].strip() if len(row) > 6 else ""
+                if len(comment) > MAX_COMMENT_LENGTH:
+                    raise ImportRowError(f"Комментарий длиннее {MAX_COMMENT_LENGTH} символов")
+                currency = currencies.resolve(row[7] if len(row) > 7 else "", timezone.localdate(created_at))
+            except ImportRowError as exc:
+                report(line, str(exc))
+                continue
+
+            batch.append(CashFlow(
+                created_at=created_at,
+                status_id=status_id,
+                type_id=type_id,
+                category_id=category_id,
+                subcategory_id=subcategory_id,
+                amount=amount,
+                currency=currency,
+                comment=comment or None,
+                taxonomy_path=index.taxonomy_paths[subcategory_id],
+            ))
+            day = timezone.localdate(created_at)
+            extend(pending, day, day)
+            if len(batch) >= batch_size:
+                flush()
+
+        if batch:
+            flush()
+    finally:
+        # Агрегаты пересобираются и тогда, когда чтение файла оборвалось на середине:
+        # уже вставленные пакеты остаются в базе.
+        if committed[0] is not None:
+            rebuild_rollups(*committed)
+            invalidate_cashflows()
+
+    result.elapsed = time.perf_counter() - started
+    return result
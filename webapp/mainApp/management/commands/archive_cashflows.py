@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+
+from mainApp.archive import ARCHIVE_BATCH_SIZE, archive_boundary, archive_cashflows
+from mainApp.filters import day_start, parse_date_param
+from mainApp.models import CashFlow, CashFlowArchive
+
+
+def months_back(day, months):
+    """
+    Первое число месяца, который на months месяцев раньше месяца day.
+    """
+    index = day.year * 12 + day.month - 1 - months
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит записи ДДС закрытых периодов (целых месяцев до границы) из оперативной "
+        "таблицы в архив пакетами, каждый месяц в своей транзакции. Список, выгрузка и "
+        "админка по умолчанию читают только оперативную таблицу; архив читается, когда "
+        "дата «с» раньше границы. Агрегаты и аналитика не меняются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before", help="Граница архива YYYY-MM-01: переносятся записи раньше этого дня",
+        )
+        parser.add_argument(
+            "--keep-months", type=int, default=12,
+            help="Сколько месяцев до текущего оставить в оперативной таблице (если нет --before)",
+        )
+        parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, сколько записей будет перенесено")
+
+    def handle(self, *args, **options):
+        if options["before"]:
+            before = parse_date_param(options["before"])
+            if before is None or before.day != 1:
+                raise CommandError("--before должна быть первым числом месяца в формате YYYY-MM-DD")
+        else:
+            if options["keep_months"] < 0:
+                raise CommandError("--keep-months не может быть отрицательным")
+            before = months_back(timezone.localdate(), options["keep_months"])
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным")
+
+        pending = CashFlow.objects.filter(created_at__lt=day_start(before)).aggregate(records=Count("id"))["records"]
+        self.stdout.write(f"Граница архива: {before:%Y-%m-%d}, записей к переносу: {pending}")
+        if options["dry_run"] or not pending:
+            return
+
+        started = time.perf_counter()
+
+        def on_month(month, moved, elapsed):
+            if moved:
+                self.stdout.write(f"  {month:%Y-%m}: {moved} записей за {elapsed:.1f} с")
+
+        moved = archive_cashflows(before, batch_size=options["batch_size"], on_month=on_month)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Перенесено записей: {moved} за {elapsed:.1f} с; в оперативной таблице "
+            f"{CashFlow.objects.count()}, в архиве {CashFlowArchive.objects.count()}, "
+            f"граница архива {archive_boundary():%Y-%m-%d}"
+        ))
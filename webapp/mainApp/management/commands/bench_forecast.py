@@ -0,0 +1,155 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from mainApp.forecast import (
+    SEASONAL_MIN_YEARS, SEASONAL_YEARS, build_forecast, get_forecast, month_ordinal, np, ordinal_month,
+)
+from mainApp.models import CashFlowMonthlyRollup
+from mainApp.page_cache import invalidate_cashflows
+from mainApp.synthetic import ensure_taxonomy
+
+
+def legacy_forecast(month_from, horizon, window):
+    """
+    Прогноз тем же методом, но по-старому: суммы складываются в словари, а уровень и
+    сезонные индексы считаются в цикле по каждой категории и каждому месяцу.
+    """
+    series = {}
+    rows = (
+        CashFlowMonthlyRollup.objects.filter(month__lt=month_from)
+        .values_list("type_id", "category_id", "month")
+        .annotate(total=Sum("total"))
+        .order_by()
+    )
+    first = month_ordinal(month_from)
+    for type_id, category_id, month, total in rows:
+        series.setdefault((type_id, category_id), {})[month_ordinal(month)] = float(total)
+        first = min(first, month_ordinal(month))
+    end = month_ordinal(month_from)
+    result = {}
+    for key, totals in series.items():
+        started = max(min(month for month, total in totals.items() if total) if any(totals.values()) else first,
+                      end - 12 * SEASONAL_YEARS)
+        months = list(range(started, end))
+        overall = sum(totals.get(month, 0.0) for month in months) / len(months)
+        index = {}
+        for month_of_year in range(12):
+            values = [totals.get(month, 0.0) for month in months if month % 12 == month_of_year]
+            if len(values) >= SEASONAL_MIN_YEARS and overall > 0:
+                index[month_of_year] = sum(values) / len(values) / overall
+            else:
+                index[month_of_year] = 1.0
+        recent = [month for month in range(end - window, end) if month >= started]
+        recent_index = sum(index[month % 12] for month in recent)
+        level = sum(totals.get(month, 0.0) for month in recent) / recent_index if recent_index > 0 else overall
+        result[key] = [round(level * index[(end + offset) % 12], 2) for offset in range(horizon)]
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет расчёт прогноза ДДС на синтетической истории: тысячи категорий за "
+        "несколько лет помесячных агрегатов. Сравнивает расчёт в цикле по категориям с "
+        "векторным расчётом numpy. Данные создаются внутри транзакции и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=2500, help="Категорий на каждый из двух типов")
+        parser.add_argument("--years", type=int, default=4, help="Лет помесячной истории")
+        parser.add_argument("--horizon", type=int, default=12)
+        parser.add_argument("--window", type=int, default=3)
+        parser.add_argument("--repeat", type=int, default=3, help="Число повторов каждого замера")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError("Для прогноза нужен numpy: pip install numpy")
+        month_from = timezone.localdate().replace(day=1)
+        with transaction.atomic():
+            self.seed(month_from, options)
+            invalidate_cashflows()
+            legacy = self.measure(options["repeat"], legacy_forecast, month_from, options["horizon"], options["window"])
+            vectorized = self.measure(options["repeat"], build_forecast, month_from, options["horizon"], options["window"])
+            self.compare(legacy[1], vectorized[1])
+            params = {"horizon": str(options["horizon"]), "window": str(options["window"])}
+            get_forecast(params)
+            cached = self.measure(options["repeat"], get_forecast, params)
+            transaction.set_rollback(True)
+        # Прогноз по откаченным данным не должен остаться в кэше
+        invalidate_cashflows()
+
+        self.stdout.write(f"{'Расчёт':<22}{'медиана, мс':>14}")
+        self.stdout.write(f"{'цикл по категориям':<22}{legacy[0]:>14.1f}")
+        self.stdout.write(f"{'numpy':<22}{vectorized[0]:>14.1f}")
+        self.stdout.write(f"{'numpy, из кэша':<22}{cached[0]:>14.1f}")
+        self.stdout.write(f"Ускорение: {legacy[0] / vectorized[0]:.1f}x")
+
+    def seed(self, month_from, options):
+        """
+        Помесячные агрегаты по одной подкатегории каждой категории: сезонная синусоида
+        со своей фазой, трендом и шумом. Часть категорий появляется посреди истории.
+        """
+        started = time.perf_counter()
+        statuses, subcategories = ensure_taxonomy(
+            statuses=1, types=2, categories=options["categories"], subcategories=1, prefix="Прогноз",
+        )
+        rng = np.random.default_rng(options["seed"])
+        months = options["years"] * 12
+        first = month_ordinal(month_from) - months
+        count = len(subcategories)
+        phase = rng.uniform(0, 2 * np.pi, count)
+        base = rng.uniform(1_000, 100_000, count)
+        trend = rng.uniform(-0.005, 0.01, count)
+        start = np.where(rng.random(count) < 0.2, rng.integers(0, months, count), 0)
+        column = np.arange(months)
+        totals = base[:, None] * (1 + trend[:, None] * column) * (
+            1 + 0.3 * np.sin(2 * np.pi * column / 12 + phase[:, None])
+        ) * rng.normal(1, 0.05, (count, months))
+        totals = np.round(np.maximum(totals, 0), 2)
+
+        batch = []
+        for row, subcategory in enumerate(subcategories):
+            for offset in range(int(start[row]), months):
+                batch.append(CashFlowMonthlyRollup(
+                    month=ordinal_month(first + offset),
+                    status=statuses[0],
+                    type_id=subcategory.category.type_id,
+                    category_id=subcategory.category_id,
+                    subcategory=subcategory,
+                    total=f"{totals[row, offset]:.2f}",
+                    count=1,
+                ))
+            if len(batch) >= 10_000:
+                CashFlowMonthlyRollup.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            CashFlowMonthlyRollup.objects.bulk_create(batch)
+        self.stdout.write(
+            f"Сгенерировано {count} категорий за {options['years']} лет "
+            f"с {ordinal_month(first):%m.%Y} "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
+
+    def measure(self, repeat, func, *args):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func(*args)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), result
+
+    def compare(self, legacy, forecast):
+        """
+        Оба расчёта должны давать одинаковый прогноз (с точностью до копейки).
+        """
+        mismatched = sum(
+            1 for key, values in zip(forecast.keys, forecast.values)
+            if not np.allclose(values, legacy.get(tuple(key), [0.0] * len(values)), atol=0.011)
+        )
+        if mismatched or len(legacy) != len(forecast.keys):
+            raise CommandError(f"Прогнозы расходятся по {mismatched} категориям")
@@ -0,0 +1,141 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from mainApp.filters import filter_cashflows
+from mainApp.models import CashFlow, Status, Type, Category, SubCategory
+
+
+def legacy_filter_cashflows(qs, params):
+    """
+    Прежняя фильтрация списка: дата через created_at__date, которая оборачивает столбец в функцию.
+    """
+    if params.get("date_from"):
+        qs = qs.filter(created_at__date__gte=params["date_from"])
+    if params.get("date_to"):
+        qs = qs.filter(created_at__date__lte=params["date_to"])
+    for field in ("status", "type", "category", "subcategory"):
+        if params.get(field):
+            qs = qs.filter(**{f"{field}_id": params[field]})
+    return qs
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет время отрисовки отфильтрованной страницы списка ДДС до и после "
+        "составных индексов и фильтрации по полуоткрытому диапазону дат. "
+        "Данные генерируются внутри транзакции и откатываются по завершении."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Число синтетических записей")
+        parser.add_argument("--repeat", type=int, default=5, help="Число повторов каждого замера")
+        parser.add_argument("--page-size", type=int, default=15)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            scenarios = self.seed(options["rows"], options["seed"])
+
+            self.stdout.write("Фаза «до»: без индексов, фильтр created_at__date")
+            self.drop_indexes()
+            before = self.run(scenarios, legacy_filter_cashflows, options)
+
+            self.stdout.write("Фаза «после»: составные индексы, полуоткрытый диапазон")
+            self.create_indexes()
+            after = self.run(scenarios, filter_cashflows, options)
+
+            self.report(scenarios, before, after)
+            transaction.set_rollback(True)
+
+    def seed(self, rows, seed):
+        """
+        Создаёт справочники и rows записей, распределённых по последним двум годам.
+        Возвращает набор сценариев фильтрации, повторяющих реальные комбинации параметров.
+        """
+        rnd = random.Random(seed)
+        statuses = [Status.objects.create(name=f"bench-status-{i}") for i in range(3)]
+        subcategories = []
+        for t in range(2):
+            type_obj = Type.objects.create(name=f"bench-type-{t}")
+            for c in range(10):
+                category = Category.objects.create(name=f"bench-category-{t}-{c}", type=type_obj)
+                for s in range(5):
+                    subcategories.append(
+                        SubCategory.objects.create(name=f"bench-subcategory-{s}", category=category)
+                    )
+
+        now = timezone.now()
+        started = time.perf_counter()
+        batch = []
+        for _ in range(rows):
+            subcategory = rnd.choice(subcategories)
+            batch.append(CashFlow(
+                created_at=now - timedelta(seconds=rnd.randrange(2 * 365 * 86400)),
+                status=rnd.choice(statuses),
+                type_id=subcategory.category.type_id,
+                category_id=subcategory.category_id,
+                subcategory=subcategory,
+                amount=Decimal(rnd.randrange(100, 10_000_000)) / 100,
+            ))
+            if len(batch) >= 10_000:
+                CashFlow.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            CashFlow.objects.bulk_create(batch)
+        self.stdout.write(f"Сгенерировано {rows} записей за {time.perf_counter() - started:.1f} с")
+
+        date_to = timezone.localdate(now)
+        date_from = date_to - timedelta(days=30)
+        month = {"date_from": date_from.isoformat(), "date_to": date_to.isoformat()}
+        subcategory = subcategories[0]
+        return {
+            "дата": month,
+            "дата + статус": {**month, "status": str(statuses[0].pk)},
+            "дата + тип": {**month, "type": str(subcategory.category.type_id)},
+            "дата + категория": {**month, "category": str(subcategory.category_id)},
+            "дата + подкатегория": {**month, "subcategory": str(subcategory.pk)},
+        }
+
+    def drop_indexes(self):
+        # DDL выполняется напрямую, без входа в schema_editor: SQLite не позволяет
+        # открыть его внутри транзакции, а сами DROP/CREATE INDEX в ней допустимы.
+        with connection.cursor() as cursor:
+            for index in CashFlow._meta.indexes:
+                cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+
+    def create_indexes(self):
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for index in CashFlow._meta.indexes:
+                cursor.execute(str(index.create_sql(CashFlow, editor)))
+            cursor.execute("ANALYZE")
+
+    def run(self, scenarios, filter_func, options):
+        """
+        Для каждого сценария выполняет те же запросы, что и страница списка:
+        COUNT(*) для пагинатора и выборку первой страницы. Возвращает медиану в мс.
+        """
+        results = {}
+        for name, params in scenarios.items():
+            timings = []
+            for _ in range(options["repeat"]):
+                qs = filter_func(CashFlow.objects.all(), params).order_by("-created_at")
+                started = time.perf_counter()
+                qs.count()
+                list(qs[:options["page_size"]])
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = statistics.median(timings)
+        return results
+
+    def report(self, scenarios, before, after):
+        self.stdout.write(f"{'Сценарий':<22}{'до, мс':>12}{'после, мс':>12}{'ускорение':>12}")
+        for name in scenarios:
+            speedup = before[name] / after[name] if after[name] else float("inf")
+            self.stdout.write(f"{name:<22}{before[name]:>12.1f}{after[name]:>12.1f}{speedup:>11.1f}x")
@@ -0,0 +1,241 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from mainApp.dictionaries import get_dictionaries
+from mainApp.management.commands.loadtest import percentile
+from mainApp.models import CashFlow
+from mainApp.page_cache import invalidate_cashflows
+
+
+# Сценарии замера в порядке выполнения: create создаёт записи, которые затем
+# изменяет edit и удаляет delete, поэтому база после прогона остаётся прежней
+BENCHMARK_SCENARIOS = (
+    "list", "list_filtered", "list_search", "list_cursor", "dashboard", "dictionaries",
+    "create", "edit", "delete",
+)
+WRITE_SCENARIOS = ("create", "edit", "delete")
+# Комментарий записей, созданных сценарием create
+BENCHMARK_COMMENT = "__benchmark__"
+# Версия формата файла результатов
+RESULTS_FORMAT = 1
+
+
+def git_commit():
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = (
+        "Набор замеров основных страниц внутри процесса (тестовый клиент Django, без HTTP): "
+        "список без фильтров, с фильтрами, с поиском и в курсорном режиме, панель аналитики, "
+        "страница справочников, создание, изменение и удаление записи. Кэш страниц сбрасывается "
+        "перед каждым запросом (без --cached). Выводит медиану, p95 и число SQL-запросов, "
+        "с --output пишет результаты в JSON, с --compare сравнивает с прошлым файлом. "
+        "Данные для замера создаёт команда generate_ledger."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario", action="append", choices=BENCHMARK_SCENARIOS,
+            help="Сценарий (можно несколько раз); по умолчанию все",
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="Замеров на сценарий")
+        parser.add_argument("--warmup", type=int, default=2, help="Незамеряемых запросов перед замерами")
+        parser.add_argument("--search", default="аренда", help="Строка поиска для list_search")
+        parser.add_argument("--cached", action="store_true", help="Не сбрасывать кэш страниц перед запросами")
+        parser.add_argument("--output", help="Файл JSON для результатов")
+        parser.add_argument("--compare", help="Файл JSON прошлого прогона для сравнения медиан")
+        parser.add_argument(
+            "--threshold", type=float, default=0.2,
+            help="Рост медианы, который считается регрессией (0.2 — на 20%%)",
+        )
+        parser.add_argument(
+            "--fail-on-regression", action="store_true",
+            help="Завершиться с ошибкой, если есть регрессии относительно --compare",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1 or options["warmup"] < 0:
+            raise CommandError("--repeat должен быть положительным, --warmup — неотрицательным")
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"], encoding="utf-8") as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Не удалось прочитать {options['compare']}: {exc}")
+
+        dictionaries = get_dictionaries()
+        if not dictionaries.statuses or not dictionaries.subcategories:
+            raise CommandError("Нет справочников: сначала запустите generate_ledger")
+        scenarios = [s for s in BENCHMARK_SCENARIOS if s in (options["scenario"] or BENCHMARK_SCENARIOS)]
+        # Изменять и удалять можно только записи, созданные сценарием create
+        if ("edit" in scenarios or "delete" in scenarios) and "create" not in scenarios:
+            scenarios = [s for s in BENCHMARK_SCENARIOS if s in scenarios or s == "create"]
+
+        allowed = [host for host in settings.ALLOWED_HOSTS if host != "*" and not host.startswith(".")]
+        client = Client(HTTP_HOST=allowed[0] if allowed else "localhost")
+        requests = self.requests(dictionaries, options)
+        results = {}
+        # Выборочные замеры PerformanceMiddleware пишут в лог каждый запрос — здесь они не нужны
+        with override_settings(PERF_SAMPLE_RATE=0):
+            try:
+                for scenario in scenarios:
+                    self.stdout.write(f"{scenario}: {options['warmup']} + {options['repeat']} запросов")
+                    results[scenario] = self.measure(client, scenario, requests[scenario], options)
+            finally:
+                CashFlow.objects.filter(comment=BENCHMARK_COMMENT).delete()
+
+        report = {
+            "format": RESULTS_FORMAT,
+            "meta": {
+                "commit": git_commit(),
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "rows": CashFlow.objects.count(),
+                "repeat": options["repeat"],
+                "cached": options["cached"],
+            },
+            "results": results,
+        }
+        self.report(results)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты записаны в {options['output']}")
+        if baseline is not None:
+            regressions = self.compare(baseline, report, options["threshold"])
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"Регрессии: {', '.join(regressions)}")
+
+    def requests(self, dictionaries, options):
+        """
+        Функции (номер запроса) → (метод, адрес, данные) для каждого сценария. Фильтры —
+        последние 30 дней журнала, первый статус и подкатегория самой свежей записи.
+        """
+        latest = CashFlow.objects.aggregate(last=Max("created_at"))["last"]
+        date_to = timezone.localdate(latest) if latest else timezone.localdate()
+        latest_record = CashFlow.objects.order_by("-created_at").first()
+        subcategory = dictionaries.get("subcategories", latest_record.subcategory_id) if latest_record else None
+        subcategory = subcategory or dictionaries.subcategories[0]
+        status = dictionaries.statuses[0]
+        filters = {
+            "date_from": (date_to - timedelta(days=30)).isoformat(),
+            "date_to": date_to.isoformat(),
+            "status": status.pk,
+        }
+        form = {
+            "created_at": date_to.isoformat(),
+            "status": status.pk,
+            "type": subcategory.category.type_id,
+            "category": subcategory.category_id,
+            "subcategory": subcategory.pk,
+            "amount": "100.00",
+            "comment": BENCHMARK_COMMENT,
+        }
+        created = []
+
+        def created_id(number):
+            if not created:
+                created.extend(
+                    CashFlow.objects.filter(comment=BENCHMARK_COMMENT).order_by("id").values_list("id", flat=True)
+                )
+            return created[number]
+
+        return {
+            "list": lambda n: ("get", reverse("cashflow_list"), {}),
+            "list_filtered": lambda n: ("get", reverse("cashflow_list"), filters),
+            "list_search": lambda n: ("get", reverse("cashflow_list"), {"q": options["search"]}),
+            "list_cursor": lambda n: ("get", reverse("cashflow_list"), {**filters, "pagination": "cursor"}),
+            "dashboard": lambda n: ("get", reverse("cashflow_dashboard"), filters),
+            "dictionaries": lambda n: ("get", reverse("dictionaries_unified"), {}),
+            "create": lambda n: ("post", reverse("cashflow_create"), form),
+            "edit": lambda n: (
+                "post", reverse("cashflow_edit", args=[created_id(n)]), {**form, "amount": f"{200 + n}.00"},
+            ),
+            "delete": lambda n: ("post", reverse("cashflow_delete", args=[created_id(n)]), {}),
+        }
+
+    def measure(self, client, scenario, request, options):
+        timings, queries = [], []
+        for number in range(options["warmup"] + options["repeat"]):
+            if not options["cached"]:
+                invalidate_cashflows()
+            method, path, data = request(number)
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = getattr(client, method)(path, data)
+                elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code >= 400:
+                raise CommandError(f"{scenario}: {path} ответил {response.status_code}")
+            if number >= options["warmup"]:
+                timings.append(elapsed)
+                queries.append(len(ctx.captured_queries))
+        timings.sort()
+        return {
+            "runs": len(timings),
+            "median_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "min_ms": round(timings[0], 3),
+            "max_ms": round(timings[-1], 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "queries": statistics.median_low(queries),
+        }
+
+    def report(self, results):
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'сценарий':<15}{'медиана, мс':>13}{'p95':>10}{'мин.':>10}{'макс.':>10}{'запросов':>10}"
+        )
+        for scenario, row in results.items():
+            self.stdout.write(
+                f"{scenario:<15}{row['median_ms']:>13.1f}{row['p95_ms']:>10.1f}{row['min_ms']:>10.1f}"
+                f"{row['max_ms']:>10.1f}{row['queries']:>10}"
+            )
+
+    def compare(self, baseline, report, threshold):
+        """
+        Сравнивает медианы и число запросов с прошлым прогоном. Возвращает сценарии с регрессией.
+        """
+        previous = baseline.get("results", {})
+        commit = baseline.get("meta", {}).get("commit") or "?"
+        self.stdout.write("")
+        self.stdout.write(f"Сравнение с {commit}:")
+        self.stdout.write(f"{'сценарий':<15}{'было, мс':>12}{'стало, мс':>12}{'отношение':>11}{'запросов':>14}")
+        regressions = []
+        for scenario, row in report["results"].items():
+            before = previous.get(scenario)
+            if not before:
+                continue
+            ratio = row["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+            regressed = ratio > 1 + threshold or row["queries"] > before["queries"]
+            if regressed:
+                regressions.append(scenario)
+            self.stdout.write(
+                f"{scenario:<15}{before['median_ms']:>12.1f}{row['median_ms']:>12.1f}{ratio:>10.2f}x"
+                f"{before['queries']:>7} → {row['queries']:<4}{'  регрессия' if regressed else ''}"
+            )
+        return regressions
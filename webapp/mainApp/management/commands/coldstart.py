@@ -0,0 +1,98 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.utils import get_random_secret_key
+
+
+# Программа дочернего процесса: импорт WSGI-приложения (с прогревом или без), затем
+# два запроса к нему напрямую, без HTTP-сервера. Результат — JSON в stdout.
+CHILD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from main.wsgi import application
+ready = time.perf_counter()
+from wsgiref.util import setup_testing_defaults
+from mainApp.startup import startup_report
+
+def request(path):
+    environ = {"PATH_INFO": path}
+    setup_testing_defaults(environ)
+    statuses = []
+    begin = time.perf_counter()
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    b"".join(response)
+    response.close()
+    return (time.perf_counter() - begin) * 1000, statuses[0]
+
+first_ms, status = request(sys.argv[1])
+second_ms, _ = request(sys.argv[1])
+print(json.dumps({
+    "status": status,
+    "ready_ms": (ready - started) * 1000,
+    "import_ms": startup_report["import_ms"],
+    "warmup_ms": startup_report["warmup_ms"] or 0.0,
+    "first_ms": first_ms,
+    "second_ms": second_ms,
+}))
+"""
+
+COLDSTART_COLUMNS = ("ready_ms", "import_ms", "warmup_ms", "first_ms", "second_ms", "process_ms")
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер холодного старта рабочего процесса в рабочем профиле (DEBUG=0): время импорта "
+        "Django и проекта, прогрева (STARTUP_WARMUP) и первого запроса к странице в новом "
+        "процессе. Каждый замер — отдельный процесс; выводятся медианы по --runs запускам "
+        "без прогрева и с прогревом."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/", help="Страница первого запроса")
+        parser.add_argument("--runs", type=int, default=5, help="Число запусков процесса на режим")
+
+    def handle(self, *args, **options):
+        results = {}
+        for warmup in (False, True):
+            label = "с прогревом" if warmup else "без прогрева"
+            self.stdout.write(f"{label}: {options['runs']} запусков")
+            results[label] = [self.run_child(options["path"], warmup) for _ in range(options["runs"])]
+        self.report(results)
+
+    def run_child(self, path, warmup):
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": "main.settings",
+            "DEBUG": "0",
+            "SECRET_KEY": os.environ.get("SECRET_KEY") or get_random_secret_key(),
+            "ALLOWED_HOSTS": "127.0.0.1",
+            "STARTUP_WARMUP": "1" if warmup else "0",
+            "PERF_SAMPLE_RATE": "0",
+            "STARTUP_LOG_LEVEL": "WARNING",
+        }
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-c", CHILD_SCRIPT, path],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        process_ms = (time.perf_counter() - started) * 1000
+        if completed.returncode:
+            raise CommandError(f"Процесс завершился с ошибкой:\n{completed.stderr}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        if not result["status"].startswith("200"):
+            raise CommandError(f"Страница {path} ответила {result['status']}")
+        result["process_ms"] = process_ms
+        return result
+
+    def report(self, results):
+        self.stdout.write("")
+        self.stdout.write(f"{'режим':<14}" + "".join(f"{column:>12}" for column in COLDSTART_COLUMNS))
+        for label, runs in results.items():
+            medians = [statistics.median(run[column] for run in runs) for column in COLDSTART_COLUMNS]
+            self.stdout.write(f"{label:<14}" + "".join(f"{value:>12.1f}" for value in medians))
@@ -0,0 +1,50 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from mainApp.filters import parse_date_param
+from mainApp.recurring import generate_recurring
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт записи ДДС по регулярным правилам на все даты повторения до горизонта "
+        "(по умолчанию сегодня) и пересобирает агрегаты за эти даты. Уже созданные "
+        "повторения не повторяются, поэтому команду можно запускать по расписанию "
+        "одновременно на нескольких узлах."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--until", help="Горизонт YYYY-MM-DD (включительно)")
+        parser.add_argument("--days-ahead", type=int, default=0, help="Горизонт: сегодня плюс N дней")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--every", type=int, default=0,
+            help="Запускаться повторно каждые N секунд (фоновый режим вместо cron)",
+        )
+
+    def handle(self, *args, **options):
+        if options["until"] and parse_date_param(options["until"]) is None:
+            raise CommandError(f"Некорректная дата --until: {options['until']}")
+        while True:
+            self.run(options)
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
+
+    def run(self, options):
+        until = parse_date_param(options["until"]) or timezone.localdate() + timedelta(days=options["days_ahead"])
+        result = generate_recurring(until, batch_size=options["batch_size"])
+        for rule, day in result.missing_rates:
+            self.stdout.write(self.style.WARNING(
+                f"Правило «{rule.name}» остановлено на {day:%d.%m.%Y}: нет курса {rule.currency}"
+            ))
+        if result.closed:
+            self.stdout.write(f"Пропущено повторений в закрытом периоде: {result.closed}")
+        period = f" за {result.date_from:%d.%m.%Y}–{result.date_to:%d.%m.%Y}" if result.created else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"До {until:%d.%m.%Y}: правил {result.rules}, создано записей {result.created}{period} "
+            f"за {result.elapsed:.1f} с"
+        ))
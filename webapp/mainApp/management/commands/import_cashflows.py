@@ -0,0 +1,53 @@
+import csv
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mainApp.imports import encoding_error_line, import_cashflows
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует записи ДДС из CSV в формате выгрузки: "
+        "Дата, Статус, Тип, Категория, Подкатегория, Сумма, Комментарий, Валюта "
+        "(необязательна, по умолчанию — валюта отчётности)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к CSV-файлу (UTF-8)")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--error-report", help="Куда записать CSV-отчёт об ошибках по строкам")
+
+    def handle(self, *args, **options):
+        report_file = None
+        on_error = None
+        if options["error_report"]:
+            report_file = open(options["error_report"], "w", newline="", encoding="utf-8")
+            writer = csv.writer(report_file)
+            writer.writerow(["Строка", "Ошибка"])
+            on_error = lambda line, message: writer.writerow([line, message])  # noqa: E731
+
+        try:
+            with open(options["path"], "rb") as file:
+                # Записи фиксируются пакетами: кодировка проверяется до первой вставки
+                line = encoding_error_line(file)
+                if line is not None:
+                    raise CommandError(f"Файл должен быть в кодировке UTF-8: строка {line} не читается")
+                stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+                result = import_cashflows(stream, batch_size=options["batch_size"], on_error=on_error)
+        except OSError as exc:
+            raise CommandError(f"Не удалось прочитать файл: {exc}")
+        finally:
+            if report_file:
+                report_file.close()
+
+        for line, message in result.errors[:20]:
+            self.stderr.write(f"Строка {line}: {message}")
+        if result.error_count > 20:
+            self.stderr.write(f"... и ещё {result.error_count - 20} ошибок")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано записей: {result.created}, с ошибками: {result.error_count}, "
+            f"обработано {result.processed} строк за {result.elapsed:.1f} с "
+            f"({result.rows_per_second:,.0f} строк/с)"
+        ))
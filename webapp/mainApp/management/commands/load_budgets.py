@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mainApp.budgets import import_budgets
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает бюджеты из CSV с колонками: Месяц (YYYY-MM), Категория, Подкатегория "
+        "(пустая — бюджет всей категории), Сумма в валюте отчётности. "
+        "Бюджеты на те же месяц и статью заменяются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к CSV-файлу (UTF-8)")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as stream:
+                result = import_budgets(stream, batch_size=options["batch_size"])
+        except OSError as exc:
+            raise CommandError(f"Не удалось прочитать файл: {exc}")
+
+        for line, message in result.errors[:20]:
+            self.stderr.write(f"Строка {line}: {message}")
+        if result.error_count > 20:
+            self.stderr.write(f"... и ещё {result.error_count - 20} ошибок")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Загружено строк бюджета: {result.created}, с ошибками: {result.error_count}, "
+            f"обработано {result.processed} строк за {result.elapsed:.1f} с"
+        ))
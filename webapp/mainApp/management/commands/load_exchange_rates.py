@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from mainApp.archive import LEDGER_MODELS
+from mainApp.currency import RateFileError, import_rates, reporting_currency
+from mainApp.filters import day_start
+from mainApp.page_cache import invalidate_cashflows
+from mainApp.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает курсы валют к валюте отчётности из CSV-файлов с заголовком "
+        "date,currency,rate[,nominal] (дата YYYY-MM-DD или ДД.ММ.ГГГГ; курс — сколько единиц "
+        "валюты отчётности стоят nominal единиц валюты). Курсы на уже загруженные даты заменяются. "
+        "Если есть записи ДДС в загруженных валютах, агрегаты пересобираются с первой даты файла."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Пути к CSV-файлам (UTF-8)")
+        parser.add_argument("--delimiter", default=",", help="Разделитель колонок (по умолчанию запятая)")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--no-rebuild", action="store_true", help="Не пересобирать агрегаты")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        loaded = {}
+        for path in options["paths"]:
+            try:
+                with open(path, encoding="utf-8-sig", newline="") as stream:
+                    result = import_rates(stream, options["delimiter"], options["batch_size"])
+            except OSError as exc:
+                raise CommandError(f"Не удалось прочитать {path}: {exc}")
+            except RateFileError as exc:
+                raise CommandError(f"{path}: {exc}")
+            for currency, (count, first) in result.items():
+                total, earliest = loaded.get(currency, (0, first))
+                loaded[currency] = (total + count, min(earliest, first))
+
+        if not loaded:
+            self.stdout.write(f"Курсов не загружено (строки валюты отчётности {reporting_currency()} пропускаются)")
+            return
+        for currency, (count, first) in sorted(loaded.items()):
+            self.stdout.write(f"{currency}: {count} курсов с {first:%d.%m.%Y}")
+
+        # Суммы записей в этих валютах могли пересчитаться по новым курсам
+        first = min(first for count, first in loaded.values())
+        affected = Q(currency__in=list(loaded), created_at__gte=day_start(first))
+        if not any(model.objects.filter(affected).exists() for model in LEDGER_MODELS):
+            self.stdout.write(self.style.SUCCESS(f"Готово за {time.perf_counter() - started:.1f} с"))
+            return
+        if options["no_rebuild"]:
+            invalidate_cashflows()
+            self.stdout.write(self.style.WARNING(
+                f"Агрегаты не пересобраны: запустите rebuild_rollups --date-from {first.isoformat()}"
+            ))
+            return
+        rebuilt = rebuild_rollups(first, batch_size=options["batch_size"])
+        invalidate_cashflows()
+        self.stdout.write(self.style.SUCCESS(
+            f"Агрегаты пересобраны с {first:%d.%m.%Y}: {rebuilt} строк дневного агрегата "
+            f"за {time.perf_counter() - started:.1f} с"
+        ))
@@ -0,0 +1,279 @@
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mainApp.dictionaries import get_dictionaries
+
+
+# Профили базы данных: переменные окружения, с которыми запускается сервер (см. settings.py).
+# Параметры подключения к PostgreSQL (DB_NAME, DB_USER, ...) берутся из текущего окружения.
+LOADTEST_PROFILES = {
+    "sqlite": {"DB_ENGINE": "sqlite", "SQLITE_WAL": "0", "DB_CONN_MAX_AGE": "0"},
+    "sqlite-wal": {"DB_ENGINE": "sqlite", "SQLITE_WAL": "1", "DB_CONN_MAX_AGE": "60"},
+    "postgres": {"DB_ENGINE": "postgresql", "DB_POOL": "0", "DB_CONN_MAX_AGE": "0"},
+    "postgres-persistent": {"DB_ENGINE": "postgresql", "DB_POOL": "0", "DB_CONN_MAX_AGE": "60"},
+    "postgres-pool": {"DB_ENGINE": "postgresql", "DB_POOL": "1"},
+}
+
+# Сценарии нагрузки и их адреса. Сценарии чтения под ASGI-сервером идут
+# на асинхронные варианты страниц (префикс ASYNC_PREFIX).
+LOADTEST_SCENARIOS = {
+    "list": "/",
+    "dashboard": "/dashboard/",
+    "lookup": "/api/categories/?type={type}",
+    "create": "/create/",
+}
+ASYNC_SCENARIOS = ("list", "dashboard", "lookup")
+ASYNC_PREFIX = "/async"
+
+# Способ запуска сервера: WSGI — многопоточный runserver, ASGI — uvicorn с одним процессом
+LOADTEST_SERVERS = ("wsgi", "asgi")
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """
+    Не переходит по редиректу после сохранения формы: замеряется только сам POST.
+    """
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Worker(threading.Thread):
+    """
+    Поток нагрузки: свой набор cookie (сессия и CSRF), запросы одного сценария до истечения времени.
+    """
+
+    def __init__(self, base_url, scenario, path, deadline, form_data):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.scenario = scenario
+        self.url = base_url + path
+        self.deadline = deadline
+        self.form_data = form_data
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect())
+        self.latencies = []
+        self.errors = 0
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        return ""
+
+    def request(self):
+        if self.scenario != "create":
+            return self.opener.open(self.url, timeout=30)
+        data = urllib.parse.urlencode({**self.form_data, "csrfmiddlewaretoken": self.csrf_token()}).encode()
+        return self.opener.open(self.url, data=data, timeout=30)
+
+    def run(self):
+        if self.scenario == "create":
+            # Страница формы выдаёт CSRF-cookie для последующих POST
+            self.opener.open(self.url, timeout=30).read()
+        while time.monotonic() < self.deadline:
+            started = time.perf_counter()
+            try:
+                with self.request() as response:
+                    response.read()
+            except urllib.error.HTTPError as exc:
+                # 302 после успешного сохранения формы — это успех
+                if exc.code >= 400:
+                    self.errors += 1
+                    continue
+            except OSError:
+                self.errors += 1
+                continue
+            self.latencies.append(time.perf_counter() - started)
+
+
+def percentile(values, fraction):
+    """
+    Процентиль по отсортированному списку (ближайший ранг).
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест страниц записей под разными профилями базы данных и способами запуска. "
+        "Для каждого профиля и сервера (WSGI — runserver, ASGI — uvicorn с асинхронными "
+        "страницами async/) запускается сервер с переменными окружения профиля, затем "
+        "параллельные клиенты в течение --duration секунд выполняют сценарии: список, панель "
+        "аналитики, JSON-список категорий и создание записи. Выводятся запросы в секунду и "
+        "задержки p50/p95/p99. Сценарий create добавляет записи в базу — используйте копию "
+        "базы (DB_NAME). С --url нагружается уже запущенный сервер."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile", action="append", choices=sorted(LOADTEST_PROFILES),
+            help="Профиль базы (можно указать несколько раз; по умолчанию sqlite и sqlite-wal)",
+        )
+        parser.add_argument(
+            "--server", action="append", choices=LOADTEST_SERVERS,
+            help="Способ запуска сервера (можно указать несколько раз; по умолчанию wsgi)",
+        )
+        parser.add_argument("--url", help="Адрес уже запущенного сервера вместо запуска")
+        parser.add_argument(
+            "--async-views", action="store_true",
+            help="С --url: нагружать асинхронные страницы async/",
+        )
+        parser.add_argument(
+            "--scenario", action="append", choices=list(LOADTEST_SCENARIOS),
+            help="Сценарий нагрузки (по умолчанию все)",
+        )
+        parser.add_argument("--duration", type=float, default=10.0, help="Длительность сценария, с")
+        parser.add_argument("--concurrency", type=int, default=8, help="Число параллельных клиентов")
+        parser.add_argument("--port", type=int, default=8765, help="Порт для запускаемого сервера")
+
+    def handle(self, *args, **options):
+        scenarios = options["scenario"] or list(LOADTEST_SCENARIOS)
+        form_data = self.form_data() if {"create", "lookup"} & set(scenarios) else None
+
+        results = []
+        if options["url"]:
+            label = "сервер (async)" if options["async_views"] else "сервер"
+            results += self.run_scenarios(
+                label, options["url"].rstrip("/"), options["async_views"], scenarios, form_data, options
+            )
+        else:
+            servers = options["server"] or ["wsgi"]
+            if "asgi" in servers and importlib.util.find_spec("uvicorn") is None:
+                raise CommandError("Для --server asgi установите uvicorn: pip install uvicorn")
+            for profile in options["profile"] or ["sqlite", "sqlite-wal"]:
+                for server in servers:
+                    with ProfileServer(profile, server, options["port"]) as base_url:
+                        results += self.run_scenarios(
+                            f"{profile}/{server}", base_url, server == "asgi", scenarios, form_data, options
+                        )
+        self.report(results)
+
+    def form_data(self):
+        """
+        Данные формы создания записи: первые статус и подкатегория из справочников.
+        """
+        dictionaries = get_dictionaries()
+        if not dictionaries.statuses or not dictionaries.subcategories:
+            raise CommandError("Для сценария create нужны хотя бы один статус и одна подкатегория")
+        subcategory = dictionaries.subcategories[0]
+        return {
+            "created_at": "2025-01-01",
+            "status": dictionaries.statuses[0].pk,
+            "type": subcategory.category.type_id,
+            "category": subcategory.category_id,
+            "subcategory": subcategory.pk,
+            "amount": "100.00",
+            "comment": "loadtest",
+        }
+
+    def run_scenarios(self, profile, base_url, async_views, scenarios, form_data, options):
+        results = []
+        for scenario in scenarios:
+            self.stdout.write(f"{profile}: {scenario}, {options['concurrency']} клиентов, {options['duration']} с")
+            path = LOADTEST_SCENARIOS[scenario].format(type=form_data["type"] if form_data else "")
+            if async_views and scenario in ASYNC_SCENARIOS:
+                path = ASYNC_PREFIX + path
+            deadline = time.monotonic() + options["duration"]
+            workers = [
+                Worker(base_url, scenario, path, deadline, form_data)
+                for _ in range(options["concurrency"])
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+
+            latencies = sorted(latency * 1000 for worker in workers for latency in worker.latencies)
+            results.append({
+                "profile": profile,
+                "scenario": scenario,
+                "requests": len(latencies),
+                "errors": sum(worker.errors for worker in workers),
+                "rps": len(latencies) / elapsed,
+                "mean_ms": statistics.fmean(latencies) if latencies else 0.0,
+                "p50_ms": percentile(latencies, 0.50),
+                "p95_ms": percentile(latencies, 0.95),
+                "p99_ms": percentile(latencies, 0.99),
+            })
+        return results
+
+    def report(self, results):
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'профиль':<26} {'сценарий':<10} {'запросов':>9} {'ошибок':>7} {'зап/с':>8} "
+            f"{'ср., мс':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+        )
+        for row in results:
+            self.stdout.write(
+                f"{row['profile']:<26} {row['scenario']:<10} {row['requests']:>9} {row['errors']:>7} "
+                f"{row['rps']:>8.1f} {row['mean_ms']:>8.1f} {row['p50_ms']:>8.1f} "
+                f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+            )
+
+
+class ProfileServer:
+    """
+    Контекстный менеджер: сервер (runserver для WSGI, uvicorn для ASGI) с переменными
+    окружения профиля на время замера.
+    """
+
+    def __init__(self, profile, server, port, startup_timeout=30):
+        self.profile = profile
+        self.server = server
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.port = port
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    def command(self):
+        if self.server == "asgi":
+            return [
+                sys.executable, "-m", "uvicorn", "main.asgi:application",
+                "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning",
+            ]
+        return [sys.executable, "manage.py", "runserver", f"127.0.0.1:{self.port}", "--noreload"]
+
+    def __enter__(self):
+        env = {**os.environ, **LOADTEST_PROFILES[self.profile]}
+        self.process = subprocess.Popen(
+            self.command(),
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f"Сервер профиля {self.profile} завершился при запуске")
+            try:
+                urllib.request.urlopen(self.base_url + "/", timeout=5).read()
+                return self.base_url
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise CommandError(f"Сервер профиля {self.profile} не ответил за {self.startup_timeout} с")
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
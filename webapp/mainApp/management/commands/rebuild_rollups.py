@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mainApp.filters import parse_date_param
+from mainApp.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Пересобирает дневные агрегаты ДДС (CashFlowRollup) из таблицы записей и архива."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date-from", help="Начальная дата YYYY-MM-DD (включительно)")
+        parser.add_argument("--date-to", help="Конечная дата YYYY-MM-DD (включительно)")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        date_from = parse_date_param(options["date_from"])
+        date_to = parse_date_param(options["date_to"])
+        if options["date_from"] and not date_from or options["date_to"] and not date_to:
+            raise CommandError("Даты указываются в формате YYYY-MM-DD")
+
+        started = time.perf_counter()
+        created = rebuild_rollups(date_from, date_to, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано строк агрегата: {created} за {time.perf_counter() - started:.1f} с"
+        ))
@@ -0,0 +1,204 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates, Template
+
+
+# Метрики запроса, который сейчас обрабатывается (None — запрос не попал в выборку).
+# ContextVar, а не thread-local: значение доходит и до потоков sync_to_async,
+# в которых асинхронный ORM выполняет запросы.
+current_metrics = ContextVar("current_metrics", default=None)
+
+# Границы корзин гистограмм: время в миллисекундах и число SQL-запросов
+TIME_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Сколько самых частых повторяющихся запросов хранить и показывать
+TOP_DUPLICATES = 10
+
+# Списки плейсхолдеров: IN (%s, %s, ...) и VALUES (%s, ...), (%s, ...) — один отпечаток
+# независимо от числа параметров
+PLACEHOLDER_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+REPEATED_GROUPS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def sql_fingerprint(sql):
+    """
+    Отпечаток SQL-запроса: текст с плейсхолдерами вместо значений (Django передаёт
+    параметры отдельно), со свёрнутыми списками плейсхолдеров и пробелами.
+    """
+    sql = PLACEHOLDER_LIST.sub("(...)", sql)
+    sql = REPEATED_GROUPS.sub("(...)", sql)
+    return WHITESPACE.sub(" ", sql).strip()
+
+
+class RequestMetrics:
+    """
+    Стоимость одного запроса: SQL-запросы с отпечатками и время отрисовки шаблонов.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.fingerprints = Counter()
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def duplicates(self):
+        """
+        Отпечатки запросов, выполненных больше одного раза (типичный признак N+1).
+        """
+        return [(sql, count) for sql, count in self.fingerprints.most_common(TOP_DUPLICATES) if count > 1]
+
+
+def record_sql(execute, sql, params, many, context):
+    """
+    Обёртка выполнения SQL (connection.execute_wrapper), которая ставится на все
+    соединения при их создании. Вне выборки только передаёт вызов дальше.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_time += time.perf_counter() - started
+        metrics.queries += 1
+        metrics.fingerprints[sql_fingerprint(sql)] += 1
+
+
+def install_sql_recorder(sender, connection, **kwargs):
+    """
+    Обработчик сигнала connection_created.
+    """
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+
+class TimedTemplate(Template):
+    """
+    Шаблон, время отрисовки которого прибавляется к метрикам текущего запроса.
+    Вложенные отрисовки (include, render_to_string внутри шаблона) не считаются дважды.
+    """
+
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    Бэкенд шаблонов Django, который замеряет время отрисовки (см. TEMPLATES в settings.py).
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными границами корзин (накопительные счётчики, как в Prometheus).
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def as_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"buckets": buckets, "sum": round(self.sum, 3), "count": self.count}
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.wall_ms = Histogram(TIME_BUCKETS_MS)
+        self.sql_ms = Histogram(TIME_BUCKETS_MS)
+        self.template_ms = Histogram(TIME_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.duplicate_requests = 0
+        self.duplicates = Counter()
+
+    def observe(self, record):
+        self.wall_ms.observe(record["wall_ms"])
+        self.sql_ms.observe(record["sql_ms"])
+        self.template_ms.observe(record["template_ms"])
+        self.queries.observe(record["queries"])
+        if record["duplicates"]:
+            self.duplicate_requests += 1
+            for item in record["duplicates"]:
+                self.duplicates[item["sql"]] += item["count"]
+            # Держим только самые частые отпечатки, чтобы память не росла
+            if len(self.duplicates) > TOP_DUPLICATES * 10:
+                self.duplicates = Counter(dict(self.duplicates.most_common(TOP_DUPLICATES)))
+
+    def as_dict(self):
+        return {
+            "requests": self.wall_ms.count,
+            "wall_ms": self.wall_ms.as_dict(),
+            "sql_ms": self.sql_ms.as_dict(),
+            "template_ms": self.template_ms.as_dict(),
+            "queries": self.queries.as_dict(),
+            "duplicate_requests": self.duplicate_requests,
+            "top_duplicates": [
+                {"sql": sql, "count": count} for sql, count in self.duplicates.most_common(TOP_DUPLICATES)
+            ],
+        }
+
+
+class MetricsRegistry:
+    """
+    Метрики запросов в памяти процесса, сгруппированные по имени представления.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, record):
+        with self.lock:
+            self.views.setdefault(record["view"], ViewMetrics()).observe(record)
+
+    def as_dict(self):
+        with self.lock:
+            return {view: metrics.as_dict() for view, metrics in sorted(self.views.items())}
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,94 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import RequestMetrics, current_metrics, registry
+
+
+logger = logging.getLogger("mainApp.performance")
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет стоимость запросов: представление, общее время, число и время SQL-запросов,
+    повторяющиеся запросы (по отпечаткам) и время отрисовки шаблонов.
+
+    Результат пишется структурированной записью в лог mainApp.performance, в заголовок
+    Server-Timing и в гистограммы реестра метрик (см. представление performance_metrics).
+    Замеряется доля запросов PERF_SAMPLE_RATE; остальные проходят почти без накладных
+    расходов. Должен стоять первым в MIDDLEWARE, чтобы учитывать время остальных
+    промежуточных слоёв. Для потоковых ответов время считается до начала отдачи тела.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PERF_SAMPLE_RATE", 1.0)
+        self.slow_request_ms = getattr(settings, "PERF_SLOW_REQUEST_MS", 500)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        match = getattr(request, "resolver_match", None)
+        record = {
+            "view": match.view_name if match else "<unresolved>",
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "wall_ms": round((time.perf_counter() - metrics.started) * 1000, 3),
+            "queries": metrics.queries,
+            "sql_ms": round(metrics.sql_time * 1000, 3),
+            "template_ms": round(metrics.template_time * 1000, 3),
+            "duplicates": [{"sql": sql, "count": count} for sql, count in metrics.duplicates()],
+        }
+        registry.observe(record)
+
+        # Медленные запросы и запросы с повторами видны и при уровне WARNING, остальные — на INFO
+        level = logging.INFO
+        if record["wall_ms"] >= self.slow_request_ms or record["duplicates"]:
+            level = logging.WARNING
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(record, ensure_ascii=False), extra={"performance": record})
+
+        timing = [
+            f'view;desc="{record["view"]}"',
+            f'total;dur={record["wall_ms"]}',
+            f'sql;dur={record["sql_ms"]};desc="{record["queries"]} queries"',
+            f'tpl;dur={record["template_ms"]}',
+        ]
+        if record["duplicates"]:
+            timing.append(f'dup;desc="{len(record["duplicates"])} repeated queries"')
+        response["Server-Timing"] = ", ".join(timing)
+        return response
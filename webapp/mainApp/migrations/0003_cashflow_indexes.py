@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0002_alter_cashflow_created_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['created_at'], name='cf_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['status', 'created_at'], name='cf_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['type', 'created_at'], name='cf_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['category', 'created_at'], name='cf_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['subcategory', 'created_at'], name='cf_subcategory_created_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_rollups(apps, schema_editor):
+    """
+    Заполняет дневные агрегаты из уже накопленных записей ДДС — так же, как
+    rebuild_rollups(): группировкой по дню и справочникам и пакетными вставками.
+    Дальше агрегаты поддерживают сигналы; месячные заполняет следующая миграция.
+    """
+    CashFlow = apps.get_model('mainApp', 'CashFlow')
+    CashFlowRollup = apps.get_model('mainApp', 'CashFlowRollup')
+    groups = (
+        CashFlow.objects
+        .annotate(date=TruncDate('created_at'))
+        .values('date', 'status_id', 'type_id', 'category_id', 'subcategory_id')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    CashFlowRollup.objects.bulk_create(
+        (CashFlowRollup(**group) for group in groups.iterator()),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0003_cashflow_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashFlowRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mainApp.category')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mainApp.status')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mainApp.subcategory')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mainApp.type')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'status', 'type', 'category', 'subcategory'), name='cashflow_rollup_unique_key')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def fill_monthly_rollups(apps, schema_editor):
+    """
+    Заполняет месячные агрегаты из уже накопленных дневных.
+    """
+    CashFlowRollup = apps.get_model('mainApp', 'CashFlowRollup')
+    CashFlowMonthlyRollup = apps.get_model('mainApp', 'CashFlowMonthlyRollup')
+    groups = (
+        CashFlowRollup.objects
+        .annotate(month=TruncMonth('date'))
+        .values('month', 'status_id', 'type_id', 'category_id', 'subcategory_id')
+        .annotate(total=Sum('total'), count=Sum('count'))
+        .order_by()
+    )
+    CashFlowMonthlyRollup.objects.bulk_create(
+        (CashFlowMonthlyRollup(**group) for group in groups.iterator()),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0004_cashflow_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashFlowMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('count', models.IntegerField(default=0)),
+                ('month', models.DateField()),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mainApp.category')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mainApp.status')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mainApp.subcategory')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mainApp.type')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('month', 'status', 'type', 'category', 'subcategory'), name='cashflow_monthly_rollup_unique_key')],
+            },
+        ),
+        migrations.RunPython(fill_monthly_rollups, migrations.RunPython.noop),
+    ]
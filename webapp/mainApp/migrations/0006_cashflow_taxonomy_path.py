@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:25
+
+from django.db import migrations, models
+from django.db.models import Case, Max, Min, Value, When
+
+# Размер пакета заполнения: каждый пакет — отдельный UPDATE в своей транзакции
+BACKFILL_BATCH_SIZE = 10000
+
+
+def fill_taxonomy_paths(apps, schema_editor):
+    """
+    Заполняет taxonomy_path существующих записей пакетами по диапазонам id.
+    В исторических моделях нет __str__, поэтому название собирается здесь же.
+    """
+    SubCategory = apps.get_model('mainApp', 'SubCategory')
+    CashFlow = apps.get_model('mainApp', 'CashFlow')
+    paths = {
+        subcategory.pk: f"{subcategory.category.type.name} -> {subcategory.category.name} -> {subcategory.name}"
+        for subcategory in SubCategory.objects.select_related('category__type')
+    }
+    if not paths:
+        return
+    path = Case(
+        *(When(subcategory_id=pk, then=Value(value)) for pk, value in paths.items()),
+        default=Value(''),
+        output_field=models.CharField(),
+    )
+    bounds = CashFlow.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return
+    for start in range(bounds['first'], bounds['last'] + 1, BACKFILL_BATCH_SIZE):
+        CashFlow.objects.filter(id__gte=start, id__lt=start + BACKFILL_BATCH_SIZE).update(taxonomy_path=path)
+
+
+class Migration(migrations.Migration):
+    # Пакеты фиксируются по одному, а не одной транзакцией на всю таблицу
+    atomic = False
+
+    dependencies = [
+        ('mainApp', '0005_cashflow_monthly_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashflow',
+            name='taxonomy_path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=310),
+        ),
+        migrations.RunPython(fill_taxonomy_paths, migrations.RunPython.noop),
+        # Индекс строится после заполнения: так быстрее, чем обновлять его на каждый пакет
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['taxonomy_path', 'created_at'], name='cf_taxonomy_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:40
+
+from django.db import migrations
+
+from mainApp.search import drop_search_index, install_search_index
+
+
+def create_search_index(apps, schema_editor):
+    install_search_index(schema_editor)
+
+
+def remove_search_index(apps, schema_editor):
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0006_cashflow_taxonomy_path'),
+    ]
+
+    operations = [
+        # Таблица FTS5 с триггерами (SQLite) или индекс GIN по tsvector (PostgreSQL)
+        migrations.RunPython(create_search_index, remove_search_index),
+    ]
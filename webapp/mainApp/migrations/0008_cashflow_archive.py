@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+from mainApp.search import ARCHIVE_TABLE, drop_search_index, install_search_index
+
+
+def create_search_index(apps, schema_editor):
+    install_search_index(schema_editor, ARCHIVE_TABLE)
+
+
+def remove_search_index(apps, schema_editor):
+    drop_search_index(schema_editor, ARCHIVE_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0007_cashflow_comment_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashFlowArchive',
+            fields=[
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('comment', models.TextField(blank=True, null=True)),
+                ('taxonomy_path', models.CharField(blank=True, default='', editable=False, max_length=310)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='mainApp.category')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='mainApp.status')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='mainApp.subcategory')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='mainApp.type')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='cfa_created_idx'), models.Index(fields=['status', 'created_at'], name='cfa_status_created_idx'), models.Index(fields=['type', 'created_at'], name='cfa_type_created_idx'), models.Index(fields=['category', 'created_at'], name='cfa_category_created_idx'), models.Index(fields=['subcategory', 'created_at'], name='cfa_subcategory_created_idx'), models.Index(fields=['taxonomy_path', 'created_at'], name='cfa_taxonomy_created_idx')],
+            },
+        ),
+        # Полнотекстовый индекс комментариев архива, как у оперативной таблицы (0007)
+        migrations.RunPython(create_search_index, remove_search_index),
+    ]
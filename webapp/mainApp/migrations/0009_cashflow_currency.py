@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:52
+
+import mainApp.models
+from django.db import migrations, models
+
+from mainApp.search import ARCHIVE_TABLE, CASHFLOW_TABLE, install_search_index
+
+
+def reinstall_search_indexes(apps, schema_editor):
+    # На SQLite добавление и удаление столбца пересоздаёт таблицы вместе с триггерами FTS5
+    install_search_index(schema_editor, CASHFLOW_TABLE)
+    install_search_index(schema_editor, ARCHIVE_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0008_cashflow_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_indexes),
+        migrations.AddField(
+            model_name='cashflow',
+            name='currency',
+            field=models.CharField(default=mainApp.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='cashflowarchive',
+            name='currency',
+            field=models.CharField(default=mainApp.models.default_currency, max_length=3),
+        ),
+        migrations.RunPython(reinstall_search_indexes, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('date', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=8, max_digits=18)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('currency', 'date'), name='exchange_rate_unique_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0009_cashflow_currency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Budget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to='mainApp.category')),
+                ('subcategory', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to='mainApp.subcategory')),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('category__isnull', False), ('subcategory__isnull', True)), models.Q(('category__isnull', True), ('subcategory__isnull', False)), _connector='OR'), name='budget_category_or_subcategory'), models.UniqueConstraint(fields=('month', 'category'), name='budget_month_category_unique'), models.UniqueConstraint(fields=('month', 'subcategory'), name='budget_month_subcategory_unique')],
+            },
+        ),
+    ]
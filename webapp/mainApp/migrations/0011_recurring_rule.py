@@ -0,0 +1,77 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:16
+
+import django.db.models.deletion
+import mainApp.models
+from django.db import migrations, models
+
+from mainApp.search import ARCHIVE_TABLE, CASHFLOW_TABLE, install_search_index
+
+
+def reinstall_search_indexes(apps, schema_editor):
+    # На SQLite добавление ограничения уникальности пересоздаёт таблицу вместе с триггерами FTS5
+    install_search_index(schema_editor, CASHFLOW_TABLE)
+    install_search_index(schema_editor, ARCHIVE_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0010_budget'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('frequency', models.CharField(choices=[('daily', 'Ежедневно'), ('weekly', 'Еженедельно'), ('monthly', 'Ежемесячно'), ('yearly', 'Ежегодно')], default='monthly', max_length=10)),
+                ('interval', models.PositiveSmallIntegerField(default=1)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('next_date', models.DateField(editable=False)),
+                ('active', models.BooleanField(default=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('currency', models.CharField(default=mainApp.models.default_currency, max_length=3)),
+                ('comment', models.TextField(blank=True, null=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='recurring_rules', to='mainApp.category')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='recurring_rules', to='mainApp.status')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='recurring_rules', to='mainApp.subcategory')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='recurring_rules', to='mainApp.type')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recurringrule',
+            index=models.Index(fields=['active', 'next_date'], name='recurring_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recurringrule',
+            constraint=models.CheckConstraint(condition=models.Q(('interval__gte', 1)), name='recurring_interval_positive'),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_indexes),
+        migrations.AddField(
+            model_name='cashflow',
+            name='occurrence_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='cashflowarchive',
+            name='occurrence_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='cashflow',
+            name='recurring_rule',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='mainApp.recurringrule'),
+        ),
+        migrations.AddField(
+            model_name='cashflowarchive',
+            name='recurring_rule',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='mainApp.recurringrule'),
+        ),
+        migrations.AddConstraint(
+            model_name='cashflow',
+            constraint=models.UniqueConstraint(fields=('recurring_rule', 'occurrence_date'), name='cashflow_recurring_occurrence_unique'),
+        ),
+        migrations.RunPython(reinstall_search_indexes, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
@@ -32,11 +33,231 @@ class SubCategory(models.Model):
         return f"{self.category} -> {self.name}"
 
 
-class CashFlow(models.Model):
+# Знаки валют для шаблонов; для остальных валют выводится код
+CURRENCY_SYMBOLS = {"RUB": "₽", "USD": "$", "EUR": "€", "CNY": "¥"}
+
+
+def default_currency():
+    return settings.REPORTING_CURRENCY
+
+
+def currency_symbol(code):
+    return CURRENCY_SYMBOLS.get(code, code)
+
+
+class CashFlowBase(models.Model):
+    """
+    Общие поля записи ДДС для оперативной таблицы и архива закрытых периодов.
+    """
     created_at = models.DateTimeField(auto_now_add=False, auto_now=False, default=timezone.now)
     status = models.ForeignKey(Status, on_delete=models.PROTECT)
     type = models.ForeignKey(Type, on_delete=models.PROTECT)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
     subcategory = models.ForeignKey(SubCategory, on_delete=models.PROTECT)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
-    comment = models.TextField(blank=True, null=True)
\ No newline at end of file
+    # Валюта суммы (код ISO 4217); агрегаты и итоги считаются в валюте отчётности (currency.py)
+    currency = models.CharField(max_length=3, default=default_currency)
+    comment = models.TextField(blank=True, null=True)
+    # Полное название подкатегории "Тип -> Категория -> Подкатегория" (как SubCategory.__str__).
+    # Денормализовано, чтобы группировать и фильтровать по нему без соединений со справочниками.
+    # Заполняется при сохранении записи и обновляется при переименовании справочников (taxonomy.py).
+    taxonomy_path = models.CharField(max_length=310, blank=True, default="", editable=False)
+    # Регулярное правило, по которому создана запись, и дата повторения: пара уникальна
+    # в оперативной таблице, поэтому повторный или параллельный запуск не создаёт дублей
+    recurring_rule = models.ForeignKey(
+        'RecurringRule', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+'
+    )
+    occurrence_date = models.DateField(null=True, blank=True, editable=False)
+
+    # Запись из архива закрытых периодов (только для чтения)
+    archived = False
+
+    class Meta:
+        abstract = True
+
+    @property
+    def currency_symbol(self):
+        return currency_symbol(self.currency)
+
+    @property
+    def foreign_currency(self):
+        return self.currency != settings.REPORTING_CURRENCY
+
+
+class CashFlow(CashFlowBase):
+    class Meta:
+        # Составные индексы под реальные комбинации фильтров списка:
+        # равенство по справочнику + диапазон/сортировка по дате.
+        indexes = [
+            models.Index(fields=["created_at"], name="cf_created_idx"),
+            models.Index(fields=["status", "created_at"], name="cf_status_created_idx"),
+            models.Index(fields=["type", "created_at"], name="cf_type_created_idx"),
+            models.Index(fields=["category", "created_at"], name="cf_category_created_idx"),
+            models.Index(fields=["subcategory", "created_at"], name="cf_subcategory_created_idx"),
+            models.Index(fields=["taxonomy_path", "created_at"], name="cf_taxonomy_created_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recurring_rule", "occurrence_date"], name="cashflow_recurring_occurrence_unique",
+            ),
+        ]
+
+
+# Архив записей ДДС закрытых периодов (целых месяцев до границы архива, см. archive.py).
+# Записи переносятся с прежними id, поэтому id уникальны в обеих таблицах вместе,
+# а оперативная таблица CashFlow остаётся небольшой независимо от длины истории.
+class CashFlowArchive(CashFlowBase):
+    id = models.BigIntegerField(primary_key=True)
+
+    archived = True
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="cfa_created_idx"),
+            models.Index(fields=["status", "created_at"], name="cfa_status_created_idx"),
+            models.Index(fields=["type", "created_at"], name="cfa_type_created_idx"),
+            models.Index(fields=["category", "created_at"], name="cfa_category_created_idx"),
+            models.Index(fields=["subcategory", "created_at"], name="cfa_subcategory_created_idx"),
+            models.Index(fields=["taxonomy_path", "created_at"], name="cfa_taxonomy_created_idx"),
+        ]
+
+# Курс валюты на дату: сколько единиц валюты отчётности стоит единица currency.
+# Загружается из файлов командой load_exchange_rates; для даты без курса
+# действует последний курс до неё (выходные, праздники).
+class ExchangeRate(models.Model):
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["currency", "date"], name="exchange_rate_unique_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.currency} {self.date}: {self.rate}"
+
+
+# План (бюджет) на месяц по категории или по подкатегории в валюте отчётности.
+# month — первое число месяца. Строка бюджета относится либо к категории целиком,
+# либо к одной подкатегории: категория подкатегории берётся из справочника, поэтому
+# перенос подкатегории в другую категорию не требует правки бюджетов (см. budgets.py).
+class Budget(models.Model):
+    month = models.DateField()
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, null=True, blank=True, related_name='budgets'
+    )
+    subcategory = models.ForeignKey(
+        SubCategory, on_delete=models.CASCADE, null=True, blank=True, related_name='budgets'
+    )
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    models.Q(category__isnull=False, subcategory__isnull=True)
+                    | models.Q(category__isnull=True, subcategory__isnull=False)
+                ),
+                name="budget_category_or_subcategory",
+            ),
+            models.UniqueConstraint(fields=["month", "category"], name="budget_month_category_unique"),
+            models.UniqueConstraint(fields=["month", "subcategory"], name="budget_month_subcategory_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%m.%Y} {self.subcategory or self.category}: {self.amount}"
+
+
+class RollupBase(models.Model):
+    """
+    Общие поля предагрегированных сумм ДДС по справочникам.
+    Суммы total — в валюте отчётности (settings.REPORTING_CURRENCY).
+    """
+    status = models.ForeignKey(Status, on_delete=models.CASCADE, related_name='+')
+    type = models.ForeignKey(Type, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    subcategory = models.ForeignKey(SubCategory, on_delete=models.CASCADE, related_name='+')
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+# Предагрегированные суммы ДДС по дням и справочникам.
+# Поддерживается инкрементально сигналами CashFlow (см. rollups.py) и
+# пересобирается целиком командой rebuild_rollups.
+class CashFlowRollup(RollupBase):
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "status", "type", "category", "subcategory"],
+                name="cashflow_rollup_unique_key",
+            ),
+        ]
+
+
+# Те же суммы по месяцам (month — первое число месяца). Отчёты за целые месяцы
+# читают эту таблицу: она на порядок меньше дневной.
+class CashFlowMonthlyRollup(RollupBase):
+    month = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["month", "status", "type", "category", "subcategory"],
+                name="cashflow_monthly_rollup_unique_key",
+            ),
+        ]
+
+
+# Регулярная операция (аренда, зарплата, подписка): записи ДДС по ней создаются
+# командой generate_recurring на все даты повторения до горизонта (см. recurring.py).
+# Повторения считаются от start_date: каждые interval дней, недель, месяцев или лет;
+# для месяцев и лет число переносится на последний день, если в месяце его нет.
+# next_date — первое ещё не созданное повторение, по нему выбираются правила к запуску.
+class RecurringRule(models.Model):
+    DAILY = "daily"
+    WEEKLY = "weekly"
+    MONTHLY = "monthly"
+    YEARLY = "yearly"
+    FREQUENCY_CHOICES = [
+        (DAILY, "Ежедневно"),
+        (WEEKLY, "Еженедельно"),
+        (MONTHLY, "Ежемесячно"),
+        (YEARLY, "Ежегодно"),
+    ]
+
+    name = models.CharField(max_length=200)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default=MONTHLY)
+    interval = models.PositiveSmallIntegerField(default=1)
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    next_date = models.DateField(editable=False)
+    active = models.BooleanField(default=True)
+    status = models.ForeignKey(Status, on_delete=models.PROTECT, related_name='recurring_rules')
+    type = models.ForeignKey(Type, on_delete=models.PROTECT, related_name='recurring_rules')
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='recurring_rules')
+    subcategory = models.ForeignKey(SubCategory, on_delete=models.PROTECT, related_name='recurring_rules')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3, default=default_currency)
+    comment = models.TextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["active", "next_date"], name="recurring_due_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(interval__gte=1), name="recurring_interval_positive"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.next_date is None:
+            self.next_date = self.start_date
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.name} ({self.get_frequency_display().lower()}): {self.amount}"
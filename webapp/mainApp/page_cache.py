@@ -0,0 +1,110 @@
+import hashlib
+import threading
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+
+from .filters import FILTER_PARAMS
+from .search import ORDER_PARAM
+from .versions import bump_version
+
+
+# Имя версии записей ДДС (см. versions.py): меняется при любом изменении записей
+CASHFLOW_VERSION = "cashflows"
+
+# Срок хранения страниц и фрагментов. Ключи содержат версии данных, поэтому устаревшие
+# записи никогда не читаются, а срок лишь ограничивает их время жизни в кэше.
+PAGE_CACHE_TIMEOUT = 300
+
+# Параметры запроса, от которых зависят панель фильтров и страница списка
+FILTER_BAR_PARAMS = FILTER_PARAMS + ("pagination", ORDER_PARAM)
+LIST_PAGE_PARAMS = FILTER_BAR_PARAMS + ("page", "after", "before")
+
+FRAGMENT_KEY = "mainApp:fragment:{name}:{digest}"
+
+
+def normalized_query(params, keys):
+    """
+    Строка запроса только из параметров keys, без пустых значений и в постоянном порядке:
+    ?type=1&status=2 и ?status=2&type=1&utm=x дают один и тот же ключ кэша.
+    """
+    return urlencode(sorted((key, value) for key in keys for value in params.getlist(key) if value))
+
+
+def invalidate_cashflows():
+    """
+    Сбрасывает закэшированные страницы после изменения записей ДДС. Вызывается сигналами
+    модели и явно после массовых операций в обход сигналов (bulk_create, update).
+    """
+    bump_version(CASHFLOW_VERSION)
+
+
+class CacheStats:
+    """
+    Счётчики попаданий и промахов кэша фрагментов в этом процессе (показываются на /metrics/).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def record(self, name, hit):
+        with self.lock:
+            (self.hits if hit else self.misses)[name] += 1
+
+    def as_dict(self):
+        with self.lock:
+            result = {}
+            for name in sorted(set(self.hits) | set(self.misses)):
+                hits, misses = self.hits[name], self.misses[name]
+                result[name] = {"hits": hits, "misses": misses, "hit_ratio": round(hits / (hits + misses), 4)}
+            return result
+
+    def reset(self):
+        with self.lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+cache_stats = CacheStats()
+
+
+def fragment_key(name, parts):
+    digest = hashlib.md5("|".join(map(str, parts)).encode()).hexdigest()
+    return FRAGMENT_KEY.format(name=name, digest=digest)
+
+
+def get_fragment(name, parts):
+    """
+    Отрисованный фрагмент (или страница) name с ключом из parts; None при промахе.
+    """
+    value = cache.get(fragment_key(name, parts))
+    cache_stats.record(name, value is not None)
+    return value
+
+
+def set_fragment(name, parts, value):
+    cache.set(fragment_key(name, parts), value, timeout=PAGE_CACHE_TIMEOUT)
+
+
+async def aget_fragment(name, parts):
+    value = await cache.aget(fragment_key(name, parts))
+    cache_stats.record(name, value is not None)
+    return value
+
+
+async def aset_fragment(name, parts, value):
+    await cache.aset(fragment_key(name, parts), value, timeout=PAGE_CACHE_TIMEOUT)
+
+
+def cached_fragment(name, parts, render):
+    """
+    Возвращает фрагмент name из кэша или отрисовывает его функцией render и кэширует.
+    """
+    value = get_fragment(name, parts)
+    if value is None:
+        value = render()
+        set_fragment(name, parts, value)
+    return value
@@ -0,0 +1,183 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def encode_cursor(obj):
+    """
+    Кодирует ключ записи (created_at, id) в непрозрачную строку для URL.
+    """
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Декодирует курсор обратно в пару (created_at, id).
+    Возвращает None, если курсор пустой или повреждён.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class KeysetPage:
+    """
+    Страница курсорной пагинации. Повторяет ту часть интерфейса django.core.paginator.Page,
+    которой пользуются ListView и шаблоны.
+    """
+
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0]) if self._has_previous and self.object_list else None
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self._has_next and self.object_list else None
+
+
+class KeysetPaginator:
+    """
+    Курсорная (keyset) пагинация по убыванию ключа (created_at, id).
+
+    Вместо OFFSET каждая страница выбирается условием «строго после курсора», поэтому
+    время выборки не зависит от глубины страницы и обслуживается индексом по created_at.
+    Общее число записей считается только до count_limit, а не полным COUNT(*).
+    """
+
+    def __init__(self, queryset, per_page, count_limit=1000):
+        self.queryset = queryset.order_by("-created_at", "-id")
+        self.per_page = per_page
+        self.count_limit = count_limit
+
+    @cached_property
+    def count(self):
+        """
+        Число записей, ограниченное сверху count_limit + 1.
+        """
+        return self.count_query().count()
+
+    async def acount(self):
+        """
+        Асинхронный подсчёт: результат сохраняется в count, как и у синхронного свойства.
+        """
+        if "count" not in self.__dict__:
+            self.__dict__["count"] = await self.count_query().acount()
+        return self.count
+
+    def count_query(self):
+        return self.queryset.order_by()[:self.count_limit + 1]
+
+    @property
+    def count_is_exact(self):
+        return self.count <= self.count_limit
+
+    def page(self, after=None, before=None):
+        """
+        Возвращает страницу после курсора after или перед курсором before.
+        Без курсоров (или с повреждённым курсором) возвращает первую страницу.
+        """
+        qs, backwards, has_cursor = self.page_query(after, before)
+        return self.make_page(list(qs), backwards, has_cursor)
+
+    async def apage(self, after=None, before=None):
+        """
+        Асинхронный вариант page(): строки страницы читаются через асинхронный итератор.
+        """
+        qs, backwards, has_cursor = self.page_query(after, before)
+        return self.make_page([obj async for obj in qs], backwards, has_cursor)
+
+    def page_query(self, after, before):
+        """
+        Запрос строк страницы (на одну строку больше размера страницы, чтобы узнать,
+        есть ли следующая), признак обратного направления и признак наличия курсора.
+        """
+        before_key = decode_cursor(before)
+        if before_key:
+            created_at, pk = before_key
+            qs = (
+                self.queryset
+                .filter(created_at__gte=created_at)
+                .filter(Q(created_at__gt=created_at) | Q(id__gt=pk))
+                .order_by("created_at", "id")[:self.per_page + 1]
+            )
+            return qs, True, True
+
+        qs = self.queryset
+        after_key = decode_cursor(after)
+        if after_key:
+            created_at, pk = after_key
+            qs = (
+                qs.filter(created_at__lte=created_at)
+                .filter(Q(created_at__lt=created_at) | Q(id__lt=pk))
+            )
+        return qs[:self.per_page + 1], False, bool(after_key)
+
+    def make_page(self, rows, backwards, has_cursor):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            return KeysetPage(rows[::-1], self, has_previous=has_more, has_next=True)
+        return KeysetPage(rows, self, has_previous=has_cursor, has_next=has_more)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Постраничная пагинация, в которой число записей берётся из оценки estimate() —
+    функции без аргументов, возвращающей число или None, — вместо COUNT(*) по выборке.
+    Без оценки (None) записи считаются обычным COUNT(*).
+    """
+
+    def __init__(self, object_list, per_page, estimate=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.estimate = estimate
+
+    @cached_property
+    def count(self):
+        estimated = self.estimate() if self.estimate else None
+        return super().count if estimated is None else estimated
+
+
+async def apaginate(queryset, per_page, number):
+    """
+    Асинхронный аналог Paginator.page() для OFFSET-пагинации: число записей считается
+    через acount(), строки страницы читаются асинхронным итератором.
+    Номер "last" означает последнюю страницу (как в ListView); неверный номер
+    приводит к InvalidPage, как и у Paginator.
+    """
+    paginator = Paginator(queryset, per_page)
+    paginator.count = await queryset.acount()
+    number = paginator.validate_number(paginator.num_pages if number == "last" else number)
+    bottom = (number - 1) * per_page
+    object_list = [obj async for obj in queryset[bottom:bottom + per_page]]
+    return paginator, Page(object_list, number, paginator)
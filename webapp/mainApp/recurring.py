@@ -0,0 +1,205 @@
+import time
+from calendar import monthrange
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .archive import load_archive_boundary
+from .currency import get_rates, reporting_currency
+from .dictionaries import get_dictionaries
+from .filters import day_start
+from .models import CashFlow, RecurringRule
+from .page_cache import invalidate_cashflows
+from .rollups import rebuild_rollups
+
+
+def add_months(day, months, anchor_day):
+    """
+    Дата через months месяцев после day с числом anchor_day (или последним днём
+    месяца, если такого числа в нём нет): 31 января + 1 месяц = 28 или 29 февраля.
+    """
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    month += 1
+    return date(year, month, min(anchor_day, monthrange(year, month)[1]))
+
+
+def _months_step(rule):
+    return rule.interval * (12 if rule.frequency == RecurringRule.YEARLY else 1)
+
+
+def occurrence_date(rule, index):
+    """
+    Дата повторения номер index (с нуля). Каждая дата считается от start_date, а не от
+    предыдущей: перенос 31-го на конец короткого месяца не сдвигает следующие повторения.
+    """
+    if rule.frequency == RecurringRule.DAILY:
+        return rule.start_date + timedelta(days=index * rule.interval)
+    if rule.frequency == RecurringRule.WEEKLY:
+        return rule.start_date + timedelta(weeks=index * rule.interval)
+    return add_months(rule.start_date, index * _months_step(rule), rule.start_date.day)
+
+
+def occurrence_index(rule, day):
+    """
+    Номер повторения, приходящегося на day (day — одна из дат повторения правила).
+    """
+    if rule.frequency == RecurringRule.DAILY:
+        return (day - rule.start_date).days // rule.interval
+    if rule.frequency == RecurringRule.WEEKLY:
+        return (day - rule.start_date).days // (7 * rule.interval)
+    months = (day.year - rule.start_date.year) * 12 + day.month - rule.start_date.month
+    return months // _months_step(rule)
+
+
+def due_dates(rule, until):
+    """
+    Ещё не созданные даты повторения правила до until включительно (и не позже end_date)
+    и дата повторения, следующего за ними.
+    """
+    last = min(until, rule.end_date) if rule.end_date else until
+    index = occurrence_index(rule, rule.next_date)
+    dates = []
+    day = occurrence_date(rule, index)
+    while day <= last:
+        dates.append(day)
+        index += 1
+        day = occurrence_date(rule, index)
+    return dates, day
+
+
+def due_rules(until):
+    """
+    Активные правила, у которых есть повторения до until (и не позже даты окончания).
+    """
+    return RecurringRule.objects.filter(
+        Q(end_date__isnull=True) | Q(next_date__lte=F("end_date")),
+        active=True,
+        next_date__lte=until,
+    )
+
+
+class RecurringResult:
+    """
+    Итог запуска: правил обработано, повторений записано (пары, уже бывшие в таблице,
+    пропускаются при вставке), повторений в закрытом периоде (не созданы), пары
+    (правило, дата), на которых правило остановлено из-за отсутствия курса, и диапазон дат.
+    """
+
+    def __init__(self):
+        self.rules = 0
+        self.created = 0
+        self.closed = 0
+        self.missing_rates = []
+        self.date_from = None
+        self.date_to = None
+        self.elapsed = 0.0
+
+
+def skip_existing(cashflows, batch_size):
+    """
+    Записи, пары (правило, дата повторения) которых ещё нет в оперативной таблице:
+    существующие пары читаются по уникальному индексу, один запрос на batch_size правил.
+    """
+    if not cashflows:
+        return cashflows
+    rule_ids = sorted({cashflow.recurring_rule_id for cashflow in cashflows})
+    days = [cashflow.occurrence_date for cashflow in cashflows]
+    existing = set()
+    for start in range(0, len(rule_ids), batch_size):
+        existing.update(
+            CashFlow.objects
+            .filter(
+                recurring_rule_id__in=rule_ids[start:start + batch_size],
+                occurrence_date__range=(min(days), max(days)),
+            )
+            .values_list("recurring_rule_id", "occurrence_date")
+        )
+    if not existing:
+        return cashflows
+    return [
+        cashflow for cashflow in cashflows
+        if (cashflow.recurring_rule_id, cashflow.occurrence_date) not in existing
+    ]
+
+
+def generate_recurring(until=None, batch_size=5000):
+    """
+    Создаёт записи ДДС по всем регулярным правилам на даты повторения до until
+    (по умолчанию сегодня) и пересобирает агрегаты за затронутые даты.
+
+    Правила к запуску выбираются по next_date одним запросом и блокируются до конца
+    транзакции (SELECT ... FOR UPDATE; на SQLite запись и так сериализована транзакцией
+    IMMEDIATE), поэтому параллельный запуск на другом узле ждёт и затем видит уже
+    сдвинутые next_date. Все записи вставляются одним bulk_create, а next_date правил
+    обновляется одним UPDATE на каждую новую дату. Уже созданные пары (правило, дата) —
+    после ручной правки next_date — отбрасываются до вставки (skip_existing), поэтому
+    result.created равно числу вставленных записей; ограничение уникальности остаётся страховкой.
+
+    Повторения раньше границы архива не создаются (период закрыт). Для правила в другой
+    валюте создаются только повторения, на даты которых есть курс: на первой дате без
+    курса правило останавливается до загрузки курсов.
+    """
+    started = time.perf_counter()
+    until = until or timezone.localdate()
+    result = RecurringResult()
+    boundary = load_archive_boundary()
+    taxonomy_paths = {obj.pk: str(obj) for obj in get_dictionaries().subcategories}
+    reporting = reporting_currency()
+
+    with transaction.atomic():
+        rules = list(due_rules(until).select_for_update().order_by("id"))
+        result.rules = len(rules)
+        schedule = [(rule, *due_dates(rule, until)) for rule in rules]
+        rates = get_rates(
+            (rule.currency, day) for rule, dates, _ in schedule if rule.currency != reporting for day in dates
+        )
+
+        cashflows = []
+        # Новые next_date: дата → id правил. Различных дат немного, поэтому правила
+        # сдвигаются одним UPDATE на дату, а не выражением CASE по каждому правилу
+        advanced = {}
+        for rule, dates, following in schedule:
+            for day in dates:
+                if rule.currency != reporting and rates[(rule.currency, day)] is None:
+                    result.missing_rates.append((rule, day))
+                    following = day
+                    break
+                if boundary and day < boundary:
+                    result.closed += 1
+                    continue
+                cashflows.append(CashFlow(
+                    created_at=day_start(day),
+                    status_id=rule.status_id,
+                    type_id=rule.type_id,
+                    category_id=rule.category_id,
+                    subcategory_id=rule.subcategory_id,
+                    amount=rule.amount,
+                    currency=rule.currency,
+                    comment=rule.comment,
+                    taxonomy_path=taxonomy_paths.get(rule.subcategory_id, ""),
+                    recurring_rule_id=rule.pk,
+                    occurrence_date=day,
+                ))
+            if following != rule.next_date:
+                advanced.setdefault(following, []).append(rule.pk)
+
+        cashflows = skip_existing(cashflows, batch_size)
+        if cashflows:
+            # В порядке дат вставки идут в соседние страницы индексов по дате, а не вразброс
+            cashflows.sort(key=lambda cashflow: (cashflow.occurrence_date, cashflow.subcategory_id))
+            CashFlow.objects.bulk_create(cashflows, batch_size=batch_size, ignore_conflicts=True)
+            result.created = len(cashflows)
+            result.date_from = cashflows[0].occurrence_date
+            result.date_to = cashflows[-1].occurrence_date
+        for following, rule_ids in advanced.items():
+            for start in range(0, len(rule_ids), batch_size):
+                RecurringRule.objects.filter(pk__in=rule_ids[start:start + batch_size]).update(next_date=following)
+        if cashflows:
+            # bulk_create обходит сигналы: агрегаты пересобираются за даты созданных записей
+            rebuild_rollups(result.date_from, result.date_to, batch_size=batch_size)
+            invalidate_cashflows()
+
+    result.elapsed = time.perf_counter() - started
+    return result
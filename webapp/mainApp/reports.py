@@ -0,0 +1,125 @@
+from django.db.models import F, Sum
+
+from .dictionaries import aget_dictionaries, get_dictionaries
+from .filters import filter_by_dictionaries, parse_date_param
+from .models import CashFlowRollup, CashFlowMonthlyRollup
+from .rollups import edge_month_expression, split_by_months
+
+
+def rollup_sources(params):
+    """
+    Возвращает QuerySet'ы агрегатов, которые вместе покрывают период фильтра:
+    месячные агрегаты для целых месяцев и дневные — для неполных месяцев по краям.
+    Каждый QuerySet аннотирован полем period — первым числом месяца.
+    """
+    date_from = parse_date_param(params.get("date_from"))
+    date_to = parse_date_param(params.get("date_to"))
+    months, days = split_by_months(date_from, date_to)
+    sources = []
+    if months is not None:
+        sources.append(
+            filter_by_dictionaries(CashFlowMonthlyRollup.objects.filter(months), params)
+            .annotate(period=F("month"))
+        )
+    if days is not None:
+        sources.append(
+            filter_by_dictionaries(CashFlowRollup.objects.filter(days), params)
+            .annotate(period=edge_month_expression(date_from, date_to))
+        )
+    return sources
+
+
+# Группировки панели аналитики: ключ контекста → поля GROUP BY
+DASHBOARD_GROUPINGS = {
+    "type_totals": ("type_id",),
+    "category_totals": ("type_id", "category_id"),
+    "monthly_totals": ("period", "type_id"),
+}
+
+# Порядок строк в каждой группировке
+DASHBOARD_ORDERING = {
+    "type_totals": lambda row: row["type__name"],
+    "category_totals": lambda row: (row["type__name"], -row["total"]),
+    "monthly_totals": lambda row: (row["period"], row["type__name"]),
+}
+
+
+def grouped_query(qs, fields):
+    return qs.values(*fields).annotate(total=Sum("total"), count=Sum("count")).order_by()
+
+
+def merge_row(merged, row, fields):
+    key = tuple(row[field] for field in fields)
+    if key in merged:
+        merged[key]["total"] += row["total"]
+        merged[key]["count"] += row["count"]
+    else:
+        merged[key] = row
+
+
+def grouped_totals(sources, fields):
+    """
+    Группирует агрегаты по полям fields (GROUP BY в базе для каждого источника)
+    и складывает уже сгруппированные строки источников между собой.
+    """
+    merged = {}
+    for qs in sources:
+        for row in grouped_query(qs, fields):
+            merge_row(merged, row, fields)
+    return list(merged.values())
+
+
+async def agrouped_totals(sources, fields):
+    """
+    Асинхронный вариант grouped_totals() на асинхронном итераторе QuerySet.
+    """
+    merged = {}
+    for qs in sources:
+        async for row in grouped_query(qs, fields):
+            merge_row(merged, row, fields)
+    return list(merged.values())
+
+
+def with_names(rows, names):
+    """
+    Подставляет в сгруппированные строки имена типа и категории из снимка справочников
+    (под теми же ключами type__name/category__name, что дал бы JOIN).
+    """
+    for row in rows:
+        row["type__name"] = names["type"].get(row["type_id"], "")
+        if "category_id" in row:
+            row["category__name"] = names["category"].get(row["category_id"], "")
+    return rows
+
+
+def summarize(groups, names):
+    """
+    Подставляет имена и сортирует строки каждой группировки панели аналитики.
+    """
+    return {
+        key: sorted(with_names(rows, names), key=DASHBOARD_ORDERING[key])
+        for key, rows in groups.items()
+    }
+
+
+def dashboard_summary(params):
+    """
+    Сводка для панели аналитики по тем же фильтрам, что и список записей.
+
+    Все числа считаются в базе группировкой по предагрегированным таблицам — не больше
+    трёх запросов на каждый источник (месячные и дневные агрегаты) независимо от объёма
+    таблицы записей: итоги по типам, разбивка по категориям и помесячный ряд.
+    Группировка идёт только по id, имена берутся из снимка справочников.
+    """
+    sources = rollup_sources(params)
+    groups = {key: grouped_totals(sources, fields) for key, fields in DASHBOARD_GROUPINGS.items()}
+    return summarize(groups, get_dictionaries().names())
+
+
+async def adashboard_summary(params):
+    """
+    Асинхронный вариант dashboard_summary() для ASGI.
+    """
+    sources = rollup_sources(params)
+    groups = {key: await agrouped_totals(sources, fields) for key, fields in DASHBOARD_GROUPINGS.items()}
+    return summarize(groups, (await aget_dictionaries()).names())
@@ -0,0 +1,253 @@
+from datetime import timedelta
+
+from itertools import chain, islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DateField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .currency import convert_rows, reporting_currency
+from .filters import date_range_bounds
+from .models import CashFlow, CashFlowArchive, CashFlowRollup, CashFlowMonthlyRollup
+
+
+# Измерения, по которым агрегируются суммы (помимо даты)
+ROLLUP_DIMENSIONS = ("status_id", "type_id", "category_id", "subcategory_id")
+
+
+def rollup_key(date, status_id, type_id, category_id, subcategory_id):
+    """
+    Ключ строки дневного агрегата в виде словаря для filter()/create().
+    """
+    return {
+        "date": date,
+        "status_id": status_id,
+        "type_id": type_id,
+        "category_id": category_id,
+        "subcategory_id": subcategory_id,
+    }
+
+
+def monthly_key(key):
+    """
+    Ключ строки месячного агрегата, соответствующий ключу дневного.
+    """
+    monthly = dict(key)
+    monthly["month"] = monthly.pop("date").replace(day=1)
+    return monthly
+
+
+def cashflow_rollup_key(cashflow):
+    """
+    Ключ агрегата для записи ДДС. Дата берётся в текущем часовом поясе,
+    как и в TruncDate при полной пересборке.
+    """
+    return rollup_key(
+        timezone.localdate(cashflow.created_at),
+        *(getattr(cashflow, field) for field in ROLLUP_DIMENSIONS),
+    )
+
+
+def _apply_row_delta(model, key, amount, count):
+    updated = model.objects.filter(**key).update(
+        total=F("total") + amount,
+        count=F("count") + count,
+    )
+    if not updated:
+        try:
+            with transaction.atomic():
+                model.objects.create(total=amount, count=count, **key)
+        except IntegrityError:
+            # Строку успел создать параллельный запрос — повторяем обновление
+            model.objects.filter(**key).update(
+                total=F("total") + amount,
+                count=F("count") + count,
+            )
+    model.objects.filter(count__lte=0, **key).delete()
+
+
+def apply_delta(key, amount, count):
+    """
+    Прибавляет amount и count к дневной и месячной строкам агрегата с ключом key,
+    создавая их при необходимости. Строки, в которых не осталось записей, удаляются.
+    """
+    with transaction.atomic():
+        _apply_row_delta(CashFlowRollup, key, amount, count)
+        _apply_row_delta(CashFlowMonthlyRollup, monthly_key(key), amount, count)
+
+
+def _next_month(day):
+    """
+    Первое число месяца, следующего за месяцем day.
+    """
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _bulk_insert(model, groups, make_key, batch_size):
+    created = 0
+    batch = []
+    for group in groups:
+        batch.append(model(total=group["total"], count=group["count"], **make_key(group)))
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def rebuild_rollups(date_from=None, date_to=None, batch_size=5000):
+    """
+    Полностью пересобирает агрегаты за диапазон дат [date_from, date_to]
+    (или за всё время) группировкой по таблице записей и архиву и пакетными вставками.
+    Суммы пересчитываются в валюту отчётности по загруженным курсам.
+    Месячные агрегаты пересчитываются за все месяцы, которые задевает диапазон.
+    Возвращает число созданных строк дневного агрегата.
+    """
+    # Месячные строки пересобираются целиком, поэтому диапазон расширяется до границ месяцев
+    month_from = date_from.replace(day=1) if date_from else None
+    month_to = _next_month(date_to) - timedelta(days=1) if date_to else None
+
+    with transaction.atomic():
+        daily = _rebuild(CashFlowRollup, "date", TruncDate, date_from, date_to, batch_size)
+        _rebuild(
+            CashFlowMonthlyRollup, "month",
+            lambda field: TruncMonth(field, output_field=DateField()),
+            month_from, month_to, batch_size,
+        )
+    return daily
+
+
+def _foreign_groups(ledger, trunc, batch_size):
+    """
+    Суммы записей в других валютах по группам агрегата, в валюте отчётности.
+
+    Каждая запись пересчитывается по курсу своей даты с округлением до копеек — так же,
+    как её учитывают сигналы, поэтому пересобранные агрегаты совпадают с поддерживаемыми
+    инкрементально. Записи читаются столбцами пакетами по batch_size, курсы пакета —
+    одним обращением к convert_rows().
+    """
+    rows = (
+        ledger.exclude(currency=reporting_currency())
+        .annotate(period=trunc("created_at"), day=TruncDate("created_at"))
+        .values_list("period", *ROLLUP_DIMENSIONS, "amount", "currency", "day")
+        .order_by()
+        .iterator(chunk_size=batch_size)
+    )
+    groups = {}
+    while batch := list(islice(rows, batch_size)):
+        converted = convert_rows([row[-3:] for row in batch])
+        for row, amount in zip(batch, converted):
+            group = groups.setdefault(row[:-3], [0, 0])
+            group[0] += amount
+            group[1] += 1
+    return groups
+
+
+def _rebuild(model, period_field, trunc, date_from, date_to, batch_size):
+    start, end = date_range_bounds(date_from, date_to)
+    rollups = model.objects.all()
+    if date_from:
+        rollups = rollups.filter(**{f"{period_field}__gte": date_from})
+    if date_to:
+        rollups = rollups.filter(**{f"{period_field}__lte": date_to})
+
+    # Архив содержит целые месяцы до границы, оперативная таблица — месяцы с границы,
+    # поэтому группы двух таблиц не пересекаются ни по дням, ни по месяцам
+    sources = []
+    for ledger_model in (CashFlow, CashFlowArchive):
+        ledger = ledger_model.objects.all()
+        if start:
+            ledger = ledger.filter(created_at__gte=start)
+        if end:
+            ledger = ledger.filter(created_at__lt=end)
+        # Записи в валюте отчётности суммируются базой, остальные пересчитываются по курсам
+        foreign = _foreign_groups(ledger, trunc, batch_size)
+        sources.append(_merge_groups(
+            ledger.filter(currency=reporting_currency())
+            .annotate(period=trunc("created_at"))
+            .values("period", *ROLLUP_DIMENSIONS)
+            .annotate(total=Sum("amount"), count=Count("id"))
+            .order_by()
+            .iterator(chunk_size=batch_size),
+            foreign,
+        ))
+    rollups.delete()
+
+    def make_key(group):
+        key = {field: group[field] for field in ROLLUP_DIMENSIONS}
+        key[period_field] = group["period"]
+        return key
+
+    return _bulk_insert(model, chain(*sources), make_key, batch_size)
+
+
+def _merge_groups(groups, foreign):
+    """
+    Добавляет к группам, посчитанным базой, суммы тех же групп в других валютах;
+    группы, в которых есть только записи в других валютах, идут следом.
+    """
+    fields = ("period", *ROLLUP_DIMENSIONS)
+    for group in groups:
+        extra = foreign.pop(tuple(group[field] for field in fields), None)
+        if extra:
+            group["total"] += extra[0]
+            group["count"] += extra[1]
+        yield group
+    for key, (total, count) in foreign.items():
+        yield {**dict(zip(fields, key)), "total": total, "count": count}
+
+
+def split_by_months(date_from, date_to):
+    """
+    Делит включительный диапазон дат (границы могут быть None) на целые месяцы и
+    неполные месяцы по краям.
+
+    Возвращает пару (months, days): months — условие Q для месячных агрегатов
+    (None, если целых месяцев в диапазоне нет), days — условие Q для дневных
+    агрегатов (None, если неполных месяцев нет).
+    """
+    # [first_month, end_month) — полуоткрытый диапазон целых месяцев
+    first_month = None
+    if date_from:
+        first_month = date_from if date_from.day == 1 else _next_month(date_from)
+    end_month = None
+    if date_to:
+        next_day = date_to + timedelta(days=1)
+        end_month = next_day if next_day.day == 1 else date_to.replace(day=1)
+
+    if first_month and end_month and first_month >= end_month:
+        return None, Q(date__gte=date_from, date__lte=date_to)
+
+    months = Q()
+    days = Q()
+    if first_month:
+        months &= Q(month__gte=first_month)
+        if first_month != date_from:
+            days |= Q(date__gte=date_from, date__lt=first_month)
+    if end_month:
+        months &= Q(month__lt=end_month)
+        if end_month != date_to + timedelta(days=1):
+            days |= Q(date__gte=end_month, date__lte=date_to)
+    return months, (days or None)
+
+
+def edge_month_expression(date_from, date_to):
+    """
+    Выражение «первое число месяца» для дневных агрегатов из split_by_months.
+
+    Неполные месяцы — это не больше двух известных заранее месяцев (первый и последний
+    месяц диапазона), поэтому вместо TruncMonth по каждой строке хватает CASE с константами.
+    """
+    head = date_from.replace(day=1) if date_from else None
+    tail = date_to.replace(day=1) if date_to else None
+    if head is None or tail is None or head == tail:
+        return Value(head or tail, output_field=DateField())
+    return Case(
+        When(date__lt=_next_month(head), then=Value(head)),
+        default=Value(tail),
+        output_field=DateField(),
+    )
@@ -0,0 +1,151 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+
+# Параметры GET-запроса: строка поиска по комментариям и порядок результатов
+SEARCH_PARAM = "q"
+ORDER_PARAM = "order"
+# ?order=relevance — по убыванию релевантности (только постраничная пагинация),
+# иначе — как обычный список, по убыванию даты
+ORDER_RELEVANCE = "relevance"
+
+# Больше слов в запросе не учитывается: каждое слово — отдельное условие индекса
+MAX_SEARCH_TERMS = 8
+
+# Полнотекстовый индекс комментариев: таблица FTS5 для SQLite, индекс GIN для PostgreSQL.
+# Индекс есть у оперативной таблицы записей и у архива закрытых периодов (см. archive.py).
+CASHFLOW_TABLE = "mainApp_cashflow"
+ARCHIVE_TABLE = "mainApp_cashflowarchive"
+GIN_INDEXES = {
+    CASHFLOW_TABLE: "cf_comment_search_idx",
+    ARCHIVE_TABLE: "cfa_comment_search_idx",
+}
+# Конфигурация без стемминга и стоп-слов: комментарии на разных языках, поиск по префиксам
+PG_SEARCH_CONFIG = "simple"
+
+
+def fts_table(table):
+    return f"{table}_fts"
+
+
+def pg_vector(table):
+    return f"""to_tsvector('{PG_SEARCH_CONFIG}', COALESCE("{table}"."comment", ''))"""
+
+
+def sqlite_install(table):
+    fts = fts_table(table)
+    return [
+        # Внешнее содержимое (content=): текст хранится только в самой таблице записей,
+        # FTS5 хранит лишь инвертированный индекс
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS "{fts}" USING fts5(
+            comment, content="{table}", content_rowid="id", tokenize="unicode61 remove_diacritics 2"
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS "{fts}_ai" AFTER INSERT ON "{table}" BEGIN
+            INSERT INTO "{fts}"(rowid, comment) VALUES (new.id, new.comment);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS "{fts}_ad" AFTER DELETE ON "{table}" BEGIN
+            INSERT INTO "{fts}"("{fts}", rowid, comment) VALUES ('delete', old.id, old.comment);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS "{fts}_au" AFTER UPDATE OF comment ON "{table}" BEGIN
+            INSERT INTO "{fts}"("{fts}", rowid, comment) VALUES ('delete', old.id, old.comment);
+            INSERT INTO "{fts}"(rowid, comment) VALUES (new.id, new.comment);
+        END""",
+        f"""INSERT INTO "{fts}"("{fts}") VALUES ('rebuild')""",
+        # Статистика индексов: без неё планировщик при поиске с ранжированием и фильтром
+        # по статусу обходит весь индекс статуса вместо того, чтобы начать с совпадений FTS5
+        f'ANALYZE "{table}"',
+    ]
+
+
+def sqlite_drop(table):
+    fts = fts_table(table)
+    return [
+        f'DROP TRIGGER IF EXISTS "{fts}_ai"',
+        f'DROP TRIGGER IF EXISTS "{fts}_ad"',
+        f'DROP TRIGGER IF EXISTS "{fts}_au"',
+        f'DROP TABLE IF EXISTS "{fts}"',
+    ]
+
+
+def postgresql_install(table):
+    return [f'CREATE INDEX IF NOT EXISTS "{GIN_INDEXES[table]}" ON "{table}" USING gin ({pg_vector(table)})']
+
+
+def postgresql_drop(table):
+    return [f'DROP INDEX IF EXISTS "{GIN_INDEXES[table]}"']
+
+
+def install_search_index(schema_editor, table=CASHFLOW_TABLE):
+    """
+    Создаёт полнотекстовый индекс комментариев таблицы table для текущей базы (повторный
+    вызов безопасен). На SQLite индекс поддерживается триггерами и заполняется заново,
+    поэтому вызов нужен и после миграций, пересоздающих таблицу: вместе с таблицей
+    удаляются триггеры.
+    """
+    vendor = schema_editor.connection.vendor
+    statements = {"sqlite": sqlite_install, "postgresql": postgresql_install}.get(vendor)
+    for sql in statements(table) if statements else []:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(schema_editor, table=CASHFLOW_TABLE):
+    vendor = schema_editor.connection.vendor
+    statements = {"sqlite": sqlite_drop, "postgresql": postgresql_drop}.get(vendor)
+    for sql in statements(table) if statements else []:
+        schema_editor.execute(sql)
+
+
+def search_terms(text):
+    """
+    Слова поискового запроса в нижнем регистре. Операторы и кавычки языков запросов
+    FTS5 и tsquery отбрасываются, поэтому пользовательский ввод не может сломать запрос.
+    """
+    return re.findall(r"\w+", (text or "").lower())[:MAX_SEARCH_TERMS]
+
+
+def search_cashflows(qs, text, rank=False):
+    """
+    Записи ДДС, в комментарии которых есть все слова запроса (каждое — как префикс слова).
+    При rank=True добавляется поле search_rank: чем меньше, тем релевантнее
+    (bm25 в SQLite, ts_rank со знаком минус в PostgreSQL).
+
+    Поиск идёт по полнотекстовому индексу и сочетается с любыми другими фильтрами QuerySet.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return qs
+    # Оперативная таблица или архив: у каждой свой индекс
+    table = qs.model._meta.db_table
+    fts = fts_table(table)
+    vendor = connection.vendor
+    if vendor == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        if rank:
+            # rank вычисляется FTS5 при обходе совпадений, поэтому нужно соединение с
+            # виртуальной таблицей — через ORM оно не выражается
+            return qs.extra(
+                tables=[fts],
+                where=[f'"{fts}".rowid = "{table}"."id"', f'"{fts}" MATCH %s'],
+                params=[match],
+                select={"search_rank": f'"{fts}".rank'},
+            )
+        # Подзапрос id IN (...) вычисляется один раз, записи читаются по первичному ключу
+        # при любых других условиях (соединение планировщик мог бы начать с индекса статуса)
+        return qs.filter(id__in=RawSQL(f'SELECT rowid FROM "{fts}" WHERE "{fts}" MATCH %s', [match]))
+    if vendor == "postgresql":
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        qs = qs.filter(RawSQL(
+            f"{pg_vector(table)} @@ to_tsquery('{PG_SEARCH_CONFIG}', %s)", [tsquery], output_field=BooleanField()
+        ))
+        if rank:
+            qs = qs.annotate(search_rank=RawSQL(
+                f"-ts_rank({pg_vector(table)}, to_tsquery('{PG_SEARCH_CONFIG}', %s))", [tsquery], output_field=FloatField()
+            ))
+        return qs
+    # Другие базы: без индекса, подстрока каждого слова
+    for term in terms:
+        qs = qs.filter(comment__icontains=term)
+    return qs.annotate(search_rank=Value(0.0)) if rank else qs
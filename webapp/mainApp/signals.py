@@ -0,0 +1,107 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .currency import convert_amount
+from .dictionaries import DICTIONARY_MODELS, invalidate_dictionaries
+from .metrics import install_sql_recorder
+from .page_cache import invalidate_cashflows
+from .models import CashFlow
+from .rollups import apply_delta, cashflow_rollup_key
+from .taxonomy import TAXONOMY_FIELDS, affected_subcategories, cashflow_taxonomy_path, sync_taxonomy_paths
+
+
+@receiver(pre_save, sender=CashFlow)
+def remember_previous_cashflow(sender, instance, **kwargs):
+    """
+    Перед изменением существующей записи запоминает её прежний ключ агрегата и сумму
+    в валюте отчётности, чтобы после сохранения вычесть их из старой строки агрегата.
+    """
+    instance._rollup_previous = None
+    if instance.pk is None:
+        return
+    previous = CashFlow.objects.filter(pk=instance.pk).only(
+        "created_at", "status", "type", "category", "subcategory", "amount", "currency"
+    ).first()
+    if previous is not None:
+        key = cashflow_rollup_key(previous)
+        instance._rollup_previous = (key, convert_amount(previous.amount, previous.currency, key["date"]))
+
+
+@receiver(pre_save, sender=CashFlow)
+def fill_taxonomy_path(sender, instance, **kwargs):
+    instance.taxonomy_path = cashflow_taxonomy_path(instance)
+
+
+def cashflow_amount(instance):
+    # Сумма может быть задана строкой или числом — приводим к Decimal так же, как поле модели
+    return CashFlow._meta.get_field("amount").to_python(instance.amount)
+
+
+def cashflow_rollup_delta(instance):
+    """
+    Ключ агрегата записи и её сумма в валюте отчётности (курс берётся из кэша курсов).
+    """
+    key = cashflow_rollup_key(instance)
+    return key, convert_amount(cashflow_amount(instance), instance.currency, key["date"])
+
+
+@receiver(post_save, sender=CashFlow)
+def update_rollup_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, "_rollup_previous", None)
+    if previous is not None:
+        key, amount = previous
+        apply_delta(key, -amount, -1)
+    key, amount = cashflow_rollup_delta(instance)
+    apply_delta(key, amount, 1)
+    invalidate_cashflows()
+
+
+@receiver(post_delete, sender=CashFlow)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    key, amount = cashflow_rollup_delta(instance)
+    apply_delta(key, -amount, -1)
+    invalidate_cashflows()
+
+
+def invalidate_dictionaries_on_change(sender, **kwargs):
+    """
+    Любое сохранение или удаление справочника (в том числе каскадное и из админки)
+    сбрасывает кэшированный снимок справочников.
+    """
+    invalidate_dictionaries()
+
+
+for dictionary_model in DICTIONARY_MODELS.values():
+    post_save.connect(invalidate_dictionaries_on_change, sender=dictionary_model)
+    post_delete.connect(invalidate_dictionaries_on_change, sender=dictionary_model)
+
+
+def remember_previous_taxonomy(sender, instance, **kwargs):
+    """
+    Перед изменением типа, категории или подкатегории запоминает, меняются ли поля,
+    из которых складывается полное название подкатегории (имя и родитель).
+    """
+    instance._taxonomy_changed = False
+    if instance.pk is None:
+        return
+    fields = TAXONOMY_FIELDS[sender]
+    previous = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+    instance._taxonomy_changed = previous is not None and previous != tuple(getattr(instance, f) for f in fields)
+
+
+def sync_taxonomy_on_rename(sender, instance, **kwargs):
+    """
+    После переименования (или переноса) справочника обновляет taxonomy_path записей ДДС.
+    """
+    if getattr(instance, "_taxonomy_changed", False):
+        sync_taxonomy_paths(affected_subcategories(instance))
+
+
+for taxonomy_model in TAXONOMY_FIELDS:
+    pre_save.connect(remember_previous_taxonomy, sender=taxonomy_model)
+    post_save.connect(sync_taxonomy_on_rename, sender=taxonomy_model)
+
+
+# Учёт SQL-запросов для PerformanceMiddleware на каждом новом соединении с базой
+connection_created.connect(install_sql_recorder)
@@ -0,0 +1,148 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.checks import Tags, run_checks
+from django.core.signals import request_finished, request_started
+from django.db import DatabaseError, connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+from django.urls import get_resolver
+
+from .dictionaries import get_dictionaries
+from .forms import CashFlowForm
+
+
+logger = logging.getLogger("mainApp.startup")
+
+# Замеры холодного старта этого процесса (см. worker_started), в миллисекундах
+startup_report = {
+    "import_ms": None,
+    "warmup_ms": None,
+    "templates": 0,
+    "first_request_ms": None,
+}
+
+
+def project_template_dirs():
+    """
+    Каталоги шаблонов проекта: DIRS движков и templates/ приложений внутри BASE_DIR
+    (шаблоны сторонних приложений, например админки, прогреваются при первом обращении).
+    """
+    dirs = []
+    for engine in engines.all():
+        dirs.extend(getattr(engine, "dirs", []))
+    dirs.extend(get_app_template_dirs("templates"))
+    base_dir = str(settings.BASE_DIR)
+    return [str(directory) for directory in dirs if str(directory).startswith(base_dir)]
+
+
+def template_names():
+    """
+    Имена всех шаблонов проекта относительно их каталогов, например "cashflow/cashflow_list.html".
+    """
+    names = set()
+    for directory in project_template_dirs():
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                if filename.endswith(".html"):
+                    names.add(os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, "/"))
+    return sorted(names)
+
+
+def compile_templates():
+    """
+    Компилирует все шаблоны проекта во всех движках. С кэширующим загрузчиком
+    скомпилированные шаблоны остаются в памяти процесса и запросы их уже не разбирают.
+    Возвращает список (имя шаблона, исключение) для шаблонов, которые не компилируются.
+    """
+    failures = []
+    for name in template_names():
+        for engine in engines.all():
+            try:
+                engine.get_template(name)
+            except (TemplateSyntaxError, TemplateDoesNotExist) as exc:
+                failures.append((name, exc))
+    return failures
+
+
+def warm_up():
+    """
+    Прогрев процесса до первого запроса: проверки шаблонов (system checks, в том числе
+    check_templates_compile, которая заодно заполняет кэш скомпилированных шаблонов),
+    импорт URLconf, загрузка снимка справочников и шаблонов виджетов форм.
+    Ошибки пишутся в лог и не мешают запуску.
+    """
+    started = time.perf_counter()
+    for message in run_checks(tags=[Tags.templates]):
+        if message.is_serious():
+            logger.error("Проверка при запуске: %s", message)
+        else:
+            logger.warning("Проверка при запуске: %s", message)
+    startup_report["templates"] = len(template_names())
+    # Импорт URLconf (а с ним представлений и админки) и построение таблицы reverse()
+    get_resolver().reverse_dict
+    try:
+        get_dictionaries()
+        # Шаблоны виджетов форм компилируются отдельным движком рендерера форм
+        str(CashFlowForm())
+    except DatabaseError as exc:
+        logger.warning("Снимок справочников не загружен при запуске: %s", exc)
+    finally:
+        # Соединение, открытое до fork() (gunicorn --preload), нельзя делить между процессами
+        connections.close_all()
+    startup_report["warmup_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+
+class FirstRequestTimer:
+    """
+    Замеряет время первого запроса процесса по сигналам request_started/request_finished
+    и отключается после него. При нескольких одновременных первых запросах берётся
+    время от начала самого раннего до окончания первого завершившегося.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = None
+
+    def connect(self):
+        request_started.connect(self.on_started, dispatch_uid="mainApp.startup.first_request_started")
+        request_finished.connect(self.on_finished, dispatch_uid="mainApp.startup.first_request_finished")
+
+    def disconnect(self):
+        request_started.disconnect(dispatch_uid="mainApp.startup.first_request_started")
+        request_finished.disconnect(dispatch_uid="mainApp.startup.first_request_finished")
+
+    def on_started(self, **kwargs):
+        with self.lock:
+            if self.started is None:
+                self.started = time.perf_counter()
+
+    def on_finished(self, **kwargs):
+        with self.lock:
+            if self.started is None or startup_report["first_request_ms"] is not None:
+                return
+            startup_report["first_request_ms"] = round((time.perf_counter() - self.started) * 1000, 3)
+        self.disconnect()
+        logger.info("Первый запрос процесса %s: %s мс", os.getpid(), startup_report["first_request_ms"])
+
+
+first_request_timer = FirstRequestTimer()
+
+
+def worker_started(started):
+    """
+    Вызывается из main/wsgi.py и main/asgi.py после создания приложения; started —
+    perf_counter() в начале модуля, то есть до импорта Django и проекта.
+    При STARTUP_WARMUP процесс прогревается, затем замеряется первый запрос.
+    """
+    startup_report["import_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    if getattr(settings, "STARTUP_WARMUP", False):
+        warm_up()
+    first_request_timer.connect()
+    logger.info(
+        "Процесс %s готов: импорт %s мс, прогрев %s мс (шаблонов: %s)",
+        os.getpid(), startup_report["import_ms"], startup_report["warmup_ms"], startup_report["templates"],
+    )
@@ -0,0 +1,182 @@
+import math
+import random
+import time
+from datetime import datetime, time as day_time, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CashFlow, Category, Status, SubCategory, Type
+
+
+# Слова синтетических комментариев (для полнотекстового поиска нужны повторяющиеся слова)
+COMMENT_WORDS = (
+    "оплата", "аренда", "офис", "поставщик", "счёт", "зарплата", "налог", "возврат",
+    "аванс", "договор", "доставка", "реклама", "услуги", "связь", "банк", "комиссия",
+    "закупка", "ремонт", "транспорт", "премия",
+)
+# Доля записей без комментария
+EMPTY_COMMENT_SHARE = 0.3
+# Суммы: логнормальное распределение (медиана около exp(AMOUNT_MU) рублей) с ограничениями
+AMOUNT_MU = 8.0
+AMOUNT_SIGMA = 1.3
+MIN_AMOUNT = Decimal("1.00")
+MAX_AMOUNT = Decimal("9999999.99")
+# Доля выходных дней, которые остаются (остальные записи переносятся на будни)
+WEEKEND_KEEP_SHARE = 0.3
+
+
+class SyntheticTaxonomy:
+    """
+    Справочники синтетического журнала: статусы с весами и подкатегории с весами
+    по закону Ципфа (несколько популярных подкатегорий и длинный хвост).
+    """
+
+    def __init__(self, statuses, subcategories, rnd):
+        self.statuses = statuses
+        # Основной статус встречается чаще остальных. Веса накопленные: random.choices
+        # с cum_weights не пересчитывает их на каждый выбор
+        self.status_weights = list(accumulate(1.0 / (rank + 1) ** 2 for rank in range(len(statuses))))
+        self.subcategories = list(subcategories)
+        rnd.shuffle(self.subcategories)
+        self.subcategory_weights = list(accumulate(1.0 / (rank + 1) for rank in range(len(self.subcategories))))
+        self.paths = {obj.pk: str(obj) for obj in self.subcategories}
+
+
+def ensure_taxonomy(statuses=3, types=2, categories=10, subcategories=5, prefix="Синт"):
+    """
+    Создаёт (или находит уже созданные с теми же параметрами) справочники синтетического
+    журнала: statuses статусов, types типов, по categories категорий на тип и по
+    subcategories подкатегорий на категорию. Имена детерминированы, поэтому повторный
+    запуск не создаёт дубликатов. Каждый уровень — один bulk_create.
+    Возвращает (список статусов, список подкатегорий с категорией и типом).
+    """
+    def ensure(model, names, parent_field=None, parents=None):
+        existing = {obj.name: obj for obj in model.objects.filter(name__in=names)}
+        missing = [name for name in names if name not in existing]
+        if missing:
+            model.objects.bulk_create([
+                model(name=name, **({parent_field: parents[name]} if parent_field else {}))
+                for name in missing
+            ])
+            existing = {obj.name: obj for obj in model.objects.filter(name__in=names)}
+        return [existing[name] for name in names]
+
+    with transaction.atomic():
+        status_objs = ensure(Status, [f"{prefix} статус {i + 1}" for i in range(statuses)])
+        type_objs = ensure(Type, [f"{prefix} тип {t + 1}" for t in range(types)])
+        category_parents = {
+            f"{prefix} категория {t + 1}.{c + 1}": type_obj.pk
+            for t, type_obj in enumerate(type_objs)
+            for c in range(categories)
+        }
+        category_objs = ensure(Category, list(category_parents), "type_id", category_parents)
+        types_by_id = {obj.pk: obj for obj in type_objs}
+        subcategory_objs = []
+        for category in category_objs:
+            category.type = types_by_id[category.type_id]
+            names = [f"{prefix} подкатегория {s + 1}" for s in range(subcategories)]
+            # Подкатегории уникальны только внутри категории, поэтому ищутся по категории
+            existing = {
+                obj.name: obj for obj in SubCategory.objects.filter(category=category, name__in=names)
+            }
+            missing = [SubCategory(name=name, category=category) for name in names if name not in existing]
+            if missing:
+                SubCategory.objects.bulk_create(missing)
+                existing = {
+                    obj.name: obj for obj in SubCategory.objects.filter(category=category, name__in=names)
+                }
+            for name in names:
+                existing[name].category = category
+                subcategory_objs.append(existing[name])
+    return status_objs, subcategory_objs
+
+
+def synthetic_datetime(rnd, end_day, days):
+    """
+    Момент записи за days дней до end_day включительно: записей тем больше, чем ближе к end (рост
+    оборота), в выходные их меньше, время — рабочий день с пиком около полудня.
+    """
+    while True:
+        offset = int(days * (1 - math.sqrt(rnd.random())))
+        day = end_day - timedelta(days=offset)
+        if day.weekday() < 5 or rnd.random() < WEEKEND_KEEP_SHARE:
+            break
+    hour = min(max(rnd.gauss(13, 3), 0), 23.99)
+    return timezone.make_aware(datetime.combine(day, day_time.min) + timedelta(seconds=int(hour * 3600)))
+
+
+def synthetic_amount(rnd):
+    amount = Decimal(str(round(rnd.lognormvariate(AMOUNT_MU, AMOUNT_SIGMA), 2)))
+    return min(max(amount, MIN_AMOUNT), MAX_AMOUNT)
+
+
+def synthetic_comment(rnd, number):
+    if rnd.random() < EMPTY_COMMENT_SHARE:
+        return None
+    words = rnd.sample(COMMENT_WORDS, rnd.randint(1, 4))
+    return f"{' '.join(words)} №{number}"
+
+
+def generate_cashflows(count, taxonomy, rnd, end=None, days=730, batch_size=10000, on_batch=None):
+    """
+    Генерирует count записей ДДС за days дней до даты end (по умолчанию сегодня) и вставляет
+    их через bulk_create пакетами по batch_size (каждый пакет в своей транзакции).
+    Записи детерминированы генератором rnd и датой end.
+    taxonomy_path заполняется сразу: bulk_create не вызывает сигналы. Агрегаты не
+    пересобираются — это делает вызывающий код (см. команду generate_ledger).
+    on_batch(вставлено всего) вызывается после каждого пакета.
+    Возвращает (число записей, первая дата, последняя дата).
+    """
+    end_day = end or timezone.localdate()
+    first = last = None
+    created = 0
+    while created < count:
+        batch = []
+        for number in range(created, min(created + batch_size, count)):
+            subcategory = rnd.choices(taxonomy.subcategories, cum_weights=taxonomy.subcategory_weights)[0]
+            created_at = synthetic_datetime(rnd, end_day, days)
+            batch.append(CashFlow(
+                created_at=created_at,
+                status=rnd.choices(taxonomy.statuses, cum_weights=taxonomy.status_weights)[0],
+                type_id=subcategory.category.type_id,
+                category_id=subcategory.category_id,
+                subcategory=subcategory,
+                amount=synthetic_amount(rnd),
+                comment=synthetic_comment(rnd, number + 1),
+                taxonomy_path=taxonomy.paths[subcategory.pk],
+            ))
+            first = created_at if first is None else min(first, created_at)
+            last = created_at if last is None else max(last, created_at)
+        with transaction.atomic():
+            CashFlow.objects.bulk_create(batch)
+        created += len(batch)
+        if on_batch:
+            on_batch(created)
+    if first is None:
+        return 0, None, None
+    return created, timezone.localdate(first), timezone.localdate(last)
+
+
+def generate_ledger(rows, seed=42, end=None, days=730, batch_size=10000, on_batch=None, **taxonomy_options):
+    """
+    Детерминированный синтетический журнал: справочники (ensure_taxonomy) и rows записей
+    с генератором random.Random(seed). Возвращает словарь с итогами для отчёта.
+    """
+    started = time.perf_counter()
+    rnd = random.Random(seed)
+    statuses, subcategories = ensure_taxonomy(**taxonomy_options)
+    taxonomy = SyntheticTaxonomy(statuses, subcategories, rnd)
+    created, first, last = generate_cashflows(rows, taxonomy, rnd, end, days, batch_size, on_batch)
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": created,
+        "statuses": len(statuses),
+        "subcategories": len(subcategories),
+        "date_from": first,
+        "date_to": last,
+        "elapsed": elapsed,
+        "rows_per_second": created / elapsed if elapsed else 0.0,
+    }
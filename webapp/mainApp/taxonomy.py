@@ -0,0 +1,57 @@
+from django.db.models import Case, CharField, Value, When
+
+from .dictionaries import get_dictionaries
+from .models import CashFlow, CashFlowArchive, Category, SubCategory, Type
+from .page_cache import invalidate_cashflows
+
+
+# Поля справочников, от которых зависит полное название подкатегории
+TAXONOMY_FIELDS = {
+    Type: ("name",),
+    Category: ("name", "type_id"),
+    SubCategory: ("name", "category_id"),
+}
+
+
+def cashflow_taxonomy_path(cashflow):
+    """
+    Полное название подкатегории записи из снимка справочников (без запросов к базе).
+    Подкатегория, которой ещё нет в снимке, читается из базы.
+    """
+    subcategory = get_dictionaries().get("subcategories", cashflow.subcategory_id)
+    if subcategory is None:
+        subcategory = SubCategory.objects.select_related("category__type").get(pk=cashflow.subcategory_id)
+    return str(subcategory)
+
+
+def affected_subcategories(instance):
+    """
+    QuerySet подкатегорий, полное название которых зависит от справочника instance.
+    """
+    if isinstance(instance, SubCategory):
+        return SubCategory.objects.filter(pk=instance.pk)
+    if isinstance(instance, Category):
+        return SubCategory.objects.filter(category_id=instance.pk)
+    return SubCategory.objects.filter(category__type_id=instance.pk)
+
+
+def sync_taxonomy_paths(subcategories):
+    """
+    Обновляет taxonomy_path записей ДДС указанных подкатегорий (и в архиве) одним UPDATE
+    на таблицу (CASE по id подкатегории) и сбрасывает кэш страниц. Возвращает число
+    обновлённых записей.
+    """
+    paths = {obj.pk: str(obj) for obj in subcategories.select_related("category__type")}
+    if not paths:
+        return 0
+    path = Case(
+        *(When(subcategory_id=pk, then=Value(value)) for pk, value in paths.items()),
+        output_field=CharField(),
+    )
+    updated = sum(
+        model.objects.filter(subcategory_id__in=paths).update(taxonomy_path=path)
+        for model in (CashFlow, CashFlowArchive)
+    )
+    if updated:
+        invalidate_cashflows()
+    return updated
@@ -1,3 +1,2309 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import time
+import zipfile
+from importlib import import_module
+from unittest import mock, skipUnless
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.http import HttpResponse, QueryDict
+from django.test import RequestFactory, TestCase, override_settings
+from django.template import engines
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+
+from . import dictionaries
+from .dictionaries import get_dictionaries
+from .exports import EXPORT_HEADER
+from .filters import filter_cashflows
+from .forms import CashFlowForm, RecurringRuleForm
+from .metrics import registry, sql_fingerprint
+from .page_cache import cache_stats, normalized_query
+from .checks import check_cached_loader, check_templates_compile
+from .startup import FirstRequestTimer, startup_report, template_names, warm_up
+from .middleware import PerformanceMiddleware
+from .dictionary_batch import DictionaryBatchError
+from .imports import encoding_error_line, import_cashflows
+from .pagination import KeysetPaginator, encode_cursor
+from .recurring import generate_recurring, occurrence_date
+from .archive import ARCHIVE_BOUNDARY_KEY, ARCHIVE_BOUNDARY_TIMEOUT, archive_boundary, archive_cashflows
+from .budgets import budget_report, import_budgets
+from .currency import RATES_VERSION, MissingRateError, get_rate, invalidate_rates
+from .versions import bump_version
+from .forecast import build_forecast, get_forecast, numpy_available, np, project
+from .filters import day_start
+from .search import search_cashflows, search_terms
+from .synthetic import ensure_taxonomy, generate_ledger
+from .views import CashFlowListView
+from .models import (
+    Budget, CashFlow, CashFlowArchive, CashFlowMonthlyRollup, CashFlowRollup, ExchangeRate, RecurringRule, Status,
+    Type, Category, SubCategory,
+)
+from .rollups import rebuild_rollups, split_by_months
+
+
+def create_dictionaries():
+    """
+    Создаёт минимальный набор справочников: два статуса, два типа,
+    по две категории на тип и по две подкатегории на категорию.
+    """
+    statuses = [Status.objects.create(name=f"Статус {i}") for i in range(2)]
+    subcategories = []
+    for t in range(2):
+        type_obj = Type.objects.create(name=f"Тип {t}")
+        for c in range(2):
+            category = Category.objects.create(name=f"Категория {t}.{c}", type=type_obj)
+            for s in range(2):
+                subcategories.append(
+                    SubCategory.objects.create(name=f"Подкатегория {t}.{c}.{s}", category=category)
+                )
+    return statuses, subcategories
+
+
+def seed_cashflows(count, statuses, subcategories, batch_size=5000, step=timedelta(minutes=1)):
+    """
+    Массово создаёт count записей ДДС, равномерно распределённых по справочникам
+    и идущих назад во времени с шагом step.
+    """
+    now = timezone.now()
+    batch = []
+    for i in range(count):
+        subcategory = subcategories[i % len(subcategories)]
+        batch.append(CashFlow(
+            created_at=now - step * i,
+            status=statuses[i % len(statuses)],
+            type_id=subcategory.category.type_id,
+            category_id=subcategory.category_id,
+            subcategory=subcategory,
+            amount=Decimal("100.00") + i % 1000,
+            comment=f"Запись {i}",
+        ))
+        if len(batch) >= batch_size:
+            CashFlow.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        CashFlow.objects.bulk_create(batch)
+
+
+@override_settings(PERF_SAMPLE_RATE=0)
+class CacheIsolatedTestCase(TestCase):
+    """
+    Тест с пустым кэшем: откат транзакции предыдущего теста не вызывает сигналов,
+    поэтому закэшированные им страницы и версии данных иначе пережили бы откат.
+    Замер запросов выключен, чтобы его лог не засорял вывод (тесты замера включают его).
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+class CashFlowListQueryBudgetTests(CacheIsolatedTestCase):
+    """
+    Регрессионные тесты количества SQL-запросов на странице списка записей.
+    Число запросов не должно зависеть ни от размера страницы, ни от объёма таблицы.
+    """
+    # count для пагинации + строки страницы; справочники для фильтров — из снимка
+    QUERY_BUDGET = 2
+    ROWS = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        statuses, subcategories = create_dictionaries()
+        seed_cashflows(cls.ROWS, statuses, subcategories)
+        cls.subcategory = subcategories[-1]
+
+    def setUp(self):
+        super().setUp()
+        # Бюджет считается для установившегося режима, когда снимок справочников уже загружен
+        get_dictionaries()
+
+    def assertPageWithinBudget(self, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("cashflow_list"), params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(ctx.captured_queries), self.QUERY_BUDGET,
+            "\n".join(q["sql"] for q in ctx.captured_queries),
+        )
+        return response
+
+    def test_first_page(self):
+        response = self.assertPageWithinBudget()
+        self.assertEqual(len(response.context["cashflows"]), 15)
+
+    def test_deep_page(self):
+        self.assertPageWithinBudget({"page": 500})
+
+    def test_filtered_page(self):
+        response = self.assertPageWithinBudget({
+            "type": self.subcategory.category.type_id,
+            "category": self.subcategory.category_id,
+            "subcategory": self.subcategory.pk,
+        })
+        for cashflow in response.context["cashflows"]:
+            self.assertEqual(cashflow.subcategory_id, self.subcategory.pk)
+
+    def test_cursor_page(self):
+        last = CashFlow.objects.order_by("created_at", "id")[100]
+        response = self.assertPageWithinBudget({"pagination": "cursor", "after": encode_cursor(last)})
+        self.assertEqual(len(response.context["cashflows"]), 15)
+        self.assertFalse(response.context["paginator"].count_is_exact)
+
+    def test_rows_render_dictionary_chain(self):
+        response = self.assertPageWithinBudget()
+        self.assertContains(response, escape(str(self.subcategory)))
+
+
+class CashFlowDateFilterTests(CacheIsolatedTestCase):
+    """
+    Фильтр по датам: включительные границы дней через полуоткрытый диапазон datetime.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        statuses, subcategories = create_dictionaries()
+        subcategory = subcategories[0]
+        tz = timezone.get_current_timezone()
+        cls.rows = {}
+        for label, moment in {
+            "before": datetime(2025, 3, 31, 23, 59, 59),
+            "start": datetime(2025, 4, 1, 0, 0),
+            "end": datetime(2025, 4, 30, 23, 59, 59),
+            "after": datetime(2025, 5, 1, 0, 0),
+        }.items():
+            cls.rows[label] = CashFlow.objects.create(
+                created_at=moment.replace(tzinfo=tz),
+                status=statuses[0],
+                type_id=subcategory.category.type_id,
+                category_id=subcategory.category_id,
+                subcategory=subcategory,
+                amount=Decimal("10.00"),
+            )
+
+    def filtered_ids(self, params):
+        return set(filter_cashflows(CashFlow.objects.all(), params).values_list("pk", flat=True))
+
+    def test_inclusive_day_bounds(self):
+        ids = self.filtered_ids({"date_from": "2025-04-01", "date_to": "2025-04-30"})
+        self.assertEqual(ids, {self.rows["start"].pk, self.rows["end"].pk})
+
+    def test_open_ended_ranges(self):
+        self.assertEqual(
+            self.filtered_ids({"date_from": "2025-05-01"}), {self.rows["after"].pk}
+        )
+        self.assertEqual(
+            self.filtered_ids({"date_to": "2025-03-31"}), {self.rows["before"].pk}
+        )
+
+    def test_invalid_date_is_ignored(self):
+        self.assertEqual(len(self.filtered_ids({"date_from": "2025-13-45"})), 4)
+
+    def test_date_filter_does_not_wrap_column(self):
+        qs = filter_cashflows(CashFlow.objects.all(), {"date_from": "2025-04-01", "date_to": "2025-04-30"})
+        sql = str(qs.query).lower()
+        self.assertNotIn("django_datetime_cast_date", sql)
+        self.assertIn('"created_at" >=', sql)
+
+
+class KeysetPaginationTests(CacheIsolatedTestCase):
+    """
+    Курсорная пагинация: стабильный порядок при совпадающих датах и переходы вперёд/назад.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        statuses, subcategories = create_dictionaries()
+        moment = timezone.now()
+        subcategory = subcategories[0]
+        # Несколько записей на одну и ту же дату проверяют второй компонент ключа (id)
+        for i in range(40):
+            CashFlow.objects.create(
+                created_at=moment - timedelta(hours=i // 4),
+                status=statuses[i % 2],
+                type_id=subcategory.category.type_id,
+                category_id=subcategory.category_id,
+                subcategory=subcategory,
+                amount=Decimal("1.00"),
+            )
+        cls.status = statuses[0]
+        cls.expected = list(CashFlow.objects.order_by("-created_at", "-id").values_list("pk", flat=True))
+
+    def test_walk_forward_and_back(self):
+        paginator = KeysetPaginator(CashFlow.objects.all(), per_page=7)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+        walked = [obj.pk for page in pages for obj in page]
+        self.assertEqual(walked, self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        previous = paginator.page(before=pages[2].previous_cursor)
+        self.assertEqual([obj.pk for obj in previous], [obj.pk for obj in pages[1]])
+        self.assertTrue(previous.has_previous())
+        first = paginator.page(before=pages[1].previous_cursor)
+        self.assertFalse(first.has_previous())
+
+    def test_capped_count(self):
+        paginator = KeysetPaginator(CashFlow.objects.all(), per_page=7, count_limit=10)
+        self.assertEqual(paginator.count, 11)
+        self.assertFalse(paginator.count_is_exact)
+
+    def test_broken_cursor_returns_first_page(self):
+        paginator = KeysetPaginator(CashFlow.objects.all(), per_page=7)
+        self.assertEqual([obj.pk for obj in paginator.page(after="@@@")], self.expected[:7])
+
+    def test_links_keep_filters(self):
+        response = self.client.get(reverse("cashflow_list"), {"pagination": "cursor", "status": self.status.pk})
+        next_cursor = response.context["page_obj"].next_cursor
+        self.assertContains(response, f"?after={next_cursor}&pagination=cursor&amp;status={self.status.pk}")
+        for cashflow in response.context["cashflows"]:
+            self.assertEqual(cashflow.status_id, self.status.pk)
+
+
+class RollupAssertionsMixin:
+    """
+    Сравнение агрегатов, поддерживаемых по ходу изменений, с полной пересборкой.
+    """
+
+    def rollup_state(self):
+        fields = ("status_id", "type_id", "category_id", "subcategory_id", "total", "count")
+        return (
+            sorted(CashFlowRollup.objects.values_list("date", *fields)),
+            sorted(CashFlowMonthlyRollup.objects.values_list("month", *fields)),
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollup_state()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollup_state())
+
+
+class CashFlowRollupTests(RollupAssertionsMixin, CacheIsolatedTestCase):
+    """
+    Дневные агрегаты поддерживаются при создании, изменении и удалении записей через представления
+    и совпадают с полной пересборкой.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+
+    def form_data(self, subcategory, amount, day="2025-04-01", status=None):
+        return {
+            "created_at": day,
+            "status": (status or self.statuses[0]).pk,
+            "type": subcategory.category.type_id,
+            "category": subcategory.category_id,
+            "subcategory": subcategory.pk,
+            "amount": amount,
+            "comment": "",
+        }
+
+    def test_create_update_delete_through_views(self):
+        first, second = self.subcategories[0], self.subcategories[5]
+        self.client.post(reverse("cashflow_create"), self.form_data(first, "100.00"))
+        self.client.post(reverse("cashflow_create"), self.form_data(first, "50.50"))
+        rollup = CashFlowRollup.objects.get()
+        self.assertEqual((rollup.total, rollup.count), (Decimal("150.50"), 2))
+        self.assertMatchesRebuild()
+
+        # Перенос записи в другую подкатегорию и день уменьшает старую строку и создаёт новую
+        cashflow = CashFlow.objects.order_by("pk").last()
+        self.client.post(
+            reverse("cashflow_edit", args=[cashflow.pk]),
+            self.form_data(second, "70.00", day="2025-04-02"),
+        )
+        self.assertEqual(CashFlowRollup.objects.count(), 2)
+        self.assertMatchesRebuild()
+
+        self.client.post(reverse("cashflow_delete", args=[cashflow.pk]))
+        rollup = CashFlowRollup.objects.get()
+        self.assertEqual((rollup.total, rollup.count), (Decimal("100.00"), 1))
+        self.assertMatchesRebuild()
+
+    def test_rebuild_command_for_bulk_loaded_rows(self):
+        seed_cashflows(500, self.statuses, self.subcategories)
+        call_command("rebuild_rollups", stdout=StringIO())
+        totals = CashFlowRollup.objects.aggregate(total=Sum("total"), count=Sum("count"))
+        expected = CashFlow.objects.aggregate(total=Sum("amount"), count=Count("id"))
+        self.assertEqual(totals, expected)
+        monthly = CashFlowMonthlyRollup.objects.aggregate(total=Sum("total"), count=Sum("count"))
+        self.assertEqual(monthly, expected)
+
+
+class CashFlowDashboardTests(CacheIsolatedTestCase):
+    """
+    Панель аналитики: суммы из агрегатов совпадают с записями, число запросов фиксировано.
+    """
+    # по 3 группирующих запроса к месячным и дневным агрегатам; справочники — из снимка
+    QUERY_BUDGET = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        statuses, subcategories = create_dictionaries()
+        # Записи раз в час примерно за четыре месяца
+        seed_cashflows(3000, statuses, subcategories, step=timedelta(hours=1))
+        rebuild_rollups()
+        cls.status = statuses[1]
+
+    def setUp(self):
+        super().setUp()
+        get_dictionaries()
+
+    def assertMatchesLedger(self, params):
+        response = self.get_dashboard(params)
+        ledger = filter_cashflows(CashFlow.objects.all(), params)
+        expected = {
+            row["type_id"]: (row["total"], row["count"])
+            for row in ledger.values("type_id").annotate(total=Sum("amount"), count=Count("id"))
+        }
+        totals = {row["type_id"]: (row["total"], row["count"]) for row in response.context["type_totals"]}
+        self.assertEqual(totals, expected)
+
+        by_category = sum(row["total"] for row in response.context["category_totals"])
+        by_month = sum(row["total"] for row in response.context["monthly_totals"])
+        self.assertEqual(by_category, by_month)
+        self.assertEqual(by_category, sum(total for total, _ in expected.values()))
+
+    def get_dashboard(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("cashflow_dashboard"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx.captured_queries), self.QUERY_BUDGET)
+        return response
+
+    def test_totals_match_ledger(self):
+        today = timezone.localdate()
+        self.assertMatchesLedger({})
+        self.assertMatchesLedger({"status": str(self.status.pk)})
+        # Неполные месяцы по краям и целые месяцы внутри диапазона
+        self.assertMatchesLedger({
+            "date_from": (today - timedelta(days=100)).isoformat(),
+            "date_to": (today - timedelta(days=3)).isoformat(),
+        })
+        # Диапазон внутри одного месяца
+        self.assertMatchesLedger({
+            "date_from": (today - timedelta(days=1)).isoformat(),
+            "date_to": today.isoformat(),
+        })
+
+    def test_split_by_months(self):
+        months, days = split_by_months(date(2025, 1, 1), date(2025, 3, 31))
+        self.assertIsNone(days)
+        months, days = split_by_months(date(2025, 1, 15), date(2025, 3, 10))
+        self.assertEqual(str(months), str(Q(month__gte=date(2025, 2, 1)) & Q(month__lt=date(2025, 3, 1))))
+        self.assertEqual(str(days), str(
+            Q(date__gte=date(2025, 1, 15), date__lt=date(2025, 2, 1))
+            | Q(date__gte=date(2025, 3, 1), date__lte=date(2025, 3, 10))
+        ))
+        months, days = split_by_months(date(2025, 1, 15), date(2025, 1, 20))
+        self.assertIsNone(months)
+        months, days = split_by_months(None, None)
+        self.assertEqual(months, Q())
+        self.assertIsNone(days)
+
+    def test_empty_period(self):
+        response = self.get_dashboard({"date_from": "2000-01-01", "date_to": "2000-01-31"})
+        self.assertEqual(response.context["type_totals"], [])
+        self.assertContains(response, "Нет данных за выбранный период")
+
+
+class CashFlowExportTests(CacheIsolatedTestCase):
+    """
+    Потоковая выгрузка: фильтры списка, фиксированное число запросов, корректный CSV и XLSX.
+    """
+    # Только выборка записей: имена справочников берутся из снимка
+    QUERY_BUDGET = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        statuses, subcategories = create_dictionaries()
+        seed_cashflows(5000, statuses, subcategories)
+        cls.subcategory = subcategories[3]
+
+    def setUp(self):
+        super().setUp()
+        get_dictionaries()
+
+    def export(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("cashflow_export"), params)
+            self.assertTrue(response.streaming)
+            content = b"".join(response.streaming_content)
+        self.assertLessEqual(len(ctx.captured_queries), self.QUERY_BUDGET)
+        return response, content
+
+    def test_csv_export_applies_filters(self):
+        response, content = self.export({"subcategory": self.subcategory.pk})
+        rows = list(csv.reader(content.decode("utf-8-sig").splitlines()))
+        self.assertEqual(rows[0], EXPORT_HEADER)
+        self.assertEqual(len(rows) - 1, CashFlow.objects.filter(subcategory=self.subcategory).count())
+        self.assertEqual({row[4] for row in rows[1:]}, {self.subcategory.name})
+
+    def test_xlsx_export_is_valid_workbook(self):
+        response, content = self.export({"format": "xlsx"})
+        self.assertIn("spreadsheetml", response["Content-Type"])
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+        namespace = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+        self.assertEqual(len(sheet.findall(f"{namespace}sheetData/{namespace}row")), 5001)
+
+
+class DictionarySnapshotTests(CacheIsolatedTestCase):
+    """
+    Снимок справочников: ноль запросов к справочникам в установившемся режиме
+    и сброс снимка при любом изменении справочника.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+
+    def dictionary_queries(self, url):
+        tables = {model._meta.db_table for model in (Status, Type, Category, SubCategory)}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q["sql"] for q in ctx.captured_queries if any(f'"{table}"' in q["sql"] for table in tables)]
+
+    def test_hot_pages_skip_dictionary_queries(self):
+        get_dictionaries()
+        for url in (
+            reverse("cashflow_list"),
+            reverse("cashflow_dashboard"),
+            reverse("cashflow_create"),
+            reverse("dictionaries_unified"),
+        ):
+            self.assertEqual(self.dictionary_queries(url), [], url)
+
+    def test_shared_cache_serves_new_process(self):
+        get_dictionaries()
+        # Процесс, который ещё не загружал снимок, берёт его из общего кэша
+        dictionaries._local_snapshot = None
+        with self.assertNumQueries(0):
+            snapshot = get_dictionaries()
+        self.assertEqual(str(snapshot.subcategories[0]), str(self.subcategories[0]))
+
+    def test_dictionary_edit_invalidates_snapshot(self):
+        status = self.statuses[0]
+        version = get_dictionaries().version
+        self.client.post(reverse("dictionaries_unified"), {f"edit_status_{status.pk}": "", "name": "Новый статус"})
+        snapshot = get_dictionaries()
+        self.assertNotEqual(snapshot.version, version)
+        self.assertEqual(snapshot.get("statuses", status.pk).name, "Новый статус")
+
+        # Каскадное удаление типа убирает из снимка и его категории с подкатегориями
+        type_obj = self.subcategories[0].category.type
+        type_obj.delete()
+        snapshot = get_dictionaries()
+        self.assertIsNone(snapshot.get("types", type_obj.pk))
+        self.assertNotIn(type_obj.pk, {category.type_id for category in snapshot.categories})
+        self.assertIsNone(snapshot.get("subcategories", self.subcategories[0].pk))
+
+    def test_form_validates_against_snapshot(self):
+        subcategory = self.subcategories[0]
+        data = {
+            "created_at": "2025-04-01",
+            "status": self.statuses[0].pk,
+            "type": subcategory.category.type_id,
+            "category": subcategory.category_id,
+            "subcategory": subcategory.pk,
+            "amount": "10.00",
+        }
+        get_dictionaries()
+        self.assertTrue(CashFlowForm(data).is_valid())
+        form = CashFlowForm({**data, "status": 999999})
+        self.assertFalse(form.is_valid())
+        self.assertIn("status", form.errors)
+        # Категория другого типа по-прежнему отклоняется
+        form = CashFlowForm({**data, "category": self.subcategories[-1].category_id})
+        self.assertFalse(form.is_valid())
+        self.assertIn("category", form.errors)
+
+
+class DictionaryOptionsApiTests(CacheIsolatedTestCase):
+    """
+    JSON-списки зависимых справочников: готовые ответы из снимка, условные запросы по ETag
+    и Last-Modified, форма выводит только варианты выбранных типа и категории.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+        cls.category = cls.subcategories[0].category
+
+    def setUp(self):
+        super().setUp()
+        get_dictionaries()
+
+    def test_categories_by_type(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("dictionary_categories"), {"type": self.category.type_id})
+        self.assertEqual(response.status_code, 200)
+        expected = Category.objects.filter(type_id=self.category.type_id).order_by("id")
+        self.assertEqual(
+            response.json()["results"],
+            [{"id": category.pk, "name": category.name} for category in expected],
+        )
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertTrue(response.has_header("Last-Modified"))
+
+    def test_revalidation_returns_not_modified(self):
+        url = reverse("dictionary_subcategories")
+        params = {"category": self.category.pk}
+        etag = self.client.get(url, params)["ETag"]
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        # Правка другой категории не меняет ETag этого списка, правка его подкатегории — меняет
+        other = self.subcategories[-1]
+        other.name = "Переименованная"
+        other.save()
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        subcategory = self.subcategories[0]
+        subcategory.name = "Переименованная подкатегория"
+        subcategory.save()
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Переименованная подкатегория", {item["name"] for item in response.json()["results"]})
+
+    def test_invalid_parameter(self):
+        self.assertEqual(self.client.get(reverse("dictionary_categories")).status_code, 400)
+        self.assertEqual(self.client.get(reverse("dictionary_subcategories"), {"category": "x"}).status_code, 400)
+        response = self.client.get(reverse("dictionary_subcategories"), {"category": 999999})
+        self.assertEqual(response.json()["results"], [])
+
+    def test_form_renders_only_selected_branch(self):
+        subcategory = self.subcategories[0]
+        cashflow = CashFlow.objects.create(
+            status=self.statuses[0],
+            type_id=subcategory.category.type_id,
+            category=subcategory.category,
+            subcategory=subcategory,
+            amount=Decimal("10.00"),
+        )
+        response = self.client.get(reverse("cashflow_edit", args=[cashflow.pk]))
+        form = response.context["form"]
+        categories = [value for value, _ in form.fields["category"].choices if value]
+        subcategories = [value for value, _ in form.fields["subcategory"].choices if value]
+        self.assertEqual(
+            categories,
+            list(Category.objects.filter(type_id=subcategory.category.type_id).order_by("id").values_list("id", flat=True)),
+        )
+        self.assertEqual(
+            subcategories,
+            list(SubCategory.objects.filter(category=subcategory.category).order_by("id").values_list("id", flat=True)),
+        )
+        self.assertNotContains(response, escape(str(self.subcategories[-1])))
+
+        # На пустой форме зависимые списки пусты до выбора типа
+        response = self.client.get(reverse("cashflow_create"))
+        self.assertEqual([value for value, _ in response.context["form"].fields["category"].choices], [""])
+
+
+class AsyncReadViewsTests(CacheIsolatedTestCase):
+    """
+    Асинхронные страницы для чтения (маршруты async/) отдают то же, что и синхронные,
+    с тем же числом запросов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+        seed_cashflows(200, cls.statuses, cls.subcategories, step=timedelta(hours=7))
+        rebuild_rollups()
+
+    def setUp(self):
+        super().setUp()
+        get_dictionaries()
+
+    def assertSameList(self, params):
+        sync = self.client.get(reverse("cashflow_list"), params)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("cashflow_list_async"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx.captured_queries), CashFlowListQueryBudgetTests.QUERY_BUDGET)
+        self.assertEqual(
+            [cashflow.pk for cashflow in response.context["cashflows"]],
+            [cashflow.pk for cashflow in sync.context["cashflows"]],
+        )
+        self.assertEqual(response.context["paginator"].count, sync.context["paginator"].count)
+        self.assertEqual(response.context["is_paginated"], sync.context["is_paginated"])
+        return response
+
+    def test_list_matches_sync_view(self):
+        self.assertSameList({})
+        self.assertSameList({"page": 3})
+        self.assertSameList({"page": "last"})
+        self.assertSameList({"status": self.statuses[1].pk, "date_from": "2000-01-01"})
+        response = self.assertSameList({"pagination": "cursor"})
+        self.assertSameList({"pagination": "cursor", "after": response.context["page_obj"].next_cursor})
+
+    def test_invalid_page(self):
+        self.assertEqual(self.client.get(reverse("cashflow_list_async"), {"page": 999}).status_code, 404)
+        self.assertEqual(self.client.get(reverse("cashflow_list_async"), {"page": "x"}).status_code, 404)
+
+    def test_dashboard_matches_sync_view(self):
+        today = timezone.localdate()
+        params = {"date_from": (today - timedelta(days=40)).isoformat(), "date_to": today.isoformat()}
+        sync = self.client.get(reverse("cashflow_dashboard"), params)
+        response = self.client.get(reverse("cashflow_dashboard_async"), params)
+        for key in ("type_totals", "category_totals", "monthly_totals"):
+            self.assertEqual(response.context[key], sync.context[key])
+
+    async def test_lookup_matches_sync_view(self):
+        params = {"type": self.subcategories[0].category.type_id}
+        sync = await self.async_client.get(reverse("dictionary_categories"), params)
+        response = await self.async_client.get(reverse("dictionary_categories_async"), params)
+        self.assertEqual(response.content, sync.content)
+        self.assertEqual(response["ETag"], sync["ETag"])
+        response = await self.async_client.get(
+            reverse("dictionary_categories_async"), params, headers={"If-None-Match": sync["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(PERF_SAMPLE_RATE=1.0)
+class PerformanceMiddlewareTests(CacheIsolatedTestCase):
+    """
+    Замер стоимости запросов: Server-Timing, отпечатки повторяющихся запросов,
+    время шаблонов, выборка и гистограммы на /metrics/.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+        seed_cashflows(50, cls.statuses, cls.subcategories)
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        cache_stats.reset()
+        get_dictionaries()
+
+    def server_timing(self, response):
+        return dict(
+            (part.split(";")[0], part)
+            for part in (item.strip() for item in response["Server-Timing"].split(","))
+        )
+
+    def test_server_timing_for_list(self):
+        response = self.client.get(reverse("cashflow_list"))
+        timing = self.server_timing(response)
+        self.assertIn('desc="cashflow_list"', timing["view"])
+        self.assertIn('desc="2 queries"', timing["sql"])
+        self.assertNotIn("dup", timing)
+        self.assertGreater(float(timing["tpl"].split("dur=")[1]), 0)
+
+    def test_async_view_queries_are_counted(self):
+        response = self.client.get(reverse("cashflow_list_async"))
+        self.assertIn('desc="2 queries"', self.server_timing(response)["sql"])
+
+    def test_duplicate_queries_are_reported(self):
+        def n_plus_one(request):
+            for subcategory in SubCategory.objects.all():
+                str(subcategory)
+            return HttpResponse()
+
+        request = RequestFactory().get("/")
+        with self.assertLogs("mainApp.performance", level="WARNING") as logs:
+            response = PerformanceMiddleware(n_plus_one)(request)
+        self.assertIn("dup", self.server_timing(response))
+        record = logs.records[0].performance
+        self.assertEqual(record["queries"], 1 + len(self.subcategories) * 2)
+        duplicated = {item["sql"]: item["count"] for item in record["duplicates"]}
+        self.assertIn(len(self.subcategories), duplicated.values())
+
+    def test_sampling(self):
+        with override_settings(PERF_SAMPLE_RATE=0):
+            middleware = PerformanceMiddleware(lambda request: HttpResponse())
+        response = middleware(RequestFactory().get("/"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_metrics_endpoint(self):
+        for _ in range(3):
+            self.client.get(reverse("cashflow_list"))
+        # Метрики доступны только сотрудникам, независимо от адреса клиента
+        self.assertEqual(self.client.get(reverse("performance_metrics"), REMOTE_ADDR="127.0.0.1").status_code, 404)
+        self.client.force_login(User.objects.create_user("staff", password="password", is_staff=True))
+        metrics = self.client.get(reverse("performance_metrics")).json()
+        view = metrics["views"]["cashflow_list"]
+        self.assertEqual(view["requests"], 3)
+        self.assertEqual(view["wall_ms"]["buckets"]["+Inf"], 3)
+        # Первый запрос отрисовывает страницу (2 запроса), повторные берутся из кэша
+        self.assertEqual(view["queries"]["sum"], 2)
+        self.assertEqual(metrics["caches"]["cashflow_list"], {"hits": 2, "misses": 1, "hit_ratio": 0.6667})
+
+
+    def test_sql_fingerprint(self):
+        self.assertEqual(
+            sql_fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s)'),
+            sql_fingerprint('SELECT * FROM "t"  WHERE "id" IN (%s)'),
+        )
+        self.assertEqual(
+            sql_fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO "t" ("a", "b") VALUES (...)',
+        )
+
+
+class PageCacheTests(CacheIsolatedTestCase):
+    """
+    Кэш отрисованных страниц списка и панели фильтров: повторный просмотр без запросов
+    к базе, сброс при изменении записей и справочников, нормализация ключа.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+        seed_cashflows(30, cls.statuses, cls.subcategories)
+
+    def setUp(self):
+        super().setUp()
+        cache_stats.reset()
+        get_dictionaries()
+
+    def get_list(self, params=None, name="cashflow_list"):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(name), params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_repeated_view_skips_queries(self):
+        first, queries = self.get_list({"status": self.statuses[0].pk})
+        self.assertEqual(queries, CashFlowListQueryBudgetTests.QUERY_BUDGET)
+        second, queries = self.get_list({"status": self.statuses[0].pk})
+        self.assertEqual(queries, 0)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(cache_stats.as_dict()["cashflow_list"]["hits"], 1)
+
+    def test_async_view_is_cached(self):
+        first, _ = self.get_list(name="cashflow_list_async")
+        second, queries = self.get_list(name="cashflow_list_async")
+        self.assertEqual(queries, 0)
+        self.assertEqual(second.content, first.content)
+
+    def test_query_is_normalized(self):
+        status, subcategory = self.statuses[1].pk, self.subcategories[0].pk
+        self.get_list({"status": status, "subcategory": subcategory})
+        _, queries = self.get_list({"subcategory": subcategory, "status": status, "utm": "x", "type": ""})
+        self.assertEqual(queries, 0)
+        # Другой фильтр — другой ключ
+        _, queries = self.get_list({"status": self.statuses[0].pk, "subcategory": subcategory})
+        self.assertGreater(queries, 0)
+        self.assertEqual(
+            normalized_query(QueryDict("b=2&a=1&a=0&c="), ("a", "b", "c")),
+            "a=0&a=1&b=2",
+        )
+
+    def test_cashflow_change_invalidates(self):
+        self.get_list()
+        subcategory = self.subcategories[0]
+        cashflow = CashFlow.objects.create(
+            status=self.statuses[0], type_id=subcategory.category.type_id, category_id=subcategory.category_id,
+            subcategory=subcategory, amount=Decimal("123456.78"),
+        )
+        response, queries = self.get_list()
+        self.assertGreater(queries, 0)
+        self.assertContains(response, "123456")
+
+        cashflow.delete()
+        response, queries = self.get_list()
+        self.assertGreater(queries, 0)
+        self.assertNotContains(response, "123456")
+
+    def test_dictionary_rename_invalidates(self):
+        self.get_list()
+        status = self.statuses[0]
+        status.name = "Переименованный статус"
+        status.save()
+        response, queries = self.get_list()
+        self.assertGreater(queries, 0)
+        self.assertContains(response, "Переименованный статус")
+
+    def test_rates_load_invalidates(self):
+        # Суммы в валюте отчётности на странице зависят от курсов
+        for name in ("cashflow_list", "cashflow_list_async"):
+            self.get_list(name=name)
+            bump_version(RATES_VERSION)
+            _, queries = self.get_list(name=name)
+            self.assertGreater(queries, 0, name)
+            _, queries = self.get_list(name=name)
+            self.assertEqual(queries, 0, name)
+
+    def test_archive_boundary_is_part_of_key(self):
+        # С датой «с» граница архива решает, читается ли архив
+        params = {"date_from": "2020-01-01"}
+        for name in ("cashflow_list", "cashflow_list_async"):
+            self.get_list(params, name=name)
+            _, queries = self.get_list(params, name=name)
+            self.assertEqual(queries, 0, name)
+        cache.set(ARCHIVE_BOUNDARY_KEY, date(2021, 1, 1), timeout=None)
+        for name in ("cashflow_list", "cashflow_list_async"):
+            _, queries = self.get_list(params, name=name)
+            self.assertGreater(queries, 0, name)
+
+    def test_filter_bar_is_shared(self):
+        self.client.get(reverse("cashflow_list"))
+        self.client.get(reverse("cashflow_list"), {"page": 2})
+        stats = cache_stats.as_dict()["filter_bar"]
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_import_invalidates(self):
+        self.get_list()
+        subcategory = self.subcategories[0]
+        category = subcategory.category
+        stream = StringIO()
+        writer = csv.writer(stream)
+        writer.writerow(EXPORT_HEADER)
+        writer.writerow(["2025-04-01", "Статус 0", category.type.name, category.name, subcategory.name, "1.00", ""])
+        stream.seek(0)
+        self.assertEqual(import_cashflows(stream).created, 1)
+        _, queries = self.get_list()
+        self.assertGreater(queries, 0)
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": tmp}
+            with override_settings(CACHES={"default": backend}):
+                first, _ = self.get_list()
+                second, queries = self.get_list()
+                self.assertEqual(queries, 0)
+                self.assertEqual(second.content, first.content)
+
+
+class StartupTests(CacheIsolatedTestCase):
+    """
+    Холодный старт: проверки шаблонов при запуске, прогрев и замер первого запроса.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_dictionaries()
+
+    def test_templates_compile(self):
+        self.assertIn("cashflow/cashflow_list.html", template_names())
+        self.assertIn("cashflow/includes/filter_bar.html", template_names())
+        self.assertEqual(check_templates_compile(None), [])
+
+    def test_cached_loader_check(self):
+        self.assertEqual(check_cached_loader(None), [])
+        uncached = [{
+            "BACKEND": "django.template.backends.django.DjangoTemplates",
+            "OPTIONS": {"loaders": ["django.template.loaders.app_directories.Loader"]},
+        }]
+        with override_settings(DEBUG=False, TEMPLATES=uncached):
+            self.assertEqual([message.id for message in check_cached_loader(None)], ["mainApp.W001"])
+
+    def test_warm_up(self):
+        with mock.patch("mainApp.startup.connections"), mock.patch.dict(startup_report):
+            warm_up()
+            self.assertEqual(startup_report["templates"], len(template_names()))
+            self.assertIsNotNone(startup_report["warmup_ms"])
+        cached_loader = engines.all()[0].engine.template_loaders[0]
+        self.assertIn("cashflow/cashflow_list.html", cached_loader.get_template_cache)
+        with CaptureQueriesContext(connection) as ctx:
+            get_dictionaries()
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_first_request_is_timed(self):
+        timer = FirstRequestTimer()
+        with mock.patch.dict(startup_report, first_request_ms=None):
+            timer.connect()
+            try:
+                # Строка лога перехватывается и проверяется, а не попадает в вывод тестов
+                with self.assertLogs("mainApp.startup", "INFO") as logs:
+                    self.client.get(reverse("cashflow_list"))
+                first = startup_report["first_request_ms"]
+                self.assertGreater(first, 0)
+                self.assertEqual(
+                    logs.output, [f"INFO:mainApp.startup:Первый запрос процесса {os.getpid()}: {first} мс"],
+                )
+                self.client.get(reverse("cashflow_list"))
+                self.assertEqual(startup_report["first_request_ms"], first)
+            finally:
+                timer.disconnect()
+
+
+class TaxonomyPathTests(CacheIsolatedTestCase):
+    """
+    Денормализованное полное название подкатегории в записях ДДС: заполнение,
+    синхронизация при переименовании справочников, пакетное заполнение миграцией.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+
+    def create_cashflow(self, subcategory):
+        return CashFlow.objects.create(
+            status=self.statuses[0], type_id=subcategory.category.type_id, category_id=subcategory.category_id,
+            subcategory=subcategory, amount=Decimal("10.00"),
+        )
+
+    def paths(self):
+        return dict(CashFlow.objects.values_list("pk", "taxonomy_path"))
+
+    def test_filled_on_save(self):
+        subcategory = self.subcategories[3]
+        cashflow = self.create_cashflow(subcategory)
+        self.assertEqual(cashflow.taxonomy_path, str(SubCategory.objects.get(pk=subcategory.pk)))
+        cashflow.subcategory = self.subcategories[0]
+        cashflow.save()
+        cashflow.refresh_from_db()
+        self.assertEqual(cashflow.taxonomy_path, str(self.subcategories[0]))
+
+    def test_type_rename_in_dictionaries_view(self):
+        kept = self.create_cashflow(self.subcategories[-1])
+        renamed = [self.create_cashflow(subcategory) for subcategory in self.subcategories[:4]]
+        type_obj = self.subcategories[0].category.type
+        response = self.client.post(reverse("dictionaries_unified"), {f"edit_type_{type_obj.pk}": "", "name": "Новый тип"})
+        self.assertEqual(response.status_code, 302)
+        paths = self.paths()
+        for cashflow in renamed:
+            self.assertTrue(paths[cashflow.pk].startswith("Новый тип -> "))
+        self.assertEqual(paths[kept.pk], kept.taxonomy_path)
+
+    def test_subcategory_move(self):
+        cashflow = self.create_cashflow(self.subcategories[0])
+        target = self.subcategories[-1].category
+        self.client.post(reverse("dictionaries_unified"), {
+            f"edit_subcategory_{self.subcategories[0].pk}": "", "name": "Перенесённая", "category_id": target.pk,
+        })
+        cashflow.refresh_from_db()
+        self.assertEqual(cashflow.taxonomy_path, f"{target.type.name} -> {target.name} -> Перенесённая")
+
+    def test_unchanged_save_skips_update(self):
+        self.create_cashflow(self.subcategories[0])
+        category = Category.objects.get(pk=self.subcategories[0].category_id)
+        with CaptureQueriesContext(connection) as ctx:
+            category.save()
+        self.assertFalse([q for q in ctx.captured_queries if 'UPDATE "mainApp_cashflow"' in q["sql"]])
+
+    def test_filter_and_group_on_single_table(self):
+        for subcategory in self.subcategories[:3]:
+            self.create_cashflow(subcategory)
+        path = str(self.subcategories[1])
+        response = self.client.get(reverse("cashflow_list"), {"taxonomy": path})
+        self.assertEqual([cashflow.taxonomy_path for cashflow in response.context["cashflows"]], [path])
+
+        with CaptureQueriesContext(connection) as ctx:
+            totals = dict(CashFlow.objects.values_list("taxonomy_path").annotate(Sum("amount")).order_by())
+        self.assertEqual(totals[path], Decimal("10.00"))
+        self.assertNotIn("JOIN", ctx.captured_queries[0]["sql"])
+
+    def test_import_fills_path(self):
+        subcategory = self.subcategories[2]
+        category = subcategory.category
+        stream = StringIO()
+        writer = csv.writer(stream)
+        writer.writerow(["2025-04-01", "Статус 0", category.type.name, category.name, subcategory.name, "1.00", ""])
+        stream.seek(0)
+        import_cashflows(stream)
+        self.assertEqual(CashFlow.objects.get().taxonomy_path, str(SubCategory.objects.get(pk=subcategory.pk)))
+
+    def test_migration_backfill(self):
+        seed_cashflows(25, self.statuses, self.subcategories)
+        self.assertEqual(set(self.paths().values()), {""})
+        migration = import_module("mainApp.migrations.0006_cashflow_taxonomy_path")
+        with mock.patch.object(migration, "BACKFILL_BATCH_SIZE", 7):
+            migration.fill_taxonomy_paths(django_apps, None)
+        expected = {obj.pk: str(obj) for obj in SubCategory.objects.select_related("category__type")}
+        for cashflow in CashFlow.objects.all():
+            self.assertEqual(cashflow.taxonomy_path, expected[cashflow.subcategory_id])
+
+
+class CashFlowSearchTests(CacheIsolatedTestCase):
+    """
+    Полнотекстовый поиск по комментариям: индекс FTS5 с триггерами, префиксы,
+    ранжирование и сочетание с остальными фильтрами списка.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+        seed_cashflows(40, cls.statuses, cls.subcategories)
+        subcategory = cls.subcategories[0]
+        comments = [
+            "Оплата аренды офиса за март",
+            "Аренда склада",
+            "Оплата поставщику, аренда аренда аренда",
+            "Возврат оплаты",
+        ]
+        cls.cashflows = [
+            CashFlow.objects.create(
+                status=cls.statuses[i % 2], type_id=subcategory.category.type_id,
+                category_id=subcategory.category_id, subcategory=subcategory,
+                amount=Decimal("1.00"), comment=comment,
+            )
+            for i, comment in enumerate(comments)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        get_dictionaries()
+
+    def search(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("cashflow_list"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx.captured_queries), CashFlowListQueryBudgetTests.QUERY_BUDGET)
+        return [cashflow.pk for cashflow in response.context["cashflows"]]
+
+    def test_prefix_and_all_terms(self):
+        arenda, sklad, supplier, refund = (cashflow.pk for cashflow in self.cashflows)
+        self.assertEqual(set(self.search({"q": "аренд"})), {arenda, sklad, supplier})
+        self.assertEqual(set(self.search({"q": "опл аренд"})), {arenda, supplier})
+        self.assertEqual(set(self.search({"q": "ОПЛАТ"})), {arenda, supplier, refund})
+        self.assertEqual(self.search({"q": "налог"}), [])
+
+    def test_combines_with_filters(self):
+        status = self.statuses[0]
+        # "аренда" — префикс слов "Аренда" и "аренда", но не "аренды"
+        expected = {cashflow.pk for cashflow in self.cashflows[1:3] if cashflow.status_id == status.pk}
+        self.assertEqual(set(self.search({"q": "аренда", "status": status.pk})), expected)
+
+    def test_relevance_order(self):
+        found = self.search({"q": "аренда", "order": "relevance"})
+        self.assertEqual(found[0], self.cashflows[2].pk)
+        # Курсорный режим всегда идёт по дате
+        by_date = self.search({"q": "аренда", "order": "relevance", "pagination": "cursor"})
+        self.assertEqual(by_date, self.search({"q": "аренда"}))
+
+    def test_query_syntax_is_ignored(self):
+        self.assertEqual(set(self.search({"q": '"аренда* OR) NEAR(('})), set(self.search({"q": "аренда near"})))
+        self.assertEqual(len(self.search({"q": "***"})), CashFlowListView.paginate_by)
+
+    def test_index_follows_changes(self):
+        cashflow = self.cashflows[3]
+        cashflow.comment = "Штраф"
+        cashflow.save()
+        self.assertEqual(self.search({"q": "штраф"}), [cashflow.pk])
+        self.assertEqual(self.search({"q": "возврат"}), [])
+        cashflow.delete()
+        self.assertEqual(self.search({"q": "штраф"}), [])
+
+    def test_async_view(self):
+        response = self.client.get(reverse("cashflow_list_async"), {"q": "аренд", "order": "relevance"})
+        self.assertEqual(
+            [cashflow.pk for cashflow in response.context["cashflows"]],
+            self.search({"q": "аренд", "order": "relevance"}),
+        )
+
+    def test_admin_search(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        response = self.client.get(reverse("admin:mainApp_cashflow_changelist"), {"q": "аренд"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["cl"].result_count, 3)
+
+    def test_search_terms(self):
+        self.assertEqual(search_terms(' Аренда "офиса"* OR '), ["аренда", "офиса", "or"])
+        self.assertEqual(search_terms(None), [])
+
+
+class CashFlowImportTests(CacheIsolatedTestCase):
+    """
+    Массовый импорт: проверка строк по справочникам в памяти, пакетная вставка и отчёт об ошибках.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+
+    def csv_stream(self, rows, header=True):
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(EXPORT_HEADER)
+        writer.writerows(rows)
+        buffer.seek(0)
+        return buffer
+
+    def test_export_import_round_trip(self):
+        seed_cashflows(1200, self.statuses, self.subcategories)
+        exported = b"".join(self.client.get(reverse("cashflow_export")).streaming_content).decode("utf-8-sig")
+        expected = CashFlow.objects.aggregate(total=Sum("amount"), count=Count("id"))
+        CashFlow.objects.all().delete()
+        CashFlowRollup.objects.all().delete()
+        CashFlowMonthlyRollup.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as ctx:
+            result = import_cashflows(StringIO(exported), batch_size=500)
+        self.assertEqual(result.created, 1200)
+        self.assertEqual(result.error_count, 0)
+        self.assertEqual(CashFlow.objects.aggregate(total=Sum("amount"), count=Count("id")), expected)
+        # Агрегаты пересобраны за импортированный период
+        self.assertEqual(CashFlowRollup.objects.aggregate(total=Sum("total"), count=Sum("count")), expected)
+        # Проверка строк не обращается к базе: число запросов зависит от числа пакетов, а не строк
+        self.assertLess(len(ctx.captured_queries), 40)
+
+    def test_formula_cells_are_escaped(self):
+        seed_cashflows(4, self.statuses, self.subcategories)
+        comments = ["=HYPERLINK(\"http://x\")", "+1", "@SUM(A1)", "-3 за доставку"]
+        for cashflow, comment in zip(CashFlow.objects.order_by("-created_at", "-id"), comments):
+            CashFlow.objects.filter(pk=cashflow.pk).update(comment=comment)
+        exported = b"".join(self.client.get(reverse("cashflow_export")).streaming_content).decode("utf-8-sig")
+        rows = list(csv.reader(StringIO(exported)))[1:]
+        self.assertEqual([row[6] for row in rows], ["'" + comment for comment in comments])
+
+        # Импорт снимает апостроф: выгрузка и загрузка сохраняют комментарий как есть
+        CashFlow.objects.all().delete()
+        self.assertEqual(import_cashflows(StringIO(exported)).created, 4)
+        self.assertEqual(sorted(CashFlow.objects.values_list("comment", flat=True)), sorted(comments))
+
+    def test_row_errors_are_reported(self):
+        good, foreign = self.subcategories[0], self.subcategories[7]
+        category = good.category
+        rows = [
+            ["2025-04-01 10:00:00", "Статус 0", category.type.name, category.name, good.name, "10.50", "ок"],
+            ["2025-04-01", "Нет такого", category.type.name, category.name, good.name, "1", ""],
+            ["2025-04-01", "Статус 0", category.type.name, category.name, foreign.name, "1", ""],
+            ["2025-04-01", "Статус 0", "Тип 1", category.name, good.name, "1", ""],
+            ["не дата", "Статус 0", category.type.name, category.name, good.name, "1", ""],
+            ["2025-04-01", "Статус 0", category.type.name, category.name, good.name, "-5", ""],
+            ["2025-04-01", "Статус 0"],
+        ]
+        result = import_cashflows(self.csv_stream(rows))
+        self.assertEqual(result.created, 1)
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5, 6, 7, 8])
+        self.assertIn("не принадлежит категории", result.errors[1][1])
+        self.assertIn("не принадлежит типу", result.errors[2][1])
+
+    def test_upload_view(self):
+        subcategory = self.subcategories[2]
+        category = subcategory.category
+        content = self.csv_stream([
+            ["2025-04-01", "Статус 1", category.type.name, category.name, subcategory.name, "99.99", ""],
+        ]).getvalue().encode("utf-8-sig")
+        upload = SimpleUploadedFile("cashflows.csv", content, content_type="text/csv")
+        response = self.client.post(reverse("cashflow_import"), {"file": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["result"].created, 1)
+        self.assertEqual(CashFlowRollup.objects.get().total, Decimal("99.99"))
+
+    def test_encoding_checked_before_first_batch(self):
+        subcategory = self.subcategories[2]
+        category = subcategory.category
+        row = ["2025-04-01", "Статус 1", category.type.name, category.name, subcategory.name, "1.00", ""]
+        content = (
+            self.csv_stream([row] * 6000).getvalue().encode("utf-8-sig")
+            + self.csv_stream([[*row[:6], "Оплата"]], header=False).getvalue().encode("cp1251")
+        )
+        self.assertEqual(encoding_error_line(BytesIO(content), chunk_size=1000), 6002)
+        upload = SimpleUploadedFile("cashflows.csv", content, content_type="text/csv")
+        response = self.client.post(reverse("cashflow_import"), {"file": upload})
+        self.assertFormError(
+            response.context["form"], "file",
+            "Файл должен быть в кодировке UTF-8: строка 6002 не читается. Ничего не импортировано.",
+        )
+        self.assertFalse(CashFlow.objects.exists())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "import.csv")
+            with open(path, "wb") as f:
+                f.write(content)
+            with self.assertRaisesMessage(CommandError, "строка 6002"):
+                call_command("import_cashflows", path, stdout=StringIO())
+        self.assertFalse(CashFlow.objects.exists())
+
+    def test_management_command(self):
+        subcategory = self.subcategories[1]
+        category = subcategory.category
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "import.csv")
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.write(self.csv_stream([
+                    ["2025-04-01", "Статус 0", category.type.name, category.name, subcategory.name, "1.00", ""],
+                    ["2025-04-01", "?", category.type.name, category.name, subcategory.name, "1.00", ""],
+                ]).getvalue())
+            report = os.path.join(tmp, "errors.csv")
+            out = StringIO()
+            call_command("import_cashflows", path, error_report=report, stdout=out, stderr=StringIO())
+            with open(report, encoding="utf-8") as f:
+                self.assertEqual(len(list(csv.reader(f))), 2)
+        self.assertIn("Создано записей: 1", out.getvalue())
+
+
+class CashFlowBulkTests(RollupAssertionsMixin, CacheIsolatedTestCase):
+    """
+    Массовые операции: один UPDATE/DELETE на выборку, проверка связей справочников,
+    согласованные агрегаты, taxonomy_path и полнотекстовый индекс.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+
+    def setUp(self):
+        super().setUp()
+        seed_cashflows(200, self.statuses, self.subcategories, step=timedelta(hours=5))
+        rebuild_rollups()
+
+    def bulk(self, data):
+        return self.client.post(reverse("cashflow_bulk"), data)
+
+    def test_update_by_ids(self):
+        first = self.subcategories[0]
+        ids = list(CashFlow.objects.filter(subcategory=first).values_list("id", flat=True)[:10])
+        target = self.subcategories[1]
+        response = self.bulk({
+            "ids": ids, "set-action": "update", "set-status": self.statuses[1].pk, "set-subcategory": target.pk,
+        })
+        self.assertContains(response, "Изменено записей: 10")
+        changed = CashFlow.objects.filter(id__in=ids)
+        self.assertEqual(set(changed.values_list("status_id", "subcategory_id", "taxonomy_path")), {
+            (self.statuses[1].pk, target.pk, str(target)),
+        })
+        self.assertMatchesRebuild()
+
+    def test_update_by_filters_is_single_statement(self):
+        category = self.subcategories[0].category
+        expected = CashFlow.objects.filter(category=category).count()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.bulk({
+                "category": category.pk, "set-action": "update", "set-status": self.statuses[0].pk,
+            })
+        self.assertContains(response, f"Изменено записей: {expected}")
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('UPDATE "mainApp_cashflow"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(CashFlow.objects.filter(category=category, status=self.statuses[0]).count(), expected)
+        self.assertMatchesRebuild()
+
+    def test_chain_rules_against_kept_values(self):
+        # Подкатегория другой категории без смены категории нарушает связь у всех записей
+        ids = list(CashFlow.objects.filter(subcategory=self.subcategories[0]).values_list("id", flat=True))
+        before = self.rollup_state()
+        response = self.bulk({"ids": ids, "set-action": "update", "set-subcategory": self.subcategories[2].pk})
+        self.assertContains(response, "не принадлежит категории записей")
+        self.assertFalse(CashFlow.objects.filter(subcategory=self.subcategories[2], id__in=ids).exists())
+        self.assertEqual(self.rollup_state(), before)
+
+        # Смена типа без категории: категории записей принадлежат другому типу
+        other_type = self.subcategories[4].category.type
+        response = self.bulk({"ids": ids, "set-action": "update", "set-type": other_type.pk})
+        self.assertContains(response, "Категории записей не принадлежат типу")
+
+        # Вся цепочка целиком согласована — изменение проходит
+        target = self.subcategories[4]
+        response = self.bulk({
+            "ids": ids, "set-action": "update", "set-type": target.category.type_id,
+            "set-category": target.category_id, "set-subcategory": target.pk,
+        })
+        self.assertContains(response, f"Изменено записей: {len(ids)}")
+        self.assertMatchesRebuild()
+
+    def test_chain_rules_between_new_values(self):
+        response = self.bulk({
+            "category": self.subcategories[0].category_id, "set-action": "update",
+            "set-category": self.subcategories[0].category_id, "set-subcategory": self.subcategories[4].pk,
+        })
+        self.assertContains(response, "не принадлежит категории")
+        response = self.bulk({"category": self.subcategories[0].category_id, "set-action": "update"})
+        self.assertContains(response, "Выберите хотя бы одно новое значение")
+
+    def test_delete_by_filters(self):
+        status = self.statuses[1]
+        CashFlow.objects.filter(pk=CashFlow.objects.filter(status=status).first().pk).update(comment="удаляемая запись")
+        kept = CashFlow.objects.exclude(status=status).count()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.bulk({"status": status.pk, "set-action": "delete"})
+        self.assertContains(response, f"Удалено записей: {200 - kept}")
+        self.assertEqual(CashFlow.objects.count(), kept)
+        deletes = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('DELETE FROM "mainApp_cashflow"')]
+        self.assertEqual(len(deletes), 1)
+        self.assertMatchesRebuild()
+        # Записи удалены и из полнотекстового индекса, кэш списка сброшен
+        self.assertEqual(self.client.get(reverse("cashflow_list"), {"q": "удаляемая"}).context["paginator"].count, 0)
+
+    def test_selection_is_required(self):
+        response = self.bulk({"set-action": "delete"})
+        self.assertContains(response, "задайте хотя бы один фильтр")
+        self.assertEqual(CashFlow.objects.count(), 200)
+        response = self.bulk({"set-action": "delete", "ids": ["x"]})
+        self.assertContains(response, "Неверный id записи")
+        self.assertEqual(CashFlow.objects.count(), 200)
+
+    def test_page_shows_selection_from_list(self):
+        status = self.statuses[0]
+        response = self.client.get(reverse("cashflow_bulk"), {"status": status.pk, "page": 2})
+        self.assertContains(response, f"<b>{CashFlow.objects.filter(status=status).count()}</b>")
+        self.assertContains(response, f'<input type="hidden" name="status" value="{status.pk}">')
+        self.assertNotContains(response, 'name="page"')
+        # Список отдаёт фильтры в форму выбора записей
+        response = self.client.get(reverse("cashflow_list"), {"status": status.pk})
+        self.assertContains(response, f'<input type="hidden" name="status" value="{status.pk}">')
+        self.assertContains(response, 'name="ids"')
+
+
+class DictionaryBatchTests(RollupAssertionsMixin, CacheIsolatedTestCase):
+    """
+    Пакетное изменение справочников: одна транзакция, bulk_create/bulk_update, перенос
+    записей вслед за справочниками и заранее найденные конфликты PROTECT.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+
+    def setUp(self):
+        super().setUp()
+        seed_cashflows(80, self.statuses, self.subcategories[:4], step=timedelta(days=1))
+        for subcategory in self.subcategories[:4]:
+            CashFlow.objects.filter(subcategory=subcategory).update(taxonomy_path=str(subcategory))
+        rebuild_rollups()
+
+    def batch(self, *operations):
+        return self.client.post(
+            reverse("dictionary_batch"), {"operations": list(operations)}, content_type="application/json",
+        )
+
+    def test_adds_with_references_in_one_request(self):
+        response = self.batch(
+            {"op": "add", "dictionary": "types", "name": "Инвестиции", "ref": "t"},
+            {"op": "add", "dictionary": "categories", "name": "Акции", "parent": "t", "ref": "c"},
+            {"op": "add", "dictionary": "subcategories", "name": "Дивиденды", "parent": "c"},
+            {"op": "add", "dictionary": "subcategories", "name": "Продажа", "parent": "c"},
+            {"op": "add", "dictionary": "statuses", "name": "Черновик"},
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["created_count"], 5)
+        category = Category.objects.get(pk=body["created"]["c"])
+        self.assertEqual(category.type_id, body["created"]["t"])
+        self.assertEqual(
+            sorted(category.subcategories.values_list("name", flat=True)), ["Дивиденды", "Продажа"]
+        )
+        # Снимок справочников сброшен один раз на весь пакет
+        self.assertEqual(get_dictionaries().get("categories", category.pk).name, "Акции")
+
+    def test_rename_and_move_follow_records(self):
+        moving = self.subcategories[0]
+        target = self.subcategories[4].category
+        rule = RecurringRule.objects.create(
+            name="Аренда", frequency=RecurringRule.MONTHLY, start_date=timezone.localdate(),
+            status=self.statuses[0], type_id=moving.category.type_id, category_id=moving.category_id,
+            subcategory=moving, amount=Decimal("1000.00"),
+        )
+        renamed = self.subcategories[2].category
+        response = self.batch(
+            {"op": "update", "dictionary": "subcategories", "id": moving.pk, "parent": target.pk},
+            {"op": "update", "dictionary": "categories", "id": renamed.pk, "name": "Переименованная"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["moved_records"], CashFlow.objects.filter(subcategory=moving).count())
+        self.assertEqual(
+            set(CashFlow.objects.filter(subcategory=moving).values_list("category_id", "type_id")),
+            {(target.pk, target.type_id)},
+        )
+        moving.refresh_from_db()
+        self.assertEqual(set(CashFlow.objects.filter(subcategory=moving).values_list("taxonomy_path", flat=True)), {
+            str(SubCategory.objects.select_related("category__type").get(pk=moving.pk)),
+        })
+        self.assertTrue(all(
+            path.split(" -> ")[1] == "Переименованная"
+            for path in CashFlow.objects.filter(category=renamed).values_list("taxonomy_path", flat=True)
+        ))
+        # Агрегаты перенесены тем же UPDATE и совпадают с полной пересборкой
+        self.assertMatchesRebuild()
+        # Регулярное правило переехало вместе с подкатегорией: новые записи по нему
+        # создаются уже с новыми категорией и типом
+        rule.refresh_from_db()
+        self.assertEqual((rule.category_id, rule.type_id), (target.pk, target.type_id))
+
+    def test_protect_conflicts_include_recurring_rules(self):
+        status = Status.objects.create(name="Плановый")
+        free = self.subcategories[5]
+        RecurringRule.objects.create(
+            name="Аренда", frequency=RecurringRule.MONTHLY, start_date=timezone.localdate(),
+            status=status, type_id=free.category.type_id, category_id=free.category_id, subcategory=free,
+            amount=Decimal("1000.00"),
+        )
+        response = self.batch(
+            {"op": "delete", "dictionary": "statuses", "id": status.pk},
+            {"op": "delete", "dictionary": "categories", "id": free.category_id},
+            {"op": "delete", "dictionary": "statuses", "id": self.statuses[0].pk},
+        )
+        self.assertEqual(response.status_code, 409)
+        conflicts = {(c["dictionary"], c["id"]): (c["records"], c["rules"]) for c in response.json()["conflicts"]}
+        self.assertEqual(conflicts, {
+            ("statuses", status.pk): (0, 1),
+            ("statuses", self.statuses[0].pk): (40, 0),
+            ("categories", free.category_id): (0, 1),
+        })
+        self.assertTrue(SubCategory.objects.filter(pk=free.pk).exists())
+        error = DictionaryBatchError(conflicts=response.json()["conflicts"])
+        self.assertIn("Нельзя удалить «Плановый»: используется в регулярных операциях (1)", error.messages())
+
+    def test_swap_names_and_reuse_freed_name(self):
+        first, second = self.statuses
+        used_type = self.subcategories[0].category.type
+        response = self.batch(
+            {"op": "update", "dictionary": "statuses", "id": first.pk, "name": second.name},
+            {"op": "update", "dictionary": "statuses", "id": second.pk, "name": first.name},
+            {"op": "update", "dictionary": "types", "id": used_type.pk, "name": "Прежний тип"},
+            {"op": "add", "dictionary": "types", "name": used_type.name},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Status.objects.get(pk=first.pk).name, second.name)
+        self.assertEqual(Status.objects.get(pk=second.pk).name, first.name)
+        self.assertEqual(Type.objects.get(pk=used_type.pk).name, "Прежний тип")
+        self.assertTrue(Type.objects.filter(name=used_type.name).exclude(pk=used_type.pk).exists())
+        self.assertTrue(all(
+            path.startswith("Прежний тип -> ")
+            for path in CashFlow.objects.filter(type=used_type).values_list("taxonomy_path", flat=True)
+        ))
+
+    def test_protect_conflicts_in_one_query(self):
+        used_type = self.subcategories[0].category.type
+        free_type = self.subcategories[4].category.type
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.batch(
+                {"op": "delete", "dictionary": "types", "id": used_type.pk},
+                {"op": "delete", "dictionary": "statuses", "id": self.statuses[1].pk},
+                {"op": "delete", "dictionary": "types", "id": free_type.pk},
+            )
+        self.assertEqual(response.status_code, 409)
+        conflicts = {(c["dictionary"], c["id"]): c["records"] for c in response.json()["conflicts"]}
+        self.assertEqual(conflicts, {
+            ("statuses", self.statuses[1].pk): CashFlow.objects.filter(status=self.statuses[1]).count(),
+            ("types", used_type.pk): CashFlow.objects.filter(type=used_type).count(),
+        })
+        ledger_queries = [q for q in ctx.captured_queries if 'FROM "mainApp_cashflow"' in q["sql"]]
+        self.assertEqual(len(ledger_queries), 1)
+        self.assertTrue(Type.objects.filter(pk=free_type.pk).exists())
+
+        # Подкатегории, перенесённые из удаляемого типа, уносят свои записи — конфликта нет
+        target = Category.objects.create(name="Новая категория", type=free_type)
+        operations = [
+            {"op": "update", "dictionary": "subcategories", "id": subcategory.pk, "parent": target.pk}
+            for subcategory in self.subcategories[:4]
+        ]
+        response = self.batch(*operations, {"op": "delete", "dictionary": "types", "id": used_type.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["deleted"], 1)
+        self.assertFalse(Category.objects.filter(type_id=used_type.pk).exists())
+        self.assertEqual(CashFlow.objects.filter(category=target).count(), 80)
+
+    def test_validation_errors_change_nothing(self):
+        category = self.subcategories[0].category
+        response = self.batch(
+            {"op": "update", "dictionary": "categories", "id": category.pk, "name": ""},
+            {"op": "add", "dictionary": "subcategories", "name": "Х", "parent": 10 ** 6},
+            {"op": "delete", "dictionary": "statuses", "id": 10 ** 6},
+            {"op": "add", "dictionary": "statuses", "name": "Новый"},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["index"] for error in response.json()["errors"]], [0, 1, 2])
+        self.assertEqual(Status.objects.count(), 2)
+
+        # Названия уникальны без учёта регистра, подкатегории — внутри категории
+        response = self.batch(
+            {"op": "add", "dictionary": "statuses", "name": "статус 0"},
+            {"op": "add", "dictionary": "subcategories", "name": "Новая", "parent": category.pk},
+            {"op": "add", "dictionary": "subcategories", "name": "новая", "parent": category.pk},
+            {"op": "update", "dictionary": "subcategories", "id": self.subcategories[2].pk, "name": "Новая"},
+        )
+        self.assertEqual([error["index"] for error in response.json()["errors"]], [0, 1, 2])
+        self.assertEqual(Status.objects.count(), 2)
+        response = self.client.post(reverse("dictionary_batch"), "{", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_page_form_uses_batch(self):
+        free_type = Type.objects.create(name="Свободный тип")
+        self.client.post(reverse("dictionaries_unified"), {f"delete_type_{free_type.pk}": ""})
+        self.assertFalse(Type.objects.filter(pk=free_type.pk).exists())
+
+        used = self.statuses[0]
+        response = self.client.post(reverse("dictionaries_unified"), {f"delete_status_{used.pk}": ""}, follow=True)
+        self.assertContains(response, "используется в записях ДДС")
+        self.assertTrue(Status.objects.filter(pk=used.pk).exists())
+
+        category = self.subcategories[0].category
+        self.client.post(reverse("dictionaries_unified"), {
+            f"edit_category_{category.pk}": "", "name": "Новое имя", "type_id": category.type_id,
+        })
+        self.assertEqual(Category.objects.get(pk=category.pk).name, "Новое имя")
+
+
+class SyntheticLedgerTests(RollupAssertionsMixin, CacheIsolatedTestCase):
+    """
+    Синтетический журнал детерминирован при одинаковых параметрах, а команда benchmark
+    пишет результаты в JSON и не оставляет созданных записей.
+    """
+
+    def ledger_rows(self):
+        return list(CashFlow.objects.order_by("pk").values_list(
+            "created_at", "status__name", "subcategory__name", "category__name", "amount", "comment",
+        ))
+
+    def test_same_seed_gives_same_ledger(self):
+        options = {"seed": 7, "end": date(2025, 6, 30), "days": 90, "batch_size": 40,
+                   "statuses": 2, "types": 2, "categories": 3, "subcategories": 2}
+        summary = generate_ledger(100, **options)
+        self.assertEqual((summary["rows"], summary["statuses"], summary["subcategories"]), (100, 2, 12))
+        self.assertGreaterEqual(summary["date_from"], date(2025, 4, 1))
+        self.assertLessEqual(summary["date_to"], date(2025, 6, 30))
+        first = self.ledger_rows()
+        self.assertFalse(CashFlow.objects.filter(taxonomy_path="").exists())
+
+        # Повторный запуск находит уже созданные справочники и повторяет записи
+        CashFlow.objects.all().delete()
+        generate_ledger(100, **options)
+        self.assertEqual(self.ledger_rows(), first)
+        self.assertEqual(SubCategory.objects.count(), 12)
+        generate_ledger(100, **{**options, "seed": 8})
+        self.assertNotEqual(self.ledger_rows()[100:], first)
+
+    def test_generate_and_benchmark_commands(self):
+        call_command(
+            "generate_ledger", rows=60, end_date="2025-06-30", days=30, categories=2,
+            subcategories=2, stdout=StringIO(),
+        )
+        self.assertEqual(CashFlow.objects.count(), 60)
+        self.assertMatchesRebuild()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.json")
+            out = StringIO()
+            call_command("benchmark", repeat=2, warmup=0, output=path, stdout=out)
+            call_command("benchmark", scenario=["list"], repeat=1, warmup=0, compare=path, stdout=out)
+            with open(path, encoding="utf-8") as f:
+                report = json.load(f)
+        self.assertIn("list_search", report["results"])
+        self.assertEqual(report["results"]["delete"]["runs"], 2)
+        self.assertEqual(report["meta"]["rows"], 60)
+        self.assertIn("Сравнение с", out.getvalue())
+        self.assertEqual(CashFlow.objects.count(), 60)
+
+
+class CashFlowArchiveTests(RollupAssertionsMixin, CacheIsolatedTestCase):
+    """
+    Закрытые месяцы переносятся в архив без изменения агрегатов; список и выгрузка читают
+    архив, только когда его захватывает дата «с», а архивные записи доступны лишь для чтения.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+        # По записи в день за последние 200 дней
+        seed_cashflows(200, cls.statuses, cls.subcategories, step=timedelta(days=1))
+        rebuild_rollups()
+        cls.boundary = (timezone.localdate().replace(day=1) - timedelta(days=60)).replace(day=1)
+
+    def archive(self):
+        out = StringIO()
+        call_command("archive_cashflows", before=self.boundary.isoformat(), batch_size=7, stdout=out)
+        return out.getvalue()
+
+    def page_ids(self, params):
+        response = self.client.get(reverse("cashflow_list"), params)
+        return response, [(obj.pk, obj.archived) for obj in response.context["cashflows"]]
+
+    def test_archive_moves_closed_months(self):
+        ids = set(CashFlow.objects.values_list("id", flat=True))
+        closed = CashFlow.objects.filter(created_at__lt=day_start(self.boundary)).count()
+        before = self.rollup_state()
+        self.assertIn(f"Перенесено записей: {closed}", self.archive())
+
+        self.assertFalse(CashFlow.objects.filter(created_at__lt=day_start(self.boundary)).exists())
+        self.assertEqual(CashFlowArchive.objects.count(), closed)
+        archived = set(CashFlowArchive.objects.values_list("id", flat=True))
+        self.assertEqual(archived | set(CashFlow.objects.values_list("id", flat=True)), ids)
+        self.assertEqual(archive_boundary(), self.boundary)
+        # Архивные записи остаются в агрегатах, полная пересборка учитывает архив
+        self.assertEqual(self.rollup_state(), before)
+        self.assertMatchesRebuild()
+        self.assertEqual(search_cashflows(CashFlowArchive.objects.all(), "запись").count(), closed)
+        self.assertEqual(archive_cashflows(self.boundary), 0)
+
+    def test_list_and_export_route_by_date_from(self):
+        self.archive()
+        hot = CashFlow.objects.count()
+        response, rows = self.page_ids({})
+        self.assertEqual(response.context["paginator"].count, hot)
+        self.assertNotContains(response, "перенесены в архив")
+
+        date_from = self.boundary - timedelta(days=20)
+        params = {"date_from": date_from.isoformat()}
+        expected = [
+            (obj.pk, obj.archived)
+            for model in (CashFlow, CashFlowArchive)
+            for obj in model.objects.filter(created_at__gte=day_start(date_from)).order_by("-created_at", "-id")
+        ]
+        response, rows = self.page_ids({**params, "page": "last"})
+        self.assertEqual(response.context["paginator"].count, len(expected))
+        self.assertEqual(rows, expected[-len(rows):])
+        self.assertContains(response, "перенесены в архив")
+        self.assertNotContains(response, reverse("cashflow_edit", args=[rows[-1][0]]))
+
+        # Курсорные страницы проходят через границу без пропусков и повторов
+        seen, after = [], None
+        while True:
+            response, rows = self.page_ids({**params, "pagination": "cursor", **({"after": after} if after else {})})
+            seen += rows
+            if not response.context["page_obj"].has_next():
+                break
+            after = response.context["page_obj"].next_cursor
+        self.assertEqual(seen, expected)
+
+        exported = b"".join(self.client.get(reverse("cashflow_export"), params).streaming_content)
+        self.assertEqual(len(exported.decode("utf-8-sig").splitlines()), len(expected) + 1)
+
+    def test_boundary_from_another_process(self):
+        # Процесс веб-сервера закэшировал пустую границу, архив заполнила команда в другом
+        # процессе, чьё обновление кэша этот процесс не увидел
+        self.assertIsNone(archive_boundary())
+        self.archive()
+        cache.set(ARCHIVE_BOUNDARY_KEY, "", timeout=ARCHIVE_BOUNDARY_TIMEOUT)
+
+        # Запись в закрытый период проверяется по базе
+        subcategory = self.subcategories[0]
+        form = CashFlowForm(data={
+            "created_at": (self.boundary - timedelta(days=1)).isoformat(),
+            "status": self.statuses[0].pk, "type": subcategory.category.type_id,
+            "category": subcategory.category_id, "subcategory": subcategory.pk, "amount": "10.00",
+        })
+        self.assertIn("закрыт и перенесён в архив", form.errors["created_at"][0])
+        stream = StringIO(f"{self.boundary - timedelta(days=1)},Статус 0,Тип 0,Категория 0.0,Подкатегория 0.0.0,5\n")
+        self.assertIn("закрыт", import_cashflows(stream).errors[0][1])
+
+        # Чтение списков берёт границу из кэша, но не дольше ARCHIVE_BOUNDARY_TIMEOUT
+        self.assertIsNone(archive_boundary())
+        expired = time.time() + ARCHIVE_BOUNDARY_TIMEOUT + 1
+        with mock.patch("django.core.cache.backends.locmem.time.time", return_value=expired):
+            self.assertEqual(archive_boundary(), self.boundary)
+
+    def test_closed_period_is_read_only(self):
+        self.archive()
+        subcategory = self.subcategories[0]
+        response = self.client.post(reverse("cashflow_create"), {
+            "created_at": (self.boundary - timedelta(days=1)).isoformat(),
+            "status": self.statuses[0].pk,
+            "type": subcategory.category.type_id,
+            "category": subcategory.category_id,
+            "subcategory": subcategory.pk,
+            "amount": "10.00",
+        })
+        self.assertContains(response, "закрыт и перенесён в архив")
+        stream = StringIO(f"{self.boundary - timedelta(days=1)},Статус 0,Тип 0,Категория 0.0,Подкатегория 0.0.0,5\n")
+        self.assertIn("закрыт", import_cashflows(stream).errors[0][1])
+
+        # Переименование справочника меняет полное название и у архивных записей
+        subcategory.name = "Новое имя"
+        subcategory.save()
+        self.assertEqual(
+            set(CashFlowArchive.objects.filter(subcategory=subcategory).values_list("taxonomy_path", flat=True)),
+            {str(subcategory)},
+        )
+        # Справочник, на который ссылаются только архивные записи, не удаляется
+        CashFlow.objects.filter(status=self.statuses[1]).delete()
+        response = self.client.post(
+            reverse("dictionary_batch"),
+            {"operations": [{"op": "delete", "dictionary": "statuses", "id": self.statuses[1].pk}]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 409)
+
+
+class CurrencyTests(RollupAssertionsMixin, CacheIsolatedTestCase):
+    """
+    Записи в разных валютах: курсы из файла, агрегаты и итоги в валюте отчётности,
+    пересчёт страницы списка одним пакетом курсов и проверка курса в форме и импорте.
+    """
+
+    RATES = (
+        "date,currency,rate,nominal\n"
+        "2025-03-31,USD,90.5,1\n"
+        "2025-04-02,USD,91.25,1\n"
+        "31.03.2025,EUR,985,10\n"
+        "2025-03-31,RUB,1,1\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+
+    def load_rates(self, content=None):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "rates.csv")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content or self.RATES)
+            out = StringIO()
+            call_command("load_exchange_rates", path, stdout=out)
+        return out.getvalue()
+
+    def form_data(self, amount, currency, day="2025-04-01"):
+        subcategory = self.subcategories[0]
+        return {
+            "created_at": day,
+            "status": self.statuses[0].pk,
+            "type": subcategory.category.type_id,
+            "category": subcategory.category_id,
+            "subcategory": subcategory.pk,
+            "amount": amount,
+            "currency": currency,
+        }
+
+    def test_rates_file_and_lookup(self):
+        self.assertIn("USD: 2 курсов", self.load_rates())
+        self.assertEqual(ExchangeRate.objects.count(), 3)
+        # Для даты без курса действует последний курс до неё
+        self.assertEqual(get_rate("USD", date(2025, 4, 1)), Decimal("90.5"))
+        self.assertEqual(get_rate("USD", date(2025, 4, 5)), Decimal("91.25"))
+        self.assertEqual(get_rate("EUR", date(2025, 4, 1)), Decimal("98.5"))
+        self.assertEqual(get_rate("RUB", date(2000, 1, 1)), Decimal(1))
+        with self.assertRaises(MissingRateError):
+            get_rate("USD", date(2025, 3, 30))
+        # Повторные обращения обслуживает кэш курсов
+        with self.assertNumQueries(0):
+            get_rate("USD", date(2025, 4, 1))
+        # Отсутствие курса не кэшируется: курс, загруженный в обход версии курсов
+        # (другим процессом), виден без сброса кэша
+        ExchangeRate.objects.create(currency="USD", date=date(2025, 3, 30), rate=Decimal("89"))
+        self.assertEqual(get_rate("USD", date(2025, 3, 30)), Decimal("89"))
+
+        # Повторная загрузка заменяет курс и сбрасывает кэш
+        self.load_rates("date,currency,rate\n2025-03-31,USD,80\n")
+        self.assertEqual(get_rate("USD", date(2025, 4, 1)), Decimal("80"))
+        with self.assertRaisesMessage(Exception, "Строка 2"):
+            self.load_rates("date,currency,rate\n2025-03-31,USD,-1\n")
+
+    def test_rollups_are_in_reporting_currency(self):
+        self.load_rates()
+        self.client.post(reverse("cashflow_create"), self.form_data("100.00", "RUB"))
+        self.client.post(reverse("cashflow_create"), self.form_data("10.01", "USD"))
+        rollup = CashFlowRollup.objects.get()
+        self.assertEqual((rollup.total, rollup.count), (Decimal("1005.91"), 2))
+        self.assertMatchesRebuild()
+
+        cashflow = CashFlow.objects.get(currency="USD")
+        self.client.post(reverse("cashflow_edit", args=[cashflow.pk]), self.form_data("2.00", "EUR", "2025-04-02"))
+        self.assertEqual(CashFlowRollup.objects.get(date=date(2025, 4, 2)).total, Decimal("197.00"))
+        self.assertMatchesRebuild()
+
+        # Новый курс задним числом пересобирает агрегаты
+        self.assertIn("Агрегаты пересобраны", self.load_rates("date,currency,rate\n2025-04-02,EUR,100\n"))
+        self.assertEqual(CashFlowRollup.objects.get(date=date(2025, 4, 2)).total, Decimal("200.00"))
+        self.client.post(reverse("cashflow_delete", args=[cashflow.pk]))
+        self.assertEqual(CashFlowRollup.objects.get().total, Decimal("100.00"))
+        self.assertMatchesRebuild()
+
+        response = self.client.post(reverse("cashflow_create"), self.form_data("1.00", "USD", "2025-03-01"))
+        self.assertContains(response, "Нет курса USD на 01.03.2025")
+
+    def test_list_converts_page_in_one_batch(self):
+        self.load_rates()
+        seed_cashflows(30, self.statuses, self.subcategories)
+        days = [date(2025, 4, 1) + timedelta(days=i) for i in range(5)]
+        subcategory = self.subcategories[0]
+        for day in days:
+            CashFlow.objects.create(
+                created_at=timezone.make_aware(datetime(day.year, day.month, day.day, 12)),
+                status=self.statuses[0], type_id=subcategory.category.type_id,
+                category_id=subcategory.category_id, subcategory=subcategory,
+                amount=Decimal("10.00"), currency="USD",
+            )
+        cache.clear()
+        get_dictionaries()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("cashflow_list"), {"date_to": "2025-12-31"})
+        self.assertContains(response, "≈ 905.00 ₽")
+        self.assertContains(response, "≈ 912.50 ₽")
+        rate_queries = [q for q in ctx.captured_queries if "exchangerate" in q["sql"]]
+        self.assertEqual(len(rate_queries), 1)
+
+        # Курсы следующей страницы с теми же датами уже в кэше процесса
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("cashflow_list"), {"date_to": "2025-12-31", "status": self.statuses[0].pk})
+        self.assertFalse([q for q in ctx.captured_queries if "exchangerate" in q["sql"]])
+
+    def test_import_and_export_currency_column(self):
+        self.load_rates()
+        subcategory = self.subcategories[0]
+        category = subcategory.category
+        row = ["2025-04-01", "Статус 0", category.type.name, category.name, subcategory.name]
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_HEADER)
+        writer.writerows([
+            row + ["10.00", "", "usd"],
+            row + ["5.00", "", ""],
+            row + ["1.00", "", "JPY"],
+            ["2025-03-01"] + row[1:] + ["1.00", "", "EUR"],
+        ])
+        buffer.seek(0)
+        result = import_cashflows(buffer)
+        self.assertEqual(result.created, 2)
+        self.assertEqual([message for _, message in result.errors], [
+            "Неизвестная валюта «JPY»", "Нет курса EUR на 01.03.2025",
+        ])
+        self.assertEqual(CashFlowRollup.objects.get().total, Decimal("910.00"))
+        self.assertMatchesRebuild()
+
+        exported = b"".join(self.client.get(reverse("cashflow_export")).streaming_content).decode("utf-8-sig")
+        self.assertEqual(sorted(line.rsplit(",", 1)[1] for line in exported.splitlines()[1:]), ["RUB", "USD"])
+        # Файлы старого формата без колонки «Валюта» импортируются в валюте отчётности
+        legacy = StringIO(",".join(EXPORT_HEADER[:7]) + "\n" + ",".join(row + ["1.00", ""]) + "\n")
+        self.assertEqual(import_cashflows(legacy).created, 1)
+
+
+class BudgetReportTests(CacheIsolatedTestCase):
+    """
+    Бюджеты по категориям и подкатегориям: факт из месячных агрегатов одним запросом,
+    отклонения и перерасход, загрузка бюджетов из CSV.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+        april = timezone.make_aware(datetime(2025, 4, 10, 12))
+        first, second = cls.subcategories[0], cls.subcategories[1]
+        for subcategory, amount, status in ((first, "100.00", 0), (first, "50.00", 1), (second, "30.00", 0)):
+            CashFlow.objects.create(
+                created_at=april, status=cls.statuses[status], type_id=subcategory.category.type_id,
+                category_id=subcategory.category_id, subcategory=subcategory, amount=Decimal(amount),
+            )
+        cls.month = date(2025, 4, 1)
+        Budget.objects.bulk_create([
+            Budget(month=cls.month, category=first.category, amount=Decimal("150.00")),
+            Budget(month=cls.month, subcategory=first, amount=Decimal("200.00")),
+            Budget(month=cls.month, subcategory=cls.subcategories[2], amount=Decimal("10.00")),
+            Budget(month=date(2025, 5, 1), subcategory=first, amount=Decimal("1.00")),
+        ])
+
+    def lines(self, **params):
+        report = budget_report({"month_from": "2025-04", **params})
+        return report, {line.label: (line.plan, line.actual, line.variance, line.overrun) for line in report.lines}
+
+    def test_plan_vs_actual(self):
+        first, second, other = self.subcategories[:3]
+        report, lines = self.lines()
+        self.assertEqual(lines, {
+            str(first.category): (Decimal("150.00"), Decimal("180.00"), Decimal("-30.00"), True),
+            str(first): (Decimal("200.00"), Decimal("150.00"), Decimal("50.00"), False),
+            str(other): (Decimal("10.00"), Decimal("0"), Decimal("10.00"), False),
+        })
+        self.assertEqual((report.plan, report.actual, report.overruns), (Decimal("360.00"), Decimal("330.00"), 1))
+
+        # Фильтр по статусу применяется к факту, «только перерасход» — к строкам
+        _, lines = self.lines(status=str(self.statuses[0].pk))
+        self.assertEqual(lines[str(first.category)][1], Decimal("130.00"))
+        _, lines = self.lines(overruns="1")
+        self.assertEqual(list(lines), [str(first.category)])
+        _, lines = self.lines(month_to="2025-05", type=str(first.category.type_id + 1))
+        self.assertEqual(lines, {})
+        _, lines = self.lines(month_to="2025-05")
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(len(budget_report({"month_from": "2025-04", "month_to": "2025-05"}).lines), 4)
+
+    def test_thousands_of_lines_in_two_queries(self):
+        _, subcategories = ensure_taxonomy(statuses=1, types=2, categories=10, subcategories=50)
+        Budget.objects.bulk_create([
+            Budget(month=date(2025, month, 1), subcategory=subcategory, amount=Decimal("1000.00"))
+            for month in (4, 5, 6)
+            for subcategory in subcategories
+        ])
+        get_dictionaries()
+        with self.assertNumQueries(2):
+            report = budget_report({"month_from": "2025-04", "month_to": "2025-06"})
+        self.assertEqual(len(report.lines), 3004)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("budget_report"), {"month_from": "2025-04", "month_to": "2025-06"})
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(len(response.context["lines"]), 100)
+        self.assertContains(response, "из 3004")
+
+    def test_load_budgets(self):
+        first = self.subcategories[0]
+        category = first.category
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows([
+            ["Месяц", "Категория", "Подкатегория", "Сумма"],
+            ["2025-04", category.name, "", "175"],
+            ["2025-06", category.name, first.name, "12,50"],
+            ["2025-06", category.name, "Нет такой", "1"],
+            ["2025-13", category.name, "", "1"],
+        ])
+        buffer.seek(0)
+        result = import_budgets(buffer)
+        self.assertEqual((result.created, result.error_count), (2, 2))
+        self.assertEqual(Budget.objects.get(month=self.month, category=category).amount, Decimal("175.00"))
+        self.assertEqual(Budget.objects.get(month=date(2025, 6, 1), subcategory=first).amount, Decimal("12.50"))
+        self.assertEqual(Budget.objects.count(), 5)
+
+
+@skipUnless(numpy_available(), "для прогноза нужен numpy")
+@override_settings(FORECAST_INCOME_TYPES=["Тип 0"], FORECAST_EXPENSE_TYPES=["Тип 1"])
+class ForecastTests(CacheIsolatedTestCase):
+    """
+    Прогноз по месячным агрегатам: векторный расчёт по всем категориям, остаток по
+    типам притока и оттока, кэш под версией записей ДДС.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+        cls.month_from = timezone.localdate().replace(day=1)
+        income, expense = cls.subcategories[0], cls.subcategories[4]
+        day = cls.month_from
+        for income_amount, expense_amount in (("100.00", "90.00"), ("100.00", "60.00"), ("100.00", "30.00")):
+            day = (day - timedelta(days=1)).replace(day=15)
+            for subcategory, amount in ((income, income_amount), (expense, expense_amount)):
+                CashFlow.objects.create(
+                    created_at=timezone.make_aware(datetime(day.year, day.month, day.day, 12)),
+                    status=cls.statuses[0], type_id=subcategory.category.type_id,
+                    category_id=subcategory.category_id, subcategory=subcategory, amount=Decimal(amount),
+                )
+            day = day.replace(day=1)
+
+    def test_projection(self):
+        # Три года: постоянный ряд, ежегодный платёж в декабре и категория, появившаяся
+        # за два месяца до конца истории (январь 2022 — декабрь 2024)
+        constant = np.full(36, 50.0)
+        yearly = np.where(np.arange(36) % 12 == 11, 1200.0, 0.0)
+        late = np.concatenate([np.zeros(34), [10.0, 20.0]])
+        result = project(np.vstack([constant, yearly, late]), date(2022, 1, 1), horizon=12, window=3)
+        np.testing.assert_allclose(result[0], 50.0)
+        np.testing.assert_allclose(result[1], [0.0] * 11 + [1200.0])
+        np.testing.assert_allclose(result[2], 15.0)
+        # Меньше двух лет истории — только скользящее среднее
+        np.testing.assert_allclose(project(np.arange(1.0, 13.0)[None, :], date(2024, 1, 1), 3, 3), [[11.0] * 3])
+
+    def test_balances_by_type(self):
+        forecast = build_forecast(self.month_from, horizon=3, window=3)
+        income_type, expense_type = self.subcategories[0].category.type_id, self.subcategories[4].category.type_id
+        self.assertEqual(forecast.by_type, {income_type: [100.0] * 3, expense_type: [60.0] * 3})
+        self.assertEqual(forecast.opening, 120.0)
+        self.assertEqual((forecast.net, forecast.balances), ([40.0] * 3, [160.0, 200.0, 240.0]))
+        self.assertEqual(forecast.history_months, 3)
+        self.assertFalse(forecast.seasonal)
+        lines = forecast.category_lines(get_dictionaries())
+        self.assertEqual([line.label for line in lines], [str(self.subcategories[0].category), str(self.subcategories[4].category)])
+        self.assertEqual([line.label for line in forecast.category_lines(get_dictionaries(), expense_type)], [str(self.subcategories[4].category)])
+
+    def test_cached_by_data_version(self):
+        get_dictionaries()
+        with self.assertNumQueries(1):
+            forecast = get_forecast({"horizon": "3"})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_forecast({"horizon": "3"}).balances, forecast.balances)
+
+        # Новая запись меняет версию записей ДДС, и прогноз пересчитывается
+        subcategory = self.subcategories[0]
+        CashFlow.objects.create(
+            created_at=timezone.make_aware(datetime.combine(self.month_from - timedelta(days=1), datetime.min.time())),
+            status=self.statuses[0], type_id=subcategory.category.type_id,
+            category_id=subcategory.category_id, subcategory=subcategory, amount=Decimal("30.00"),
+        )
+        self.assertEqual(get_forecast({"horizon": "3"}).opening, 150.0)
+
+    def test_page(self):
+        response = self.client.get(reverse("cashflow_forecast"), {"horizon": "20", "window": "x"})
+        self.assertEqual((response.context["horizon"], response.context["window"]), (12, 3))
+        self.assertEqual(len(response.context["forecast"].months), 12)
+        self.assertContains(response, self.subcategories[4].category.name)
+        self.assertContains(response, "<b>240.00</b>")
+
+        with mock.patch("mainApp.views.numpy_available", return_value=False):
+            response = self.client.get(reverse("cashflow_forecast"))
+        self.assertContains(response, "установите numpy")
+
+
+class RecurringRuleTests(RollupAssertionsMixin, CacheIsolatedTestCase):
+    """
+    Регулярные правила: расписание повторений, идемпотентная генерация записей одним
+    bulk_create с пересборкой агрегатов, остановка на дате без курса.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+
+    def make_rule(self, start_date, frequency=RecurringRule.MONTHLY, **fields):
+        subcategory = fields.pop("subcategory", self.subcategories[0])
+        return RecurringRule.objects.create(
+            name=fields.pop("name", "Аренда"), frequency=frequency, start_date=start_date,
+            status=self.statuses[0], type_id=subcategory.category.type_id,
+            category_id=subcategory.category_id, subcategory=subcategory,
+            amount=fields.pop("amount", Decimal("1000.00")), **fields,
+        )
+
+    def test_schedule(self):
+        monthly = RecurringRule(frequency=RecurringRule.MONTHLY, interval=1, start_date=date(2025, 1, 31))
+        self.assertEqual(
+            [occurrence_date(monthly, index) for index in range(4)],
+            [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)],
+        )
+        fortnightly = RecurringRule(frequency=RecurringRule.WEEKLY, interval=2, start_date=date(2025, 1, 6))
+        self.assertEqual(occurrence_date(fortnightly, 3), date(2025, 2, 17))
+        yearly = RecurringRule(frequency=RecurringRule.YEARLY, interval=1, start_date=date(2024, 2, 29))
+        self.assertEqual([occurrence_date(yearly, index) for index in (1, 4)], [date(2025, 2, 28), date(2028, 2, 29)])
+
+    def test_generation_is_idempotent(self):
+        rent = self.make_rule(date(2025, 1, 31))
+        self.make_rule(date(2025, 3, 1), RecurringRule.WEEKLY, end_date=date(2025, 3, 20), subcategory=self.subcategories[5])
+        self.make_rule(date(2025, 1, 1), active=False)
+
+        result = generate_recurring(date(2025, 4, 15))
+        self.assertEqual((result.rules, result.created), (2, 6))
+        self.assertEqual(
+            list(CashFlow.objects.filter(recurring_rule=rent).order_by("created_at").values_list("occurrence_date", flat=True)),
+            [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31)],
+        )
+        cashflow = CashFlow.objects.filter(recurring_rule=rent).first()
+        self.assertEqual((cashflow.amount, cashflow.taxonomy_path), (Decimal("1000.00"), str(self.subcategories[0])))
+        rent.refresh_from_db()
+        self.assertEqual(rent.next_date, date(2025, 4, 30))
+        self.assertMatchesRebuild()
+
+        # Повторный запуск ничего не создаёт; сброс next_date не даёт дублей
+        self.assertEqual(generate_recurring(date(2025, 4, 15)).created, 0)
+        RecurringRule.objects.filter(pk=rent.pk).update(next_date=rent.start_date)
+        result = generate_recurring(date(2025, 4, 15))
+        # В итоге — только действительно вставленные записи, а не отброшенные повторы
+        self.assertEqual((result.rules, result.created, result.date_from), (1, 0, None))
+        self.assertEqual(CashFlow.objects.count(), 6)
+        self.assertMatchesRebuild()
+
+        # Правило с закончившимся сроком больше не выбирается
+        result = generate_recurring(date(2025, 5, 31))
+        self.assertEqual((result.rules, result.created), (1, 2))
+
+    def test_thousands_of_rules_in_constant_queries(self):
+        RecurringRule.objects.bulk_create([
+            RecurringRule(
+                name=f"Подписка {i}", frequency=RecurringRule.DAILY, start_date=date(2025, 4, 1),
+                next_date=date(2025, 4, 1), status=self.statuses[i % 2], type_id=subcategory.category.type_id,
+                category_id=subcategory.category_id, subcategory=subcategory, amount=Decimal(i + 1),
+            )
+            for i, subcategory in enumerate(self.subcategories * 250)
+        ])
+        get_dictionaries()
+        with CaptureQueriesContext(connection) as ctx:
+            result = generate_recurring(date(2025, 4, 10), batch_size=50_000)
+        self.assertEqual(result.created, 20_000)
+        inserts = [query for query in ctx.captured_queries if 'INSERT OR IGNORE INTO "mainApp_cashflow"' in query["sql"]
+                   or 'INSERT INTO "mainApp_cashflow"' in query["sql"]]
+        self.assertLessEqual(len(ctx.captured_queries) - len(inserts), 20)
+        self.assertEqual(RecurringRule.objects.filter(next_date=date(2025, 4, 11)).count(), 2000)
+        self.assertMatchesRebuild()
+
+    def test_stops_without_rate(self):
+        rule = self.make_rule(date(2025, 1, 10), currency="USD", amount=Decimal("10.00"))
+        ExchangeRate.objects.create(currency="USD", date=date(2025, 2, 1), rate=Decimal("90"))
+        result = generate_recurring(date(2025, 3, 31))
+        self.assertEqual(result.created, 0)
+        self.assertEqual(result.missing_rates, [(rule, date(2025, 1, 10))])
+
+        ExchangeRate.objects.create(currency="USD", date=date(2025, 1, 1), rate=Decimal("80"))
+        invalidate_rates()
+        call_command("generate_recurring", "--until", "2025-03-31", stdout=StringIO())
+        self.assertEqual(CashFlow.objects.filter(recurring_rule=rule).count(), 3)
+        self.assertEqual(CashFlowMonthlyRollup.objects.get(month=date(2025, 2, 1)).total, Decimal("900.00"))
+
+    def test_admin_form(self):
+        rule = self.make_rule(date(2025, 1, 10))
+        data = {
+            "name": "Аренда", "frequency": "monthly", "interval": "1", "start_date": "2025-02-10", "active": "on",
+            "status": self.statuses[0].pk, "type": self.subcategories[0].category.type_id,
+            "category": self.subcategories[0].category_id, "subcategory": self.subcategories[2].pk,
+            "amount": "1000", "currency": "RUB",
+        }
+        form = RecurringRuleForm(data, instance=rule)
+        self.assertFalse(form.is_valid())
+        self.assertIn("subcategory", form.errors)
+
+        # Пока записей нет, дату начала можно сменить — расписание начнётся с неё
+        data["subcategory"] = self.subcategories[0].pk
+        form = RecurringRuleForm(data, instance=rule)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().next_date, date(2025, 2, 10))
+
+        generate_recurring(date(2025, 2, 28))
+        rule.refresh_from_db()
+        data["start_date"] = "2025-02-11"
+        self.assertIn("start_date", RecurringRuleForm(data, instance=rule).errors)
+
+
+class CashFlowAdminTests(RollupAssertionsMixin, CacheIsolatedTestCase):
+    """
+    Админка записей ДДС: число записей и даты date_hierarchy по агрегатам, справочники
+    строк соединениями, фильтры из снимка справочников, массовые действия одним запросом.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.statuses, cls.subcategories = create_dictionaries()
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "password")
+
+    def setUp(self):
+        super().setUp()
+        seed_cashflows(300, self.statuses, self.subcategories, step=timedelta(hours=7))
+        rebuild_rollups()
+        get_dictionaries()
+        self.client.force_login(self.user)
+
+    def changelist(self, params=None, model="cashflow"):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(f"admin:mainApp_{model}_changelist"), params or {})
+        self.assertEqual(response.status_code, 200)
+        return response.context["cl"], [query["sql"] for query in ctx.captured_queries]
+
+    def test_counts_and_dates_from_rollups(self):
+        day = timezone.localdate(CashFlow.objects.order_by("created_at")[50].created_at)
+        category = self.subcategories[0].category
+        cases = [
+            ({}, CashFlow.objects.all()),
+            ({"status": self.statuses[1].pk}, CashFlow.objects.filter(status=self.statuses[1])),
+            ({"type": category.type_id, "category": category.pk}, CashFlow.objects.filter(category=category)),
+            ({"created_at__year": day.year, "created_at__month": day.month},
+             CashFlow.objects.filter(created_at__year=day.year, created_at__month=day.month)),
+            ({"created_at__year": day.year, "created_at__month": day.month, "created_at__day": day.day},
+             CashFlow.objects.filter(created_at__date=day)),
+        ]
+        for params, expected in cases:
+            cl, queries = self.changelist(params)
+            self.assertEqual(cl.result_count, expected.count(), params)
+            self.assertEqual(
+                list(cl.queryset.datetimes("created_at", "day")), list(expected.datetimes("created_at", "day")),
+            )
+            # Ни COUNT, ни DISTINCT, ни MIN/MAX по таблице записей; справочники строк —
+            # соединениями, фильтров — из снимка
+            ledger = [sql for sql in queries if 'FROM "mainApp_cashflow"' in sql]
+            self.assertEqual(len(ledger), 1, "\n".join(ledger))
+            self.assertIn('INNER JOIN "mainApp_subcategory"', ledger[0])
+            self.assertFalse([sql for sql in queries if 'FROM "mainApp_category"' in sql or 'FROM "mainApp_status"' in sql])
+
+    def test_other_filters_count_records(self):
+        CashFlow.objects.filter(id__in=CashFlow.objects.values("id")[:7]).update(comment="Аренда офиса")
+        for params, expected in (({"currency": "RUB"}, 300), ({"q": "аренда"}, 7)):
+            cl, _ = self.changelist(params)
+            self.assertIsNone(cl.queryset.rollups)
+            self.assertEqual(cl.result_count, expected)
+
+    def test_archive_split(self):
+        boundary = timezone.localdate().replace(day=1)
+        archive_cashflows(boundary)
+        cl, _ = self.changelist()
+        self.assertEqual(cl.result_count, CashFlow.objects.count())
+        cl, _ = self.changelist(model="cashflowarchive")
+        self.assertEqual(cl.result_count, CashFlowArchive.objects.count())
+        self.assertGreater(cl.result_count, 0)
+
+    def add_record(self, day, **fields):
+        subcategory = self.subcategories[0]
+        return self.client.post(reverse("admin:mainApp_cashflow_add"), {
+            "created_at_0": day.isoformat(), "created_at_1": "12:00:00",
+            "status": self.statuses[0].pk, "type": subcategory.category.type_id,
+            "category": subcategory.category_id, "subcategory": subcategory.pk,
+            "amount": "10.00", "currency": "RUB", **fields,
+        })
+
+    def test_add_form_checks_closed_period(self):
+        boundary = timezone.localdate().replace(day=1)
+        archive_cashflows(boundary)
+        live = CashFlow.objects.count()
+        response = self.add_record(boundary - timedelta(days=1))
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response.context["adminform"].form, "created_at",
+            f"Период до {boundary:%d.%m.%Y} закрыт и перенесён в архив.",
+        )
+        self.assertEqual(CashFlow.objects.count(), live)
+
+        response = self.add_record(boundary)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CashFlow.objects.count(), live + 1)
+
+    def test_add_form_checks_currency(self):
+        day = timezone.localdate()
+        # Код не из settings.CURRENCIES и валюта без курса на дату — ошибки поля, а не 500
+        for currency in ("XYZ", "USD"):
+            response = self.add_record(day, currency=currency)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(currency, response.context["adminform"].form.errors["currency"][0])
+        self.assertEqual(CashFlow.objects.count(), 300)
+
+        ExchangeRate.objects.create(currency="USD", date=day, rate=Decimal("90"))
+        invalidate_rates()
+        response = self.add_record(day, currency="USD")
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CashFlow.objects.filter(currency="USD").count(), 1)
+
+    def test_category_filter_follows_type(self):
+        type_obj = self.subcategories[0].category.type
+        cl, _ = self.changelist({"type": type_obj.pk})
+        category_filter = next(spec for spec in cl.filter_specs if spec.parameter_name == "category")
+        self.assertEqual(
+            {name for _, name in category_filter.lookup_choices}, {"Категория 0.0", "Категория 0.1"},
+        )
+        cl, _ = self.changelist()
+        self.assertNotIn("category", [spec.parameter_name for spec in cl.filter_specs])
+
+    def test_invalid_filter_values(self):
+        url = reverse("admin:mainApp_cashflow_changelist")
+        category = self.subcategories[0].category
+        for params in ({"status": "abc"}, {"type": category.type_id, "category": "abc"}, {"type": "1x"}):
+            response = self.client.get(url, params)
+            self.assertRedirects(response, f"{url}?e=1", fetch_redirect_response=False, msg_prefix=str(params))
+
+    def test_set_status_action_is_single_update(self):
+        category = self.subcategories[0].category
+        expected = CashFlow.objects.filter(category=category).count()
+        url = reverse("admin:mainApp_cashflow_changelist") + f"?type={category.type_id}&category={category.pk}"
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, {
+                "action": f"set_status_{self.statuses[1].pk}", "select_across": "1", "index": "0",
+                "_selected_action": [CashFlow.objects.filter(category=category).first().pk],
+            })
+        self.assertEqual(response.status_code, 302)
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('UPDATE "mainApp_cashflow"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(CashFlow.objects.filter(category=category, status=self.statuses[1]).count(), expected)
+        self.assertMatchesRebuild()
+
+    def test_delete_action_confirms(self):
+        status = self.statuses[0]
+        url = reverse("admin:mainApp_cashflow_changelist") + f"?status={status.pk}"
+        data = {
+            "action": "delete_selected_cashflows", "select_across": "1", "index": "0",
+            "_selected_action": [CashFlow.objects.filter(status=status).first().pk],
+        }
+        response = self.client.post(url, data)
+        self.assertContains(response, "Будут удалены записи ДДС: <b>150</b>")
+        self.assertEqual(CashFlow.objects.count(), 300)
+
+        del data["index"]
+        response = self.client.post(url, {**data, "post": "yes"})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(CashFlow.objects.filter(status=status).exists())
+        self.assertEqual(CashFlow.objects.count(), 150)
+        self.assertMatchesRebuild()
+
+    def test_autocomplete(self):
+        response = self.client.get(reverse("admin:autocomplete"), {
+            "app_label": "mainApp", "model_name": "cashflow", "field_name": "subcategory", "term": "1.0.1",
+        })
+        self.assertEqual(
+            [result["text"] for result in response.json()["results"]],
+            ["Тип 1 -> Категория 1.0 -> Подкатегория 1.0.1"],
+        )
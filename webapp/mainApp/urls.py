@@ -4,10 +4,41 @@ from . import views
 
 urlpatterns = [
     path('', views.CashFlowListView.as_view(), name='cashflow_list'),
+    path('dashboard/', views.CashFlowDashboardView.as_view(), name='cashflow_dashboard'),
+    path('budgets/', views.BudgetReportView.as_view(), name='budget_report'),
+    path('forecast/', views.ForecastView.as_view(), name='cashflow_forecast'),
+    # Асинхронные варианты страниц для чтения (под ASGI-сервером)
+    path('async/', views.cashflow_list_async, name='cashflow_list_async'),
+    path('async/dashboard/', views.cashflow_dashboard_async, name='cashflow_dashboard_async'),
+    path(
+        'async/api/categories/',
+        views.AsyncDictionaryOptionsView.as_view(dictionary="categories", parent_param="type"),
+        name='dictionary_categories_async',
+    ),
+    path(
+        'async/api/subcategories/',
+        views.AsyncDictionaryOptionsView.as_view(dictionary="subcategories", parent_param="category"),
+        name='dictionary_subcategories_async',
+    ),
+    path('export/', views.cashflow_export, name='cashflow_export'),
+    path('import/', views.CashFlowImportView.as_view(), name='cashflow_import'),
+    path('metrics/', views.performance_metrics, name='performance_metrics'),
     path('create/', views.CashFlowCreateView.as_view(), name='cashflow_create'),
+    path('bulk/', views.CashFlowBulkView.as_view(), name='cashflow_bulk'),
     path('<int:pk>/edit/', views.CashFlowUpdateView.as_view(), name='cashflow_edit'),
     path('<int:pk>/delete/', views.CashFlowDeleteView.as_view(), name='cashflow_delete'),
 
     # Универсальные справочники
     path('dictionaries/', views.DictionariesUnifiedView.as_view(), name='dictionaries_unified'),
+    path('api/dictionaries/batch/', views.DictionaryBatchView.as_view(), name='dictionary_batch'),
+    path(
+        'api/categories/',
+        views.DictionaryOptionsView.as_view(dictionary="categories", parent_param="type"),
+        name='dictionary_categories',
+    ),
+    path(
+        'api/subcategories/',
+        views.DictionaryOptionsView.as_view(dictionary="subcategories", parent_param="category"),
+        name='dictionary_subcategories',
+    ),
 ]
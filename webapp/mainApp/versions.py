@@ -0,0 +1,49 @@
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+# Ключ версии данных в общем кэше; name — вид данных ("dictionaries", "cashflows")
+VERSION_KEY = "mainApp:version:{name}"
+
+
+def current_version(name):
+    """
+    Текущая версия данных name из общего кэша. Если версии ещё нет (или её вытеснили),
+    заводится новая: add() не перезапишет версию, которую успел завести другой процесс.
+    """
+    key = VERSION_KEY.format(name=name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def acurrent_version(name):
+    """
+    Асинхронный вариант current_version().
+    """
+    key = VERSION_KEY.format(name=name)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, uuid.uuid4().hex, timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def _set_new_version(name):
+    cache.set(VERSION_KEY.format(name=name), uuid.uuid4().hex, timeout=None)
+
+
+def bump_version(name):
+    """
+    Сбрасывает всё, что закэшировано под версией данных name, во всех процессах.
+
+    Версия меняется сразу (чтобы текущая транзакция видела свои изменения) и ещё раз
+    после фиксации: иначе другой процесс мог бы успеть закэшировать данные без
+    незафиксированных изменений под новой версией.
+    """
+    _set_new_version(name)
+    transaction.on_commit(lambda: _set_new_version(name))
@@ -1,15 +1,148 @@
+import io
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, TemplateView
 from django.apps import apps
 from .models import CashFlow, Status, Type, Category, SubCategory
-from .forms import CashFlowForm
+from .forms import CashFlowBulkForm, CashFlowForm, CashFlowImportForm
+from .dictionaries import DICTIONARY_VERSION, aget_dictionaries, get_dictionaries
+from .archive import aledger_models, aparams_boundary, ledger_models, ledger_queryset, params_boundary
+from .currency import RATES_VERSION, aannotate_converted, annotate_converted, currency_context
+from .filters import filter_cashflows
+from .search import ORDER_PARAM, ORDER_RELEVANCE, SEARCH_PARAM, search_terms
+from .pagination import KeysetPaginator, apaginate
+from .reports import adashboard_summary, dashboard_summary
+from .budgets import BUDGET_PARAMS, budget_report
+from .forecast import FORECAST_PARAMS, forecast_params, get_forecast, numpy_available
+from .exports import export_rows, stream_csv, stream_xlsx
+from .imports import import_cashflows
+from .dictionary_batch import DictionaryBatchError, apply_operations, parse_form_operation, parse_operations
+from .bulk import (
+    ID_PARAM, BulkSelectionError, delete_cashflows, select_cashflows, selection_filters, update_cashflows,
+)
+from .metrics import registry
+from .page_cache import (
+    CASHFLOW_VERSION, FILTER_BAR_PARAMS, LIST_PAGE_PARAMS, aget_fragment, aset_fragment, cache_stats,
+    cached_fragment, get_fragment, normalized_query, set_fragment,
+)
+from .versions import acurrent_version, current_version
+from django.conf import settings
 from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.core.paginator import InvalidPage, Paginator
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlencode
+from django.utils.safestring import mark_safe
+from django.template.loader import render_to_string
+from django.utils.decorators import method_decorator
 
 
 #----------------------- Представления для главной страницы и редактирования записей ----------------------#
 
+def dictionary_context(dictionaries=None):
+    """
+    Справочники для шаблонов (фильтры, списки) из кэшированного снимка — без запросов к базе.
+    """
+    dictionaries = dictionaries or get_dictionaries()
+    return {
+        "statuses": dictionaries.statuses,
+        "types": dictionaries.types,
+        "categories": dictionaries.categories,
+        "subcategories": dictionaries.subcategories,
+    }
+
+
+def filter_bar_fragment(request, dictionaries, search=False):
+    """
+    Отрисованная панель фильтров (search — с полем поиска по комментарию). Кэшируется
+    по странице, выбранным фильтрам и версии справочников: списки <select>
+    не перерисовываются на каждый запрос.
+    """
+    parts = [request.path, normalized_query(request.GET, FILTER_BAR_PARAMS), dictionaries.version, search]
+    return mark_safe(cached_fragment(
+        "filter_bar",
+        parts,
+        lambda: render_to_string(
+            "cashflow/includes/filter_bar.html", {**dictionary_context(dictionaries), "search": search}, request
+        ),
+    ))
+
+
+def list_page_cache_parts(request, cashflow_version, dictionary_version, rates_version, boundary):
+    """
+    Ключ кэша страницы списка: адрес, нормализованные фильтры и курсор/номер страницы,
+    версии записей, справочников и курсов (пересчитанные суммы) и граница архива, если
+    от неё зависит, какие таблицы читаются. Любое изменение данных даёт новый ключ.
+    """
+    return [
+        request.path, normalized_query(request.GET, LIST_PAGE_PARAMS),
+        cashflow_version, dictionary_version, rates_version, boundary,
+    ]
+
+
+def cashflow_list_queryset(params, mode="offset", models=None):
+    """
+    Записи списка с фильтрами по дате, статусу, типу, категории, подкатегории и поиском
+    по комментарию. Найденные записи упорядочиваются по релевантности при ?order=relevance
+    в постраничном режиме; курсорная пагинация всегда идёт по дате.
+    Архив закрытых периодов читается, только если его захватывает дата «с»
+    (models — таблицы из ledger_models, по умолчанию определяются по params).
+    """
+    relevance = (
+        mode != "cursor"
+        and params.get(ORDER_PARAM) == ORDER_RELEVANCE
+        and bool(search_terms(params.get(SEARCH_PARAM)))
+    )
+
+    def build(qs):
+        # Вся цепочка справочников подгружается одним JOIN-запросом:
+        # шаблон выводит status/type/category/subcategory, а __str__ категории
+        # и подкатегории обращаются к type и category.
+        qs = qs.select_related(
+            "status",
+            "type",
+            "category__type",
+            "subcategory__category__type",
+        )
+        qs = filter_cashflows(qs, params, rank=relevance)
+        if relevance:
+            return qs.order_by("search_rank", "-created_at", "-id")
+        return qs.order_by("-created_at", "-id")
+
+    return ledger_queryset(models or ledger_models(params), build)
+
+
+def list_pagination_mode(request, default):
+    if request.GET.get("pagination") == "cursor":
+        return "cursor"
+    return default
+
+
+def list_pagination_context(request, ctx, mode):
+    """
+    Данные для ссылок пагинации списка по уже заполненным paginator/page_obj/is_paginated.
+    """
+    # Строка запроса без параметров пагинации: ссылки на соседние страницы сохраняют фильтры
+    query = request.GET.copy()
+    for key in ("page", "after", "before"):
+        query.pop(key, None)
+    extra = {
+        "filter_query": query.urlencode(),
+        # Фильтры для скрытых полей формы массовых операций
+        "filter_items": [(name, value) for name, values in query.lists() for value in values],
+        "cursor_pagination": mode == "cursor",
+    }
+    if ctx["is_paginated"] and mode != "cursor":
+        extra["page_range"] = ctx["paginator"].get_elided_page_range(ctx["page_obj"].number)
+    return extra
+
+
 class CashFlowListView(ListView):
     """
     Список записей денежных потоков с фильтрацией и пагинацией.
@@ -18,48 +151,268 @@ class CashFlowListView(ListView):
     template_name = 'cashflow/cashflow_list.html'
     context_object_name = 'cashflows'
     paginate_by = 15
+    # Режим пагинации по умолчанию: "offset" (номера страниц) или "cursor" (keyset).
+    # Курсорный режим также включается параметром ?pagination=cursor.
+    pagination_mode = "offset"
+    # Верхняя граница подсчёта записей в курсорном режиме
+    cursor_count_limit = 1000
+
+    def get(self, request, *args, **kwargs):
+        """
+        Отдаёт страницу из кэша, если она уже отрисовывалась для тех же фильтров и страницы
+        при тех же версиях данных; иначе отрисовывает и кэширует.
+        """
+        parts = list_page_cache_parts(
+            request, current_version(CASHFLOW_VERSION), current_version(DICTIONARY_VERSION),
+            current_version(RATES_VERSION), params_boundary(request.GET),
+        )
+        content = get_fragment("cashflow_list", parts)
+        if content is not None:
+            return HttpResponse(content)
+        response = super().get(request, *args, **kwargs).render()
+        set_fragment("cashflow_list", parts, response.content)
+        return response
 
     def get_queryset(self):
         """
-        Возвращает QuerySet с применёнными фильтрами по дате, статусу, типу, категории и подкатегории.
+        Возвращает QuerySet с применёнными фильтрами и поиском (см. cashflow_list_queryset).
         """
-        qs = CashFlow.objects.all()
-
-        # --- фильтрация ---
-        date_from = self.request.GET.get("date_from")
-        date_to = self.request.GET.get("date_to")
-        status = self.request.GET.get("status")
-        type_id = self.request.GET.get("type")
-        category_id = self.request.GET.get("category")
-        subcategory_id = self.request.GET.get("subcategory")
-
-        if date_from:
-            qs = qs.filter(created_at__date__gte=date_from)
-        if date_to:
-            qs = qs.filter(created_at__date__lte=date_to)
-        if status:
-            qs = qs.filter(status_id=status)
-        if type_id:
-            qs = qs.filter(type_id=type_id)
-        if category_id:
-            qs = qs.filter(category_id=category_id)
-        if subcategory_id:
-            qs = qs.filter(subcategory_id=subcategory_id)
-
-        return qs.order_by("-created_at")
+        return cashflow_list_queryset(self.request.GET, self.get_pagination_mode())
+
+    def get_pagination_mode(self):
+        return list_pagination_mode(self.request, self.pagination_mode)
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        В курсорном режиме заменяет OFFSET-пагинатор на KeysetPaginator.
+        """
+        if self.get_pagination_mode() != "cursor":
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, count_limit=self.cursor_count_limit)
+        page = paginator.page(
+            after=self.request.GET.get("after"),
+            before=self.request.GET.get("before"),
+        )
+        return paginator, page, page.object_list, page.has_other_pages()
 
     def get_context_data(self, **kwargs):
         """
         Добавляет справочники в контекст для фильтрации.
         """
         ctx = super().get_context_data(**kwargs)
-        ctx["statuses"] = Status.objects.all()
-        ctx["types"] = Type.objects.all()
-        ctx["categories"] = Category.objects.all()
-        ctx["subcategories"] = SubCategory.objects.all()
+        ctx.update(list_pagination_context(self.request, ctx, self.get_pagination_mode()))
+        dictionaries = get_dictionaries()
+        ctx.update(dictionary_context(dictionaries))
+        ctx["filter_bar"] = filter_bar_fragment(self.request, dictionaries, search=True)
+        ctx["archive_boundary"] = params_boundary(self.request.GET)
+        # Суммы записей в других валютах пересчитываются для всей страницы разом
+        ctx[self.context_object_name] = annotate_converted(ctx[self.context_object_name])
+        ctx.update(currency_context())
+        return ctx
+
+
+class CashFlowDashboardView(TemplateView):
+    """
+    Панель аналитики: итоги по типам, разбивка по категориям и помесячная динамика.
+    Принимает те же параметры фильтрации, что и список записей.
+    """
+    template_name = 'cashflow/cashflow_dashboard.html'
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx.update(dashboard_summary(self.request.GET))
+        dictionaries = get_dictionaries()
+        ctx.update(dictionary_context(dictionaries))
+        ctx["filter_bar"] = filter_bar_fragment(self.request, dictionaries)
+        ctx.update(currency_context())
+        return ctx
+
+
+class BudgetReportView(TemplateView):
+    """
+    Отчёт «план — факт»: бюджеты категорий и подкатегорий за месяцы периода, факт
+    из месячных агрегатов, отклонения и перерасход (см. budgets.py).
+    """
+    template_name = 'cashflow/budget_report.html'
+    lines_per_page = 100
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        report = budget_report(self.request.GET)
+        ctx["report"] = report
+        ctx["lines"] = Paginator(report.lines, self.lines_per_page).get_page(self.request.GET.get("page"))
+        ctx["filter_query"] = urlencode(
+            [(name, self.request.GET[name]) for name in BUDGET_PARAMS if self.request.GET.get(name)]
+        )
+        ctx.update(dictionary_context())
+        ctx.update(currency_context())
+        return ctx
+
+
+class ForecastView(TemplateView):
+    """
+    Прогноз притока, оттока и остатка на 3–12 месяцев вперёд по типам и категориям
+    (см. forecast.py). Без установленного numpy страница сообщает, что прогноз недоступен.
+    """
+    template_name = 'cashflow/forecast.html'
+    lines_per_page = 50
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx.update(currency_context())
+        ctx["horizon"], ctx["window"] = forecast_params(self.request.GET)
+        if not numpy_available():
+            ctx["numpy_missing"] = True
+            return ctx
+        snapshot = get_dictionaries()
+        forecast = get_forecast(self.request.GET)
+        try:
+            type_id = int(self.request.GET.get("type") or 0)
+        except ValueError:
+            type_id = 0
+        ctx["forecast"] = forecast
+        ctx["type_lines"] = forecast.type_lines(snapshot)
+        ctx["lines"] = Paginator(
+            forecast.category_lines(snapshot, type_id), self.lines_per_page
+        ).get_page(self.request.GET.get("page"))
+        ctx["filter_query"] = urlencode(
+            [(name, self.request.GET[name]) for name in FORECAST_PARAMS if self.request.GET.get(name)]
+        )
+        ctx.update(dictionary_context(snapshot))
         return ctx
 
 
+def cashflow_export(request):
+    """
+    Потоковая выгрузка записей ДДС в CSV или XLSX (?format=xlsx) с фильтрами списка.
+    Ответ формируется по мере чтения записей, поэтому память не зависит от объёма выгрузки.
+    """
+    export_format = request.GET.get("format", "csv")
+    rows = export_rows(request.GET)
+    filename = f"cashflows-{timezone.localdate():%Y%m%d}"
+    if export_format == "xlsx":
+        response = StreamingHttpResponse(
+            stream_xlsx(rows),
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        filename += ".xlsx"
+    else:
+        response = StreamingHttpResponse(stream_csv(rows), content_type="text/csv; charset=utf-8")
+        filename += ".csv"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+class CashFlowImportView(View):
+    """
+    Массовый импорт записей ДДС из CSV-файла с отчётом об ошибках по строкам.
+    """
+    template_name = "cashflow/cashflow_import.html"
+    # Сколько ошибок показывать на странице
+    errors_on_page = 100
+
+    def get(self, request):
+        return render(request, self.template_name, {"form": CashFlowImportForm()})
+
+    def post(self, request):
+        form = CashFlowImportForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return render(request, self.template_name, {"form": form})
+
+        # Кодировка всего файла уже проверена формой, до вставки первого пакета
+        stream = io.TextIOWrapper(form.cleaned_data["file"].file, encoding="utf-8-sig", newline="")
+        result = import_cashflows(stream, max_errors=self.errors_on_page)
+
+        if result.created:
+            messages.success(request, f"Импортировано записей: {result.created} ✅")
+        if result.error_count:
+            messages.error(request, f"Строк с ошибками: {result.error_count} ⛔")
+        return render(request, self.template_name, {
+            "form": CashFlowImportForm(),
+            "result": result,
+        })
+
+
+def performance_metrics(request):
+    """
+    Гистограммы стоимости запросов по представлениям, собранные PerformanceMiddleware
+    в этом процессе. Доступно только сотрудникам (is_staff): за обратным прокси адрес
+    клиента у всех запросов один и тот же, поэтому проверка по INTERNAL_IPS ничего не защищает.
+    """
+    if not request.user.is_staff:
+        raise Http404
+    return JsonResponse(
+        {"sample_rate": settings.PERF_SAMPLE_RATE, "views": registry.as_dict(), "caches": cache_stats.as_dict()},
+        json_dumps_params={"ensure_ascii": False},
+    )
+
+
+#------------------------- Асинхронные представления для чтения (ASGI, маршруты async/) -------------------------#
+#
+# Те же страницы, что и синхронные, но запросы к базе идут через асинхронный API ORM
+# (acount, асинхронные итераторы), поэтому под ASGI-сервером один процесс
+# обслуживает много одновременных запросов, не занимая поток на каждый.
+
+
+async def cashflow_list_async(request):
+    """
+    Асинхронный вариант CashFlowListView с теми же фильтрами, пагинацией и шаблоном.
+    """
+    view = CashFlowListView
+    parts = list_page_cache_parts(
+        request, await acurrent_version(CASHFLOW_VERSION), await acurrent_version(DICTIONARY_VERSION),
+        await acurrent_version(RATES_VERSION), await aparams_boundary(request.GET),
+    )
+    content = await aget_fragment("cashflow_list", parts)
+    if content is not None:
+        return HttpResponse(content)
+
+    mode = list_pagination_mode(request, view.pagination_mode)
+    queryset = cashflow_list_queryset(request.GET, mode, await aledger_models(request.GET))
+
+    if mode == "cursor":
+        paginator = KeysetPaginator(queryset, view.paginate_by, count_limit=view.cursor_count_limit)
+        page = await paginator.apage(after=request.GET.get("after"), before=request.GET.get("before"))
+        await paginator.acount()
+    else:
+        page_number = request.GET.get("page") or 1
+        try:
+            paginator, page = await apaginate(queryset, view.paginate_by, page_number)
+        except InvalidPage as exc:
+            raise Http404(f"Неверная страница ({page_number}): {exc}")
+
+    ctx = {
+        "paginator": paginator,
+        "page_obj": page,
+        "is_paginated": page.has_other_pages(),
+        "object_list": page.object_list,
+        view.context_object_name: page.object_list,
+    }
+    ctx.update(list_pagination_context(request, ctx, mode))
+    dictionaries = await aget_dictionaries()
+    ctx.update(dictionary_context(dictionaries))
+    ctx["filter_bar"] = filter_bar_fragment(request, dictionaries, search=True)
+    ctx["archive_boundary"] = await aparams_boundary(request.GET)
+    ctx[view.context_object_name] = await aannotate_converted(page.object_list)
+    ctx.update(currency_context())
+    response = render(request, view.template_name, ctx)
+    await aset_fragment("cashflow_list", parts, response.content)
+    return response
+
+
+async def cashflow_dashboard_async(request):
+    """
+    Асинхронный вариант CashFlowDashboardView.
+    """
+    ctx = await adashboard_summary(request.GET)
+    dictionaries = await aget_dictionaries()
+    ctx.update(dictionary_context(dictionaries))
+    ctx["filter_bar"] = filter_bar_fragment(request, dictionaries)
+    ctx.update(currency_context())
+    return render(request, CashFlowDashboardView.template_name, ctx)
+
+
+@method_decorator(transaction.atomic, name="post")
 class CashFlowCreateView(CreateView):
     """
     Класс для создания новой записи движения денежных средств.
@@ -70,6 +423,7 @@ class CashFlowCreateView(CreateView):
     success_url = reverse_lazy('cashflow_list')
 
 
+@method_decorator(transaction.atomic, name="post")
 class CashFlowUpdateView(UpdateView):
     """
     Класс для редактирования существующей записи движения денежных средств.
@@ -80,6 +434,7 @@ class CashFlowUpdateView(UpdateView):
     success_url = reverse_lazy('cashflow_list')
 
 
+@method_decorator(transaction.atomic, name="post")
 class CashFlowDeleteView(DeleteView):
     """
     Класс для удаления записи движения денежных средств.
@@ -89,6 +444,55 @@ class CashFlowDeleteView(DeleteView):
     success_url = reverse_lazy('cashflow_list')
 
 
+class CashFlowBulkView(View):
+    """
+    Массовое изменение справочников или удаление записей ДДС: отмеченных в списке (ids)
+    или всех, подходящих под фильтры списка. Изменение — один UPDATE, удаление — один
+    DELETE в одной транзакции (см. bulk.py).
+    """
+    template_name = "cashflow/cashflow_bulk.html"
+
+    def get(self, request):
+        return self.render_page(request, request.GET, CashFlowBulkForm())
+
+    def post(self, request):
+        form = CashFlowBulkForm(request.POST)
+        result = None
+        try:
+            qs = select_cashflows(request.POST)
+        except BulkSelectionError:
+            # Ошибку выбора записей покажет сама страница
+            return self.render_page(request, request.POST, form)
+        if form.is_valid():
+            action = form.cleaned_data["action"]
+            try:
+                if action == CashFlowBulkForm.ACTION_DELETE:
+                    result = ("Удалено записей", delete_cashflows(qs))
+                else:
+                    result = ("Изменено записей", update_cashflows(qs, form.changes()))
+            except ValidationError as exc:
+                form.add_error(None, exc)
+            else:
+                form = CashFlowBulkForm()
+        return self.render_page(request, request.POST, form, result)
+
+    def render_page(self, request, params, form, result=None):
+        ids = [value for value in params.getlist(ID_PARAM) if value]
+        filters = selection_filters(params)
+        ctx = {
+            "form": form,
+            "result": result,
+            "ids": ids,
+            "filters": [] if ids else list(filters.items()),
+            "list_url": reverse("cashflow_list") + (f"?{urlencode(filters)}" if filters else ""),
+        }
+        try:
+            ctx["count"] = select_cashflows(params).count()
+        except BulkSelectionError as exc:
+            ctx["selection_error"] = str(exc)
+        return render(request, self.template_name, ctx)
+
+
 def cashflow_create(request):
     """
     Функция для создания записи движения денежных средств через форму.
@@ -105,11 +509,12 @@ def cashflow_create(request):
     else:
         form = CashFlowForm()
 
+    dictionaries = get_dictionaries()
     context = {
         "form": form,
-        "type": Type.objects.all(),           
-        "category": Category.objects.all(),  
-        "subcategories": SubCategory.objects.all(),
+        "type": dictionaries.types,
+        "category": dictionaries.categories,
+        "subcategories": dictionaries.subcategories,
     }
     return render(request, "cashflow_form.html", context)
 
@@ -132,17 +537,60 @@ def cashflow_edit(request, pk):
     else:
         form = CashFlowForm(instance=record)
 
+    dictionaries = get_dictionaries()
     context = {
         "form": form,
-        "type": Type.objects.all(),
-        "category": Category.objects.all(),
-        "subcategories": SubCategory.objects.all(),
+        "type": dictionaries.types,
+        "category": dictionaries.categories,
+        "subcategories": dictionaries.subcategories,
     }
     return render(request, "cashflow_form.html", context)
 
 #------------------------------- Представления для управления справочниками -------------------------------#
 
 
+class DictionaryOptionsView(View):
+    """
+    JSON-список зависимого справочника: категории типа (?type=) или подкатегории категории (?category=).
+
+    Ответ берётся готовым из снимка справочников и отдаётся с ETag и Last-Modified;
+    Cache-Control разрешает хранить его браузерам и прокси, но требует перепроверки,
+    поэтому после правки справочника устаревший список не показывается, а неизменившийся
+    подтверждается ответом 304 без тела.
+    """
+    dictionary = None
+    parent_param = None
+
+    def get(self, request):
+        return self.options_response(request, get_dictionaries())
+
+    def options_response(self, request, snapshot):
+        try:
+            parent_id = int(request.GET[self.parent_param])
+        except (KeyError, ValueError):
+            return JsonResponse({"error": f"Укажите числовой параметр {self.parent_param}"}, status=400)
+
+        body, etag = snapshot.options(self.dictionary, parent_id)
+        last_modified = int(snapshot.loaded_at.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+
+class AsyncDictionaryOptionsView(DictionaryOptionsView):
+    """
+    Асинхронный вариант DictionaryOptionsView: снимок справочников читается через aget_dictionaries().
+    """
+
+    async def get(self, request):
+        return self.options_response(request, await aget_dictionaries())
+
+
+
 class DictionariesUnifiedView(View):
     """
     Класс для управления всеми справочниками (статусы, типы, категории, подкатегории) на одной странице.
@@ -153,74 +601,40 @@ class DictionariesUnifiedView(View):
         """
         Отображает страницу со всеми справочниками.
         """
-        return render(request, self.template_name, {
-            "statuses": Status.objects.all(),
-            "types": Type.objects.all(),
-            "categories": Category.objects.all(),
-            "subcategories": SubCategory.objects.all(),
-        })
+        return render(request, self.template_name, dictionary_context())
+
+    def post(self, request):
+        """
+        Одна операция из формы страницы (кнопка add_*/edit_*_<id>/delete_*_<id>) через тот же
+        механизм, что и пакетный API: ошибки и справочники, занятые записями ДДС,
+        показываются сообщениями вместо ошибки сервера.
+        """
+        try:
+            apply_operations(parse_form_operation(request.POST))
+        except DictionaryBatchError as exc:
+            for message in exc.messages():
+                messages.error(request, f"{message} ⛔")
+        return redirect("dictionaries_unified")
+
+
+class DictionaryBatchView(View):
+    """
+    Пакетное изменение справочников одним JSON-запросом: добавления, переименования,
+    переносы к другому родителю и удаления применяются в одной транзакции (см.
+    dictionary_batch.py). Ответ 400 — ошибки операций, 409 — удаляемые справочники,
+    на которые ссылаются записи ДДС; в обоих случаях ничего не изменено.
+    """
 
     def post(self, request):
-        # --- Статусы ---
-        for key in request.POST:
-            if key.startswith("edit_status_"):
-                status_id = key.split("_")[-1]
-                obj = get_object_or_404(Status, id=status_id)
-                obj.name = request.POST.get("name")
-                obj.save()
-                return redirect("dictionaries_unified")
-            if key.startswith("delete_status_"):
-                status_id = key.split("_")[-1]
-                get_object_or_404(Status, id=status_id).delete()
-                return redirect("dictionaries_unified")
-        # --- Типы ---
-            if key.startswith("edit_type_"):
-                type_id = key.split("_")[-1]
-                obj = get_object_or_404(Type, id=type_id)
-                obj.name = request.POST.get("name")
-                obj.save()
-                return redirect("dictionaries_unified")
-            if key.startswith("delete_type_"):
-                type_id = key.split("_")[-1]
-                get_object_or_404(Type, id=status_id).delete()
-                return redirect("dictionaries_unified")
-        # --- Категории ---
-            if key.startswith("edit_category_"):
-                cat_id = key.split("_")[-1]
-                obj = get_object_or_404(Category, id=cat_id)
-                obj.name = request.POST.get("name")
-                obj.type_id = request.POST.get("type_id")
-                obj.save()
-                return redirect("dictionaries_unified")
-            if key.startswith("delete_category_"):
-                cat_id = key.split("_")[-1]
-                get_object_or_404(Category, id=cat_id).delete()
-                return redirect("dictionaries_unified")
-        # --- Подкатегории ---
-            if key.startswith("edit_subcategory_"):
-                subcat_id = key.split("_")[-1]
-                obj = get_object_or_404(SubCategory, id=subcat_id)
-                obj.name = request.POST.get("name")
-                obj.category_id = request.POST.get("category_id")
-                obj.save()
-                return redirect("dictionaries_unified")
-            if key.startswith("delete_subcategory_"):
-                subcat_id = key.split("_")[-1]
-                get_object_or_404(SubCategory, id=subcat_id).delete()
-                return redirect("dictionaries_unified")
-        # --- Добавление ---
-        if "add_status" in request.POST:
-            Status.objects.create(name=request.POST.get("name"))
-        elif "add_type" in request.POST:
-            Type.objects.create(name=request.POST.get("name"))
-        elif "add_category" in request.POST:
-            Category.objects.create(
-                name=request.POST.get("name"),
-                type_id=request.POST.get("type_id")
-            )
-        elif "add_subcategory" in request.POST:
-            SubCategory.objects.create(
-                name=request.POST.get("name"),
-                category_id=request.POST.get("category_id")
-            )
-        return redirect("dictionaries_unified")
\ No newline at end of file
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"errors": [{"index": None, "message": "Тело запроса — не JSON"}]}, status=400)
+        try:
+            result = apply_operations(parse_operations(data))
+        except DictionaryBatchError as exc:
+            if exc.errors:
+                errors = [{"index": index, "message": message} for index, message in exc.errors]
+                return JsonResponse({"errors": errors}, status=400)
+            return JsonResponse({"conflicts": exc.conflicts}, status=409)
+        return JsonResponse(result.as_dict())